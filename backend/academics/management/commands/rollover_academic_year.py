@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from academics.models import AcademicYear
+from academics.rollover import build_rollover_plan, execute_rollover
+
+
+class Command(BaseCommand):
+    help = 'Promote all active pupils from one academic year into the next'
+
+    def add_arguments(self, parser):
+        parser.add_argument('from_year', help='Name of the year being closed, e.g. 2025/2026')
+        parser.add_argument('to_year', help='Name of the new year, e.g. 2026/2027')
+        parser.add_argument('--dry-run', action='store_true', help='Print the plan without writing anything')
+
+    def handle(self, *args, **options):
+        try:
+            from_year = AcademicYear.objects.get(name=options['from_year'])
+            to_year = AcademicYear.objects.get(name=options['to_year'])
+        except AcademicYear.DoesNotExist as exc:
+            raise CommandError(f'Academic year not found: {exc}')
+
+        plan = build_rollover_plan(from_year, to_year)
+        summary = plan.summary() if options['dry_run'] else execute_rollover(plan)
+
+        for move in summary['moves']:
+            self.stdout.write(
+                f"  {move['from_class']} -> {move['to_class'] or '(graduated)'}: {move['count']} {move['action']}"
+            )
+        if summary['classes_to_create']:
+            self.stdout.write(f"  New classes: {', '.join(summary['classes_to_create'])}")
+
+        verb = 'Would roll over' if options['dry_run'] else 'Rolled over'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['from_year']} -> {summary['to_year']}: "
+            f"{summary['promoted']} promoted, {summary['repeated']} repeated, "
+            f"{summary['graduated']} graduated, {summary['already_rolled_over']} already done."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from academics.models import ReportCard
+from academics.results import snapshot_report_cards
+
+
+class Command(BaseCommand):
+    help = 'Freeze results onto published report cards that have no snapshot yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', action='append', dest='terms', help='Term id to snapshot (repeatable); default all')
+        parser.add_argument('--batch-size', type=int, default=500, help='Report cards snapshotted per batch')
+
+    def handle(self, *args, **options):
+        cards = ReportCard.objects.filter(is_published=True, results__isnull=True).select_related('term')
+        if options['terms']:
+            cards = cards.filter(term_id__in=options['terms'])
+        cards = list(cards.order_by('term_id', 'id'))
+        size = options['batch_size']
+        for start in range(0, len(cards), size):
+            snapshot_report_cards(cards[start:start + size])
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted results for {len(cards)} published report cards.'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.0 on 2026-10-19 02:24
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_enrollments(apps, schema_editor):
+    StudentProfile = apps.get_model('accounts', 'StudentProfile')
+    ClassEnrollment = apps.get_model('academics', 'ClassEnrollment')
+    profiles = StudentProfile.objects.exclude(current_class=None).values(
+        'user_id', 'current_class_id',
+        'current_class__academic_year_id', 'current_class__academic_year__start_date',
+    )
+    ClassEnrollment.objects.bulk_create([
+        ClassEnrollment(
+            student_id=p['user_id'],
+            school_class_id=p['current_class_id'],
+            academic_year_id=p['current_class__academic_year_id'],
+            start_date=p['current_class__academic_year__start_date'],
+        )
+        for p in profiles.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0009_student_promotion'),
+        ('accounts', '0015_support_tickets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassEnrollment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_date', models.DateField(default=django.utils.timezone.now)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='academics.academicyear')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='academics.schoolclass')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='class_enrollments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start_date'],
+                'indexes': [models.Index(fields=['school_class', 'academic_year', 'student'], name='academics_c_school__188568_idx'), models.Index(fields=['student', 'academic_year'], name='academics_c_student_4b1dbd_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='classenrollment',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_date__isnull', True)), fields=('student',), name='one_open_enrollment_per_student'),
+        ),
+        migrations.RunPython(backfill_enrollments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0 on 2026-10-19 02:28
+
+import hashlib
+import mimetypes
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_file_metadata(apps, schema_editor):
+    LessonMaterial = apps.get_model('academics', 'LessonMaterial')
+    for material in LessonMaterial.objects.exclude(file='').exclude(file=None).iterator():
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with material.file.open('rb') as fh:
+                for chunk in fh.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+        except Exception as e:
+            print(f"Could not read {material.file.name}: {e}")
+            continue
+        material.file_size = size
+        material.file_hash = digest.hexdigest()
+        material.file_mime_type = mimetypes.guess_type(material.file.name)[0] or 'application/octet-stream'
+        material.save(update_fields=['file_size', 'file_hash', 'file_mime_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0010_class_enrollment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonmaterial',
+            name='file_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lessonmaterial',
+            name='file_mime_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='lessonmaterial',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MaterialUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('total_size', models.BigIntegerField()),
+                ('chunk_size', models.IntegerField()),
+                ('mime_type', models.CharField(blank=True, default='', max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('complete', 'Complete')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='academics.lessonmaterial')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='material_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(backfill_file_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0012_lesson_material_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportcard',
+            name='results',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
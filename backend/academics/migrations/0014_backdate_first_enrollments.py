@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import F, Min
+
+
+def backdate_first_enrollments(apps, schema_editor):
+    """Start each pupil's first enrolment of a year with the year, as the 0010 backfill did."""
+    ClassEnrollment = apps.get_model('academics', 'ClassEnrollment')
+    firsts = ClassEnrollment.objects.order_by().values(
+        'student_id', 'academic_year_id', 'academic_year__start_date'
+    ).annotate(first=Min('start_date')).filter(first__gt=F('academic_year__start_date'))
+    for row in firsts.iterator():
+        ClassEnrollment.objects.filter(
+            student_id=row['student_id'], academic_year_id=row['academic_year_id'], start_date=row['first'],
+        ).update(start_date=row['academic_year__start_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0013_report_card_results'),
+    ]
+
+    operations = [
+        migrations.RunPython(backdate_first_enrollments, migrations.RunPython.noop),
+    ]
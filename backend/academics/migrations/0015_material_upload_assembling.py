@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0014_backdate_first_enrollments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='materialupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('assembling', 'Assembling'), ('complete', 'Complete')], default='pending', max_length=20),
+        ),
+    ]
@@ -1,5 +1,11 @@
+import hashlib
+import mimetypes
+import os
+import shutil
 import uuid
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 from django.utils import timezone
@@ -105,6 +111,123 @@ class SchoolClass(models.Model):
     def __str__(self):
         return f"{self.name} ({self.academic_year.name})"
 
+class ClassEnrollmentQuerySet(models.QuerySet):
+    def for_term(self, term):
+        """Enrolments in the term's academic year that overlap the term."""
+        return self.filter(academic_year_id=term.academic_year_id, start_date__lte=term.end_date).filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=term.start_date)
+        )
+
+
+class ClassEnrollment(models.Model):
+    """
+    A pupil's membership of a class over time. StudentProfile.current_class is
+    the live pointer; this table keeps the history so past terms' rosters,
+    results and positions resolve to the class the pupil was actually in.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        limit_choices_to={'role': 'student'},
+        related_name='class_enrollments'
+    )
+    school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE, related_name='enrollments')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='enrollments')
+    start_date = models.DateField(default=timezone.now)
+    end_date = models.DateField(blank=True, null=True)
+
+    objects = ClassEnrollmentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['school_class', 'academic_year', 'student']),
+            models.Index(fields=['student', 'academic_year']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student'],
+                condition=models.Q(end_date__isnull=True),
+                name='one_open_enrollment_per_student',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.student.full_name} in {self.school_class.name} ({self.academic_year.name})"
+
+    @classmethod
+    def move(cls, changes, on_date=None):
+        """
+        Apply {student_id: SchoolClass or None}: close each pupil's open enrolment
+        and open one in the new class, in four statements regardless of batch size.
+        A pupil's first enrolment in an academic year starts with the year (as
+        the backfill did), so it covers the terms before the pupil was placed;
+        later moves start on `on_date`.
+        """
+        if not changes:
+            return
+        on_date = on_date or timezone.localdate()
+        placed = set(cls.objects.filter(student_id__in=list(changes)).values_list('student_id', 'academic_year_id'))
+        year_starts = dict(AcademicYear.objects.filter(
+            id__in={c.academic_year_id for c in changes.values() if c is not None}
+        ).values_list('id', 'start_date'))
+        cls.objects.filter(student_id__in=list(changes), end_date__isnull=True).update(end_date=on_date)
+        cls.objects.bulk_create([
+            cls(
+                student_id=student_id,
+                school_class=school_class,
+                academic_year_id=school_class.academic_year_id,
+                start_date=(
+                    on_date if (student_id, school_class.academic_year_id) in placed
+                    else min(on_date, year_starts[school_class.academic_year_id])
+                ),
+            )
+            for student_id, school_class in changes.items() if school_class is not None
+        ], batch_size=500)
+
+
+class StudentPromotion(models.Model):
+    """One row per pupil per end-of-year rollover (promoted, repeated or graduated)."""
+
+    ACTION_CHOICES = [
+        ('promoted', 'Promoted'),
+        ('repeated', 'Repeated'),
+        ('graduated', 'Graduated'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        limit_choices_to={'role': 'student'},
+        related_name='promotions'
+    )
+    from_academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='promotions_out')
+    to_academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='promotions_in')
+    from_class = models.ForeignKey(
+        SchoolClass, on_delete=models.SET_NULL, null=True, blank=True, related_name='promotions_out'
+    )
+    to_class = models.ForeignKey(
+        SchoolClass, on_delete=models.SET_NULL, null=True, blank=True, related_name='promotions_in'
+    )
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    performed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('student', 'to_academic_year')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.student.full_name}: {self.action} ({self.to_academic_year.name})"
+
 class Subject(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
@@ -175,6 +298,8 @@ class ReportCard(models.Model):
     admin_remarks = models.TextField(blank=True, null=True)
     psychomotor = models.JSONField(default=dict, blank=True, null=True)
     is_published = models.BooleanField(default=False)
+    # Frozen copy of the pupil's results, written on publish (see academics.results).
+    results = models.JSONField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -337,14 +462,124 @@ class LessonMaterial(models.Model):
 
     # Optional file attachment
     file        = models.FileField(upload_to='lesson_materials/', null=True, blank=True)
+    # Captured when the file is uploaded so listings never have to ask the storage backend.
+    file_size   = models.BigIntegerField(null=True, blank=True)
+    file_mime_type = models.CharField(max_length=100, blank=True, default='')
+    file_hash   = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Plain text pulled out of PDF/DOCX attachments by academics.tasks.extract_material_text.
+    file_text   = models.TextField(blank=True, default='')
 
     status      = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
 
+    # Maintained by Postgres on every write; topic matches outrank body and attachment text.
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('topic', weight='A', config='english')
+            + SearchVector('objectives', weight='B', config='english')
+            + SearchVector('activities', weight='B', config='english')
+            + SearchVector('evaluation', weight='B', config='english')
+            + SearchVector('file_text', weight='C', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     created_at  = models.DateTimeField(auto_now_add=True)
     updated_at  = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='lessonmaterial_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.topic} – {self.school_class.name} ({self.status})"
+
+    def save(self, *args, **kwargs):
+        # A freshly uploaded (uncommitted) file: record its metadata and, if the
+        # same bytes are already stored for another material, point at that copy.
+        extract_text = False
+        if self.file and not self.file._committed:
+            upload = self.file.file
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in upload.chunks():
+                digest.update(chunk)
+                size += len(chunk)
+            upload.seek(0)
+            self.file_hash = digest.hexdigest()
+            self.file_size = size
+            self.file_mime_type = (
+                getattr(upload, 'content_type', None)
+                or mimetypes.guess_type(upload.name)[0]
+                or 'application/octet-stream'
+            )
+            existing = LessonMaterial.objects.filter(file_hash=self.file_hash).exclude(file='').exclude(pk=self.pk).first()
+            if existing:
+                self.file = existing.file.name
+                self.file_text = existing.file_text
+            else:
+                self.file_text = ''
+                extract_text = True
+        elif not self.file:
+            self.file_size, self.file_mime_type, self.file_hash, self.file_text = None, '', '', ''
+        super().save(*args, **kwargs)
+        if extract_text:
+            from .tasks import queue_text_extraction
+            queue_text_extraction(self.pk)
+
+
+class MaterialUpload(models.Model):
+    """
+    A resumable, chunked upload of a lesson material attachment. Parts are
+    written to CHUNKED_UPLOAD_DIR as they arrive and stitched together on
+    completion, so a large PDF or video never sits in one request or in memory.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('assembling', 'Assembling'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    teacher = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='material_uploads',
+    )
+    material = models.ForeignKey(
+        LessonMaterial, on_delete=models.CASCADE, related_name='uploads'
+    )
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    mime_type = models.CharField(max_length=100, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.status})"
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    @property
+    def part_dir(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, str(self.id))
+
+    def part_path(self, number):
+        return os.path.join(self.part_dir, f"{number:05d}.part")
+
+    def received_parts(self):
+        if not os.path.isdir(self.part_dir):
+            return []
+        return sorted(int(name.split('.')[0]) for name in os.listdir(self.part_dir) if name.endswith('.part'))
+
+    def discard_parts(self):
+        shutil.rmtree(self.part_dir, ignore_errors=True)
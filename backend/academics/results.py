@@ -0,0 +1,100 @@
+"""
+Published-results snapshots.
+
+When a report card is published, the pupil's term results (scores per subject
+and assessment type, totals, class position and class size) are frozen into
+ReportCard.results. Parents and pupils then read one row per term instead of
+joining scores, assessments and subjects on every request. Publishing again
+rebuilds the snapshot.
+"""
+from collections import defaultdict
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ClassEnrollment, ReportCard, StudentScore
+
+
+def build_result_snapshots(term, student_ids):
+    """{student_id: snapshot} for the given pupils in `term`, from a fixed number of queries."""
+    student_ids = set(student_ids)
+    if not student_ids:
+        return {}
+
+    # The class each pupil was in during the term; the latest enrolment wins after a mid-term move.
+    pupil_class = {}
+    for enrollment in ClassEnrollment.objects.for_term(term).filter(
+        student_id__in=student_ids
+    ).select_related('school_class').order_by('start_date'):
+        pupil_class[enrollment.student_id] = enrollment.school_class
+
+    # Class size and position count active pupils only, as ReportCardSerializer does.
+    rosters = defaultdict(set)
+    for class_id, student_id in ClassEnrollment.objects.for_term(term).filter(
+        school_class_id__in={c.id for c in pupil_class.values()}, student__student_profile__status='active'
+    ).order_by().values_list('school_class_id', 'student_id').distinct():
+        rosters[class_id].add(student_id)
+
+    classmates = set().union(*rosters.values()) if rosters else set()
+    rows = StudentScore.objects.filter(
+        student_id__in=classmates | student_ids, assessment__term=term
+    ).values(
+        'student_id', 'assessment__subject_id', 'assessment__subject__name',
+        'assessment__subject__code', 'assessment__assessment_type__name',
+    ).annotate(total=Sum('score_obtained')).order_by('assessment__subject__name')
+
+    totals = defaultdict(float)
+    subjects = defaultdict(dict)
+    for row in rows:
+        score = float(row['total'] or 0.0)
+        totals[row['student_id']] += score
+        if row['student_id'] not in student_ids:
+            continue
+        subject = subjects[row['student_id']].setdefault(row['assessment__subject_id'], {
+            'subject_id': str(row['assessment__subject_id']),
+            'subject': row['assessment__subject__name'],
+            'code': row['assessment__subject__code'],
+            'scores': {},
+            'total': 0.0,
+        })
+        subject['scores'][row['assessment__assessment_type__name']] = score
+        subject['total'] += score
+
+    # Same ordering as ReportCardSerializer.get_class_position.
+    positions = {}
+    for class_id, roster in rosters.items():
+        ranked = sorted(roster, key=lambda sid: totals.get(sid, 0.0), reverse=True)
+        positions[class_id] = {sid: index + 1 for index, sid in enumerate(ranked)}
+
+    generated_at = timezone.now().isoformat()
+    snapshots = {}
+    for student_id in student_ids:
+        school_class = pupil_class.get(student_id)
+        subject_rows = list(subjects[student_id].values())
+        total = round(totals.get(student_id, 0.0), 2)
+        snapshots[student_id] = {
+            'generated_at': generated_at,
+            'term': {'id': str(term.id), 'name': term.name},
+            'school_class': {'id': str(school_class.id), 'name': school_class.name} if school_class else None,
+            'subjects': subject_rows,
+            'total': total,
+            'average': round(total / len(subject_rows), 2) if subject_rows else 0.0,
+            'position': positions.get(school_class.id, {}).get(student_id, 0) if school_class else 0,
+            'class_size': len(rosters.get(school_class.id, ())) if school_class else 0,
+        }
+    return snapshots
+
+
+def snapshot_report_cards(cards):
+    """Freeze results onto the given published cards. Cards may span several terms."""
+    by_term = defaultdict(list)
+    for card in cards:
+        by_term[card.term_id].append(card)
+
+    for term_cards in by_term.values():
+        term = term_cards[0].term
+        snapshots = build_result_snapshots(term, [card.student_id for card in term_cards])
+        for card in term_cards:
+            card.results = snapshots[card.student_id]
+    ReportCard.objects.bulk_update(cards, ['results'], batch_size=500)
+    return cards
@@ -0,0 +1,158 @@
+"""
+End-of-year rollover: clone the class structure into the next academic year,
+move every active pupil up one ClassLevel and graduate the top level.
+
+`build_rollover_plan` works out every move in memory from a fixed number of
+queries, so it doubles as the dry-run preview. `execute_rollover` then writes
+the plan with a handful of bulk statements inside one transaction.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ClassEnrollment, ClassLevel, SchoolClass, StudentPromotion
+
+
+BATCH_SIZE = 500
+
+
+def _stream_suffix(school_class):
+    """'Primary 1A' at level 'Primary 1' -> 'A'. None when the name does not follow the level."""
+    level_name = school_class.level.name
+    if school_class.name.lower().startswith(level_name.lower()):
+        return school_class.name[len(level_name):]
+    return None
+
+
+class RolloverPlan:
+    def __init__(self, from_year, to_year):
+        self.from_year = from_year
+        self.to_year = to_year
+        self.new_classes = []
+        self.moves = []          # (profile, from_class, to_class, action)
+        self.already_rolled_over = 0
+
+    def summary(self):
+        actions = Counter(action for _, _, _, action in self.moves)
+        per_class = Counter(
+            (from_class.name, to_class.name if to_class else None, action)
+            for _, from_class, to_class, action in self.moves
+        )
+        return {
+            'from_year': self.from_year.name,
+            'to_year': self.to_year.name,
+            'classes_to_create': sorted(c.name for c in self.new_classes),
+            'promoted': actions.get('promoted', 0),
+            'repeated': actions.get('repeated', 0),
+            'graduated': actions.get('graduated', 0),
+            'already_rolled_over': self.already_rolled_over,
+            'moves': [
+                {'from_class': src, 'to_class': dst, 'action': action, 'count': count}
+                for (src, dst, action), count in sorted(per_class.items(), key=lambda i: (i[0][0], i[0][2]))
+            ],
+        }
+
+
+def build_rollover_plan(from_year, to_year, teacher_assignments=None, repeat_student_ids=None):
+    """
+    Plan the promotion of every active pupil in `from_year` into `to_year`.
+
+    teacher_assignments: optional {class name: teacher id} for the new year's classes.
+        Classes not listed keep the teacher of the same-named class in `from_year`.
+    repeat_student_ids: pupils who stay at their current level.
+    """
+    from accounts.models import StudentProfile
+
+    teacher_assignments = {str(k).lower(): v for k, v in (teacher_assignments or {}).items()}
+    repeat_student_ids = {str(s) for s in (repeat_student_ids or [])}
+    plan = RolloverPlan(from_year, to_year)
+
+    levels = list(ClassLevel.objects.order_by('numeric_level'))
+    next_level = {levels[i].id: levels[i + 1] for i in range(len(levels) - 1)}
+
+    old_classes = list(
+        SchoolClass.objects.filter(academic_year=from_year).select_related('level').order_by('name')
+    )
+    existing = {c.name.lower(): c for c in SchoolClass.objects.filter(academic_year=to_year)}
+    previous_teacher = {c.name.lower(): c.teacher_id for c in old_classes}
+
+    def class_in_new_year(name, level):
+        key = name.lower()
+        if key not in existing:
+            teacher_id = teacher_assignments.get(key, previous_teacher.get(key))
+            existing[key] = SchoolClass(name=name, level=level, academic_year=to_year, teacher_id=teacher_id)
+            plan.new_classes.append(existing[key])
+        return existing[key]
+
+    # Every class carries over, so repeaters and next year's intake always have a home.
+    same_class = {c.id: class_in_new_year(c.name, c.level) for c in old_classes}
+
+    promoted_class = {}
+    for c in old_classes:
+        level = next_level.get(c.level_id)
+        if level is None:
+            promoted_class[c.id] = None
+            continue
+        suffix = _stream_suffix(c)
+        name = f"{level.name}{suffix}" if suffix is not None else level.name
+        promoted_class[c.id] = class_in_new_year(name, level)
+
+    old_by_id = {c.id: c for c in old_classes}
+    done = set(
+        StudentPromotion.objects.filter(to_academic_year=to_year).values_list('student_id', flat=True)
+    )
+    profiles = StudentProfile.objects.filter(
+        current_class__academic_year=from_year, status='active'
+    ).only('id', 'user_id', 'current_class_id', 'status')
+
+    for profile in profiles:
+        if profile.user_id in done:
+            plan.already_rolled_over += 1
+            continue
+        from_class = old_by_id[profile.current_class_id]
+        if str(profile.user_id) in repeat_student_ids:
+            plan.moves.append((profile, from_class, same_class[from_class.id], 'repeated'))
+        elif promoted_class[from_class.id] is None:
+            plan.moves.append((profile, from_class, None, 'graduated'))
+        else:
+            plan.moves.append((profile, from_class, promoted_class[from_class.id], 'promoted'))
+
+    return plan
+
+
+@transaction.atomic
+def execute_rollover(plan, performed_by=None):
+    """Apply a plan built by `build_rollover_plan`. Returns the plan summary."""
+    SchoolClass.objects.bulk_create(plan.new_classes, batch_size=BATCH_SIZE)
+
+    now = timezone.now()
+    profiles = []
+    history = []
+    for profile, from_class, to_class, action in plan.moves:
+        profile.current_class = to_class
+        if action == 'graduated':
+            profile.status = 'graduated'
+        profile.updated_at = now
+        profiles.append(profile)
+        history.append(StudentPromotion(
+            student_id=profile.user_id,
+            from_academic_year=plan.from_year,
+            to_academic_year=plan.to_year,
+            from_class=from_class,
+            to_class=to_class,
+            action=action,
+            performed_by=performed_by,
+            created_at=now,
+        ))
+
+    from accounts.models import StudentProfile
+    StudentProfile.objects.bulk_update(
+        profiles, ['current_class', 'status', 'updated_at'], batch_size=BATCH_SIZE
+    )
+    StudentPromotion.objects.bulk_create(history, batch_size=BATCH_SIZE)
+    ClassEnrollment.move(
+        {profile.user_id: to_class for profile, _, to_class, _ in plan.moves},
+        on_date=timezone.localdate(now),
+    )
+    return plan.summary()
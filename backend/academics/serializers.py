@@ -78,6 +78,24 @@ class StudentScoreSerializer(serializers.ModelSerializer):
         return rep
 
 
+class RolloverSerializer(serializers.Serializer):
+    """Input of AcademicYearViewSet.rollover."""
+    to_year = serializers.UUIDField()
+    teacher_assignments = serializers.DictField(
+        child=serializers.UUIDField(allow_null=True), required=False
+    )
+    repeat_student_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+    def validate_teacher_assignments(self, value):
+        from accounts.models import User
+        teacher_ids = {teacher_id for teacher_id in value.values() if teacher_id is not None}
+        found = set(User.objects.filter(id__in=teacher_ids, role='teacher').values_list('id', flat=True))
+        if teacher_ids - found:
+            raise serializers.ValidationError('Unknown teacher: ' + ', '.join(sorted(str(t) for t in teacher_ids - found)))
+        return value
+
+
 class ReportCardSerializer(serializers.ModelSerializer):
     student_name = serializers.ReadOnlyField(source='student.full_name')
     student_admission = serializers.ReadOnlyField(source='student.student_profile.admission_number')
@@ -90,36 +108,52 @@ class ReportCardSerializer(serializers.ModelSerializer):
         model = ReportCard
         fields = '__all__'
 
+    def _term_roster(self, obj):
+        """
+        Active pupils enrolled in the class this pupil was in during the card's
+        term, with their term score totals. The class comes from the
+        term_class_id annotation ReportCardViewSet adds to its list, and the
+        roster is cached per (class, term) so a page of cards shares one lookup.
+        """
+        from academics.models import ClassEnrollment
+        if hasattr(obj, 'term_class_id'):
+            class_id = obj.term_class_id
+        else:
+            class_id = ClassEnrollment.objects.for_term(obj.term).filter(
+                student_id=obj.student_id
+            ).order_by('-start_date').values_list('school_class_id', flat=True).first()
+        if class_id is None:
+            return [], {}
+        cache = self.context.setdefault('_term_rosters', {})
+        key = (class_id, obj.term_id)
+        if key not in cache:
+            from django.db.models import Sum
+            from academics.models import StudentScore
+            roster = list(
+                ClassEnrollment.objects.for_term(obj.term).filter(
+                    school_class_id=class_id, student__student_profile__status='active'
+                ).order_by().values_list('student_id', flat=True).distinct()
+            )
+            totals = {}
+            for item in StudentScore.objects.filter(
+                student_id__in=roster, assessment__term_id=obj.term_id
+            ).values('student_id').annotate(total=Sum('score_obtained')):
+                totals[item['student_id']] = float(item['total'] or 0.0)
+            cache[key] = (roster, totals)
+        return cache[key]
+
     def get_class_size(self, obj):
-        profile = getattr(obj.student, 'student_profile', None)
-        if profile and profile.current_class:
-            from accounts.models import StudentProfile
-            return StudentProfile.objects.filter(current_class=profile.current_class, status='active').count()
-            # Return 0 if not assigned or inactive
-        return 0
+        if obj.results:
+            return obj.results.get('class_size', 0)
+        return len(self._term_roster(obj)[0])
 
     def get_class_position(self, obj):
-        profile = getattr(obj.student, 'student_profile', None)
-        if not profile or not profile.current_class:
-            return 0
-        term = obj.term
-        from accounts.models import StudentProfile
-        class_students = list(StudentProfile.objects.filter(current_class=profile.current_class, status='active').values_list('user_id', flat=True))
-        from django.db.models import Sum
-        from academics.models import StudentScore
-        student_scores = StudentScore.objects.filter(
-            student_id__in=class_students,
-            assessment__term=term
-        ).values('student_id', 'assessment__subject_id').annotate(
-            subject_total=Sum('score_obtained')
-        )
-        totals = {}
-        for item in student_scores:
-            s_id = item['student_id']
-            totals[s_id] = totals.get(s_id, 0.0) + float(item['subject_total'] or 0.0)
+        if obj.results:
+            return obj.results.get('position', 0)
+        class_students, totals = self._term_roster(obj)
         sorted_students = sorted(class_students, key=lambda sid: totals.get(sid, 0.0), reverse=True)
         try:
-            position = sorted_students.index(obj.student.id) + 1
+            position = sorted_students.index(obj.student_id) + 1
             return position
         except ValueError:
             return 0
@@ -165,10 +199,10 @@ class LessonMaterialSerializer(serializers.ModelSerializer):
             'school_class', 'class_name',
             'subject', 'subject_name',
             'week', 'topic', 'objectives', 'activities', 'evaluation',
-            'file', 'file_url', 'file_size',
+            'file', 'file_url', 'file_size', 'file_mime_type',
             'status', 'created_at', 'updated_at',
         ]
-        read_only_fields = ['teacher', 'created_at', 'updated_at']
+        read_only_fields = ['teacher', 'file_mime_type', 'created_at', 'updated_at']
 
     def get_file_url(self, obj):
         if obj.file:
@@ -176,18 +210,17 @@ class LessonMaterialSerializer(serializers.ModelSerializer):
         return None
 
     def get_file_size(self, obj):
-        if obj.file:
-            try:
-                size = obj.file.size
-                if size < 1024:
-                    return f"{size} B"
-                elif size < 1024 * 1024:
-                    return f"{size / 1024:.1f} KB"
-                else:
-                    return f"{size / (1024 * 1024):.1f} MB"
-            except Exception:
-                return None
-        return None
+        # Read from the cached column: asking the storage backend costs a
+        # round trip per row when listing materials.
+        size = obj.file_size
+        if not obj.file or size is None:
+            return None
+        if size < 1024:
+            return f"{size} B"
+        elif size < 1024 * 1024:
+            return f"{size / 1024:.1f} KB"
+        else:
+            return f"{size / (1024 * 1024):.1f} MB"
 
     def validate_status(self, value):
         request = self.context.get('request')
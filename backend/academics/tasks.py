@@ -0,0 +1,75 @@
+import io
+import zipfile
+from xml.etree import ElementTree
+
+from celery import shared_task
+from django.db import transaction
+
+from .models import LessonMaterial
+
+
+# Enough for any lesson note; keeps a scanned textbook from bloating the row.
+MAX_EXTRACTED_CHARS = 200_000
+
+DOCX_TEXT_TAG = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'
+DOCX_PARAGRAPH_TAG = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p'
+
+
+def _pdf_text(data):
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(data))
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def _docx_text(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read('word/document.xml'))
+    return '\n'.join(
+        ''.join(node.text or '' for node in paragraph.iter(DOCX_TEXT_TAG))
+        for paragraph in root.iter(DOCX_PARAGRAPH_TAG)
+    )
+
+
+def extract_text(name, data):
+    """Plain text of a PDF or DOCX attachment; '' for anything else."""
+    name = name.lower()
+    if name.endswith('.pdf'):
+        return _pdf_text(data)
+    if name.endswith('.docx'):
+        return _docx_text(data)
+    return ''
+
+
+@shared_task
+def extract_material_text(material_id):
+    """Fill LessonMaterial.file_text so attachments are covered by full-text search."""
+    material = LessonMaterial.objects.filter(id=material_id).only('id', 'file', 'file_hash').first()
+    if not material or not material.file:
+        return 0
+    try:
+        with material.file.open('rb') as fh:
+            text = extract_text(material.file.name, fh.read())
+    except Exception as e:
+        print(f"Error extracting text from {material.file.name}: {e}")
+        return 0
+
+    text = ' '.join(text.split())[:MAX_EXTRACTED_CHARS]
+    # Guard on the hash so a file replaced while we were reading is not overwritten.
+    return LessonMaterial.objects.filter(id=material_id, file_hash=material.file_hash).update(file_text=text)
+
+
+def queue_text_extraction(material_id):
+    """Hand extraction to a worker once the upload's transaction has committed."""
+    def dispatch():
+        try:
+            extract_material_text.delay(str(material_id))
+        except Exception as e:
+            print(f"Error queueing text extraction for material {material_id}: {e}")
+    transaction.on_commit(dispatch)
+
+
+@shared_task
+def discard_abandoned_uploads_task():
+    """Nightly sweep of chunked uploads that were started but never completed."""
+    from .uploads import discard_abandoned_uploads
+    return discard_abandoned_uploads()
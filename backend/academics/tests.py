@@ -135,6 +135,141 @@ class ReportCardTests(APITestCase):
         self.assertEqual(self.report_card.admin_remarks, 'Excellent student!')
         self.assertTrue(self.report_card.is_published)
 
+    def test_bulk_publish_is_set_based_and_reports_counts(self):
+        from accounts.models import Notification, ParentProfile, StudentProfile
+
+        parent = User.objects.create_user(
+            email="parent@test.com", username="parentuser", role="parent", password="securepassword123"
+        )
+        ParentProfile.objects.create(user=parent)
+        pupils = []
+        for i in range(5):
+            pupil = User.objects.create_user(
+                email=f"pupil{i}@test.com", username=f"pupil{i}", first_name=f"Pupil{i}",
+                last_name="User", role="student", password="securepassword123"
+            )
+            StudentProfile.objects.create(
+                user=pupil, admission_number=f"ADM{i}", current_class=self.school_class, parent=parent
+            )
+            pupils.append(pupil)
+        self.report_card.psychomotor = {'neatness': 4}
+        self.report_card.save()
+
+        records = [{'student_id': str(p.id), 'admin_remarks': 'Good', 'is_published': True} for p in pupils]
+        records.append({'student_id': str(self.student.id), 'admin_remarks': 'Fine', 'is_published': True})
+
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(13):
+            response = self.client.post(self.bulk_url, {'term': str(self.term.id), 'records': records}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (response.data['created'], response.data['updated'], response.data['published']), (5, 1, 6)
+        )
+        self.report_card.refresh_from_db()
+        self.assertEqual(self.report_card.admin_remarks, 'Fine')
+        self.assertEqual(self.report_card.psychomotor, {'neatness': 4})
+        self.assertEqual(ReportCard.objects.filter(term=self.term, is_published=True).count(), 6)
+        self.assertEqual(Notification.objects.filter(recipient=parent).count(), 5)
+        self.assertEqual(Notification.objects.filter(recipient__in=pupils + [self.student]).count(), 6)
+
+        # Re-publishing already published cards sends nothing new.
+        response = self.client.post(self.bulk_url, {'term': str(self.term.id), 'records': records}, format='json')
+        self.assertEqual(
+            (response.data['created'], response.data['updated'], response.data['published']), (0, 6, 0)
+        )
+        self.assertEqual(Notification.objects.filter(recipient=parent).count(), 5)
+
+    def test_publishing_freezes_results_snapshot(self):
+        from academics.models import Subject, AssessmentType, Assessment, StudentScore
+        from accounts.models import ParentProfile
+
+        parent = User.objects.create_user(
+            email="parent@test.com", username="parentuser", role="parent", password="securepassword123"
+        )
+        ParentProfile.objects.create(user=parent)
+        self.student_profile.parent = parent
+        self.student_profile.save()
+
+        maths = Subject.objects.create(name="Mathematics", code="MATH1", level=self.level)
+        ca = AssessmentType.objects.create(name="CA 1", max_score=40, weight=40)
+        exam = AssessmentType.objects.create(name="Exam", max_score=60, weight=60)
+        ca_score = StudentScore.objects.create(
+            student=self.student, score_obtained=30,
+            assessment=Assessment.objects.create(
+                name="Math CA", assessment_type=ca, school_class=self.school_class, subject=maths, term=self.term
+            ),
+        )
+        StudentScore.objects.create(
+            student=self.student, score_obtained=50,
+            assessment=Assessment.objects.create(
+                name="Math Exam", assessment_type=exam, school_class=self.school_class, subject=maths, term=self.term
+            ),
+        )
+
+        self.client.force_authenticate(user=self.admin)
+        records = [{'student_id': str(self.student.id), 'admin_remarks': 'Well done', 'is_published': True}]
+        self.client.post(self.bulk_url, {'term': str(self.term.id), 'records': records}, format='json')
+
+        # Later score edits do not leak into published results.
+        ca_score.score_obtained = 10
+        ca_score.save()
+
+        self.client.force_authenticate(user=parent)
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse('reportcard-results'))
+        results = res.data['results'][0]['results']
+        self.assertEqual(results['subjects'][0]['scores'], {'CA 1': 30.0, 'Exam': 50.0})
+        self.assertEqual((results['total'], results['position'], results['class_size']), (80.0, 1, 1))
+
+        # Publishing again rebuilds the snapshot from current scores.
+        self.client.force_authenticate(user=self.admin)
+        self.client.patch(self.detail_url, {'is_published': True})
+        self.report_card.refresh_from_db()
+        self.assertEqual(self.report_card.results['total'], 60.0)
+
+        self.client.patch(self.detail_url, {'is_published': False})
+        self.report_card.refresh_from_db()
+        self.assertIsNone(self.report_card.results)
+
+    def test_card_list_resolves_classes_per_page_and_counts_active_pupils(self):
+        from accounts.models import StudentProfile
+
+        for i, pupil_status in enumerate(['active', 'active', 'suspended']):
+            pupil = User.objects.create_user(
+                email=f"pupil{i}@test.com", username=f"pupil{i}", role="student", password="securepassword123"
+            )
+            StudentProfile.objects.create(
+                user=pupil, admission_number=f"ADM{i}", current_class=self.school_class, status=pupil_status
+            )
+            ReportCard.objects.create(student=pupil, term=self.term)
+
+        self.client.force_authenticate(user=self.admin)
+        # Count, page, one roster and one score-totals query for the shared class.
+        with self.assertNumQueries(4):
+            res = self.client.get(self.list_url)
+        cards = res.data.get('results', res.data)
+        self.assertEqual(len(cards), 4)
+        self.assertEqual({card['class_size'] for card in cards}, {3})
+        positions = {card['student']: card['class_position'] for card in cards}
+        self.assertEqual(sorted(positions.values()), [0, 1, 2, 3])
+
+    def test_results_read_is_read_only_and_command_backfills(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        # A card published before snapshots existed.
+        ReportCard.objects.filter(id=self.report_card.id).update(is_published=True, results=None)
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(2):
+            res = self.client.get(reverse('reportcard-results'))
+        self.assertIsNone(res.data['results'][0]['results'])
+        self.report_card.refresh_from_db()
+        self.assertIsNone(self.report_card.results)
+
+        call_command('snapshot_report_cards', stdout=StringIO())
+        self.report_card.refresh_from_db()
+        self.assertEqual(self.report_card.results['total'], 0.0)
+
     def test_parent_score_visibility_requires_admin_publishing(self):
         from academics.models import Subject, AssessmentType, Assessment, StudentScore
         from accounts.models import ParentProfile
@@ -205,3 +340,439 @@ class ReportCardTests(APITestCase):
         self.assertIsNotNone(notif)
         self.assertIn("next term begins on", notif.message.lower())
 
+
+
+class AcademicYearRolloverTests(APITestCase):
+    def setUp(self):
+        from academics.models import ClassLevel, SchoolClass
+        from accounts.models import StudentProfile
+
+        self.year = AcademicYear.objects.create(
+            name="2025/2026", start_date="2025-09-01", end_date="2026-07-20", is_current=True
+        )
+        self.next_year = AcademicYear.objects.create(
+            name="2026/2027", start_date="2026-09-01", end_date="2027-07-20"
+        )
+        self.admin = User.objects.create_user(
+            email="admin@test.com", username="adminuser", first_name="Admin",
+            last_name="User", role="admin", password="securepassword123"
+        )
+        self.teacher = User.objects.create_user(
+            email="teacher@test.com", username="teacheruser", first_name="Teacher",
+            last_name="User", role="teacher", password="securepassword123"
+        )
+        self.p5 = ClassLevel.objects.create(name="Primary 5", numeric_level=5)
+        self.p6 = ClassLevel.objects.create(name="Primary 6", numeric_level=6)
+        self.p5a = SchoolClass.objects.create(name="Primary 5A", level=self.p5, teacher=self.teacher, academic_year=self.year)
+        self.p6a = SchoolClass.objects.create(name="Primary 6A", level=self.p6, academic_year=self.year)
+
+        self.pupils = {}
+        for i, school_class in enumerate([self.p5a, self.p5a, self.p6a]):
+            pupil = User.objects.create_user(
+                email=f"pupil{i}@test.com", username=f"pupil{i}", first_name="Pupil",
+                last_name=str(i), role="student", password="securepassword123"
+            )
+            StudentProfile.objects.create(user=pupil, admission_number=f"ADM{i}", current_class=school_class)
+            self.pupils[i] = pupil
+
+        self.url = reverse('academicyear-rollover', kwargs={'pk': self.year.id})
+        self.client.force_authenticate(user=self.admin)
+
+    def test_dry_run_previews_without_writing(self):
+        from academics.models import SchoolClass, StudentPromotion
+
+        res = self.client.post(self.url, {'to_year': str(self.next_year.id), 'dry_run': True}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['promoted'], 2)
+        self.assertEqual(res.data['graduated'], 1)
+        self.assertEqual(res.data['classes_to_create'], ['Primary 5A', 'Primary 6A'])
+        self.assertFalse(SchoolClass.objects.filter(academic_year=self.next_year).exists())
+        self.assertFalse(StudentPromotion.objects.exists())
+
+    def test_rollover_promotes_graduates_and_records_history(self):
+        from academics.models import SchoolClass, StudentPromotion
+
+        res = self.client.post(self.url, {'to_year': str(self.next_year.id)}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        new_p5a = SchoolClass.objects.get(name="Primary 5A", academic_year=self.next_year)
+        new_p6a = SchoolClass.objects.get(name="Primary 6A", academic_year=self.next_year)
+        self.assertEqual(new_p5a.teacher, self.teacher)
+
+        self.pupils[0].student_profile.refresh_from_db()
+        self.pupils[2].student_profile.refresh_from_db()
+        self.assertEqual(self.pupils[0].student_profile.current_class, new_p6a)
+        self.assertIsNone(self.pupils[2].student_profile.current_class)
+        self.assertEqual(self.pupils[2].student_profile.status, 'graduated')
+        self.assertEqual(StudentPromotion.objects.filter(to_academic_year=self.next_year).count(), 3)
+
+        # Running it again is a no-op.
+        res = self.client.post(self.url, {'to_year': str(self.next_year.id)}, format='json')
+        self.assertEqual(res.data['promoted'], 0)
+        self.assertEqual(StudentPromotion.objects.filter(to_academic_year=self.next_year).count(), 3)
+
+    def test_rollover_query_count_does_not_grow_with_pupils(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from accounts.models import StudentProfile
+
+        for i in range(3, 40):
+            pupil = User.objects.create_user(
+                email=f"pupil{i}@test.com", username=f"pupil{i}", first_name="Pupil",
+                last_name=str(i), role="student", password="securepassword123"
+            )
+            StudentProfile.objects.create(user=pupil, admission_number=f"ADM{i}", current_class=self.p5a)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(self.url, {'to_year': str(self.next_year.id)}, format='json')
+        self.assertEqual(res.data['promoted'], 39)
+        self.assertLess(len(ctx.captured_queries), 20)
+
+    def test_malformed_rollover_input_is_rejected(self):
+        for payload in [
+            {'to_year': 'not-a-uuid'},
+            {'to_year': str(self.next_year.id), 'teacher_assignments': ['Primary 5A']},
+            {'to_year': str(self.next_year.id), 'teacher_assignments': {'Primary 5A': str(self.admin.id)}},
+            {'to_year': str(self.next_year.id), 'repeat_student_ids': str(self.pupils[0].id)},
+        ]:
+            res = self.client.post(self.url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, payload)
+
+    def test_teacher_cannot_roll_over(self):
+        self.client.force_authenticate(user=self.teacher)
+        res = self.client.post(self.url, {'to_year': str(self.next_year.id)}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ClassEnrollmentTests(APITestCase):
+    def setUp(self):
+        from academics.models import ClassLevel, SchoolClass
+        from accounts.models import StudentProfile
+
+        self.year = AcademicYear.objects.create(
+            name="2025/2026", start_date="2025-09-01", end_date="2026-07-20"
+        )
+        self.next_year = AcademicYear.objects.create(
+            name="2026/2027", start_date="2026-09-01", end_date="2027-07-20", is_current=True
+        )
+        self.old_term = Term.objects.create(
+            academic_year=self.year, name="3rd Term", start_date="2026-04-20", end_date="2026-07-20"
+        )
+        self.admin = User.objects.create_user(
+            email="admin@test.com", username="adminuser", first_name="Admin",
+            last_name="User", role="admin", password="securepassword123"
+        )
+        self.old_teacher = User.objects.create_user(
+            email="teacher@test.com", username="teacheruser", first_name="Teacher",
+            last_name="User", role="teacher", password="securepassword123"
+        )
+        self.student = User.objects.create_user(
+            email="student@test.com", username="studentuser", first_name="Student",
+            last_name="User", role="student", password="securepassword123"
+        )
+        p1 = ClassLevel.objects.create(name="Primary 1", numeric_level=1)
+        p2 = ClassLevel.objects.create(name="Primary 2", numeric_level=2)
+        self.old_class = SchoolClass.objects.create(
+            name="Primary 1A", level=p1, teacher=self.old_teacher, academic_year=self.year
+        )
+        self.new_class = SchoolClass.objects.create(name="Primary 2A", level=p2, academic_year=self.next_year)
+        self.profile = StudentProfile.objects.create(
+            user=self.student, admission_number="ADM1", current_class=self.old_class
+        )
+        self.report_card = ReportCard.objects.create(student=self.student, term=self.old_term)
+
+    def test_changing_current_class_closes_and_opens_enrollments(self):
+        from academics.models import ClassEnrollment
+
+        self.assertEqual(ClassEnrollment.objects.get(end_date__isnull=True).school_class, self.old_class)
+        self.profile.current_class = self.new_class
+        self.profile.save()
+
+        enrollments = ClassEnrollment.objects.filter(student=self.student)
+        self.assertEqual(enrollments.count(), 2)
+        self.assertIsNotNone(enrollments.get(school_class=self.old_class).end_date)
+        self.assertEqual(enrollments.get(end_date__isnull=True).school_class, self.new_class)
+
+        # Saving without a class change leaves history alone.
+        self.profile.blood_group = 'O+'
+        self.profile.save()
+        self.assertEqual(ClassEnrollment.objects.filter(student=self.student).count(), 2)
+
+    def test_past_term_report_cards_stay_with_the_old_class(self):
+        self.profile.current_class = self.new_class
+        self.profile.save()
+
+        self.client.force_authenticate(user=self.admin)
+        res = self.client.get(reverse('reportcard-list'), {'school_class': str(self.old_class.id)})
+        results = res.data.get('results', res.data)
+        self.assertEqual([r['id'] for r in results], [str(self.report_card.id)])
+        self.assertEqual(results[0]['class_size'], 1)
+
+        res = self.client.get(reverse('reportcard-list'), {'school_class': str(self.new_class.id)})
+        self.assertEqual(len(res.data.get('results', res.data)), 0)
+
+        # The old class teacher still sees last year's card.
+        self.client.force_authenticate(user=self.old_teacher)
+        res = self.client.get(reverse('reportcard-list'))
+        self.assertEqual(len(res.data.get('results', res.data)), 1)
+
+    def test_mid_year_class_change_keeps_earlier_terms_with_the_first_class(self):
+        import datetime
+        from academics.models import ClassEnrollment, SchoolClass
+
+        first_term = Term.objects.create(
+            academic_year=self.year, name="1st Term", start_date="2025-09-01", end_date="2025-12-15"
+        )
+        first_card = ReportCard.objects.create(student=self.student, term=first_term)
+        parallel_class = SchoolClass.objects.create(
+            name="Primary 1B", level=self.old_class.level, academic_year=self.year
+        )
+        ClassEnrollment.move({self.student.id: parallel_class}, on_date=datetime.date(2026, 2, 10))
+
+        self.assertEqual(
+            list(ClassEnrollment.objects.for_term(first_term).values_list('school_class', flat=True)),
+            [self.old_class.id]
+        )
+        self.client.force_authenticate(user=self.admin)
+        res = self.client.get(reverse('reportcard-list'), {'school_class': str(parallel_class.id)})
+        self.assertEqual([r['id'] for r in res.data.get('results', res.data)], [str(self.report_card.id)])
+
+        res = self.client.get(reverse('reportcard-list'), {'school_class': str(self.old_class.id)})
+        results = {r['id']: r for r in res.data.get('results', res.data)}
+        self.assertIn(str(first_card.id), results)
+        self.assertEqual(results[str(first_card.id)]['class_size'], 1)
+
+
+class ChunkedMaterialUploadTests(APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        from academics.models import ClassLevel, SchoolClass, Subject, LessonMaterial
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CHUNKED_UPLOAD_DIR=f"{self.media_root}/parts",
+            CHUNKED_UPLOAD_CHUNK_SIZE=4,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        year = AcademicYear.objects.create(name="2025/2026", start_date="2025-09-01", end_date="2026-07-20")
+        self.teacher = User.objects.create_user(
+            email="teacher@test.com", username="teacheruser", first_name="Teacher",
+            last_name="User", role="teacher", password="securepassword123"
+        )
+        level = ClassLevel.objects.create(name="Primary 1", numeric_level=1)
+        school_class = SchoolClass.objects.create(name="Primary 1A", level=level, academic_year=year)
+        subject = Subject.objects.create(name="Mathematics", code="MTH", level=level)
+        self.material = LessonMaterial.objects.create(
+            teacher=self.teacher, school_class=school_class, subject=subject, week="Week 1", topic="Fractions"
+        )
+        self.other = LessonMaterial.objects.create(
+            teacher=self.teacher, school_class=school_class, subject=subject, week="Week 2", topic="Decimals"
+        )
+        self.client.force_authenticate(user=self.teacher)
+
+    def _upload(self, material, content, order=None):
+        res = self.client.post(
+            reverse('lessonmaterial-start-upload', args=[material.id]),
+            {'filename': 'notes.pdf', 'size': len(content)}, format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        upload_id = res.data['upload_id']
+        parts = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for number in order or range(1, len(parts) + 1):
+            res = self.client.put(
+                reverse('lessonmaterial-upload-part', args=[upload_id, number]),
+                parts[number - 1], content_type='application/octet-stream'
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return upload_id
+
+    def test_parts_resume_out_of_order_and_assemble(self):
+        content = b'%PDF-1.4 lesson'
+        upload_id = self._upload(self.material, content, order=[3, 1])
+
+        res = self.client.get(reverse('lessonmaterial-upload-status', args=[upload_id]))
+        self.assertEqual(res.data['part_count'], 4)
+        self.assertEqual(res.data['received_parts'], [1, 3])
+
+        res = self.client.post(reverse('lessonmaterial-complete-upload', args=[upload_id]))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for number in (4, 2):
+            self.client.put(
+                reverse('lessonmaterial-upload-part', args=[upload_id, number]),
+                content[(number - 1) * 4:number * 4], content_type='application/octet-stream'
+            )
+        res = self.client.post(reverse('lessonmaterial-complete-upload', args=[upload_id]))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['file_size'], f"{len(content)} B")
+        self.assertEqual(res.data['file_mime_type'], 'application/pdf')
+
+        self.material.refresh_from_db()
+        with self.material.file.open('rb') as fh:
+            self.assertEqual(fh.read(), content)
+
+    def test_completing_twice_returns_the_assembled_material(self):
+        upload_id = self._upload(self.material, b'%PDF-1.4 lesson')
+        url = reverse('lessonmaterial-complete-upload', args=[upload_id])
+        first = self.client.post(url)
+        second = self.client.post(url)
+        self.assertEqual((first.status_code, second.status_code), (status.HTTP_200_OK, status.HTTP_200_OK))
+        self.assertEqual(second.data['file_size'], first.data['file_size'])
+
+    def test_abandoned_uploads_are_swept(self):
+        import datetime
+        import os
+        from django.conf import settings
+        from django.utils import timezone
+        from academics.models import MaterialUpload
+        from academics.uploads import discard_abandoned_uploads
+
+        abandoned = self._upload(self.material, b'%PDF-1.4 lesson', order=[1, 2])
+        active = self._upload(self.other, b'%PDF-1.4 other', order=[1])
+        MaterialUpload.objects.filter(id=abandoned).update(created_at=timezone.now() - datetime.timedelta(days=3))
+        orphan = os.path.join(settings.CHUNKED_UPLOAD_DIR, 'no-such-upload')
+        os.makedirs(orphan)
+        old = (timezone.now() - datetime.timedelta(days=3)).timestamp()
+        os.utime(orphan, (old, old))
+
+        self.assertEqual(discard_abandoned_uploads(), 1)
+        self.assertEqual([str(i) for i in MaterialUpload.objects.values_list('id', flat=True)], [active])
+        self.assertEqual(sorted(os.listdir(settings.CHUNKED_UPLOAD_DIR)), [active])
+
+    def test_wrong_part_size_is_rejected(self):
+        res = self.client.post(
+            reverse('lessonmaterial-start-upload', args=[self.material.id]),
+            {'filename': 'notes.pdf', 'size': 10}, format='json'
+        )
+        res = self.client.put(
+            reverse('lessonmaterial-upload-part', args=[res.data['upload_id'], 1]),
+            b'too long', content_type='application/octet-stream'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_empty_part_is_rejected(self):
+        res = self.client.post(
+            reverse('lessonmaterial-start-upload', args=[self.material.id]),
+            {'filename': 'notes.pdf', 'size': 10}, format='json'
+        )
+        res = self.client.put(
+            reverse('lessonmaterial-upload-part', args=[res.data['upload_id'], 1]),
+            b'', content_type='application/octet-stream'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_failed_assembly_returns_upload_to_pending(self):
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+        from academics.models import MaterialUpload
+
+        upload_id = self._upload(self.material, b'%PDF-1.4 lesson')
+        url = reverse('lessonmaterial-complete-upload', args=[upload_id])
+        MaterialUpload.objects.filter(id=upload_id).update(status='assembling')
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+        MaterialUpload.objects.filter(id=upload_id).update(status='pending')
+        with mock.patch.object(FileSystemStorage, 'save', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.client.post(url)
+        self.assertEqual(MaterialUpload.objects.get(id=upload_id).status, 'pending')
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+
+    def test_identical_files_share_storage(self):
+        content = b'same bytes'
+        self.client.post(reverse('lessonmaterial-complete-upload', args=[self._upload(self.material, content)]))
+        self.client.post(reverse('lessonmaterial-complete-upload', args=[self._upload(self.other, content)]))
+
+        self.material.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.material.file.name, self.other.file.name)
+        self.assertEqual(self.material.file_hash, self.other.file_hash)
+
+    def test_list_reads_size_without_touching_storage(self):
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+
+        self.client.post(reverse('lessonmaterial-complete-upload', args=[self._upload(self.material, b'12345')]))
+        with mock.patch.object(FileSystemStorage, 'size', side_effect=AssertionError('storage hit')):
+            res = self.client.get(reverse('lessonmaterial-list'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sizes = {r['id']: r['file_size'] for r in res.data.get('results', res.data)}
+        self.assertEqual(sizes[str(self.material.id)], '5 B')
+
+
+class LessonMaterialSearchTests(APITestCase):
+    def setUp(self):
+        from academics.models import ClassLevel, SchoolClass, Subject, LessonMaterial
+
+        year = AcademicYear.objects.create(name="2025/2026", start_date="2025-09-01", end_date="2026-07-20")
+        self.admin = User.objects.create_user(
+            email="admin@test.com", username="adminuser", first_name="Admin",
+            last_name="User", role="admin", password="securepassword123"
+        )
+        teacher = User.objects.create_user(
+            email="teacher@test.com", username="teacheruser", first_name="Teacher",
+            last_name="User", role="teacher", password="securepassword123"
+        )
+        level = ClassLevel.objects.create(name="Primary 1", numeric_level=1)
+        school_class = SchoolClass.objects.create(name="Primary 1A", level=level, academic_year=year)
+        subject = Subject.objects.create(name="Science", code="SCI", level=level)
+        common = {'teacher': teacher, 'school_class': school_class, 'subject': subject}
+        self.topic_match = LessonMaterial.objects.create(
+            week="Week 1", topic="Photosynthesis in green plants", objectives="Explain how leaves make food.", **common
+        )
+        self.body_match = LessonMaterial.objects.create(
+            week="Week 2", topic="Plant parts", objectives="Name the parts of a plant.",
+            activities="Observe photosynthesis with a leaf in sunlight.", **common
+        )
+        self.attachment_match = LessonMaterial.objects.create(
+            week="Week 3", topic="Revision", objectives="Recap the term.", **common
+        )
+        LessonMaterial.objects.filter(id=self.attachment_match.id).update(
+            file_text="Worksheet: photosynthesis needs water, carbon dioxide and light."
+        )
+        LessonMaterial.objects.create(week="Week 4", topic="Counting", objectives="Count to ten.", **common)
+        self.client.force_authenticate(user=self.admin)
+
+    def test_search_ranks_topic_matches_first_and_highlights(self):
+        res = self.client.get(reverse('lessonmaterial-search'), {'q': 'photosynthesis'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']
+        self.assertEqual(
+            [r['id'] for r in results],
+            [str(self.topic_match.id), str(self.body_match.id), str(self.attachment_match.id)]
+        )
+        self.assertIn('<mark>Photosynthesis</mark>', results[0]['topic_highlight'])
+        self.assertIn('<mark>photosynthesis</mark>', results[2]['snippet'])
+
+    def test_search_requires_query_and_honours_filters(self):
+        res = self.client.get(reverse('lessonmaterial-search'))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(reverse('lessonmaterial-search'), {'q': 'photosynthesis -sunlight', 'status': 'draft'})
+        self.assertEqual(
+            {r['id'] for r in res.data['results']}, {str(self.topic_match.id), str(self.attachment_match.id)}
+        )
+        res = self.client.get(reverse('lessonmaterial-search'), {'q': 'photosynthesis', 'status': 'approved'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_docx_text_is_extracted(self):
+        import io
+        import zipfile
+        from academics.tasks import extract_text
+
+        xml = (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            '<w:body><w:p><w:r><w:t>Food </w:t></w:r><w:r><w:t>chains</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>Predators</w:t></w:r></w:p></w:body></w:document>'
+        )
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('word/document.xml', xml)
+        self.assertEqual(extract_text('notes.DOCX', buffer.getvalue()), 'Food chains\nPredators')
+        self.assertEqual(extract_text('notes.png', b'binary'), '')
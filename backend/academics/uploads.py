@@ -0,0 +1,170 @@
+"""
+Resumable chunked uploads for lesson material attachments.
+
+init    -> MaterialUpload row describing the file and its part size
+parts   -> each part is streamed straight from the request body to disk
+complete-> the upload is marked 'assembling' under a short row lock, then the
+           parts are concatenated into one temporary file (hashing as we go)
+           and handed to the storage backend, or linked to an identical copy,
+           with no lock or transaction held; a second short locked update
+           records the file on the material and marks the upload complete
+
+Uploads left pending (or stuck assembling) past CHUNKED_UPLOAD_EXPIRY_HOURS are swept away with
+their parts by `discard_abandoned_uploads`, run nightly from Celery beat.
+"""
+import datetime
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LessonMaterial, MaterialUpload
+from .tasks import queue_text_extraction
+
+
+COPY_BUFFER = 64 * 1024
+
+
+def expected_part_size(upload, number):
+    if number < upload.part_count:
+        return upload.chunk_size
+    return upload.total_size - upload.chunk_size * (upload.part_count - 1)
+
+
+def write_part(upload, number, stream):
+    """Stream one part (1-based) from `stream` to disk. Re-sending a part overwrites it."""
+    if not 1 <= number <= upload.part_count:
+        raise ValueError(f'Part number must be between 1 and {upload.part_count}.')
+
+    expected = expected_part_size(upload, number)
+    os.makedirs(upload.part_dir, exist_ok=True)
+    # Unique per request, so concurrent re-sends of one part never share a file.
+    with tempfile.NamedTemporaryFile(
+        dir=upload.part_dir, prefix=f'{number:05d}.', suffix='.tmp', delete=False
+    ) as out:
+        tmp_path = out.name
+        written = 0
+        while True:
+            block = stream.read(COPY_BUFFER)
+            if not block:
+                break
+            written += len(block)
+            if written > expected:
+                break
+            out.write(block)
+
+    if written != expected:
+        os.remove(tmp_path)
+        raise ValueError(f'Part {number} must be exactly {expected} bytes.')
+    os.replace(tmp_path, upload.part_path(number))
+
+
+def _claim_for_assembly(upload):
+    """Lock the upload just long enough to move it from 'pending' to 'assembling'."""
+    with transaction.atomic():
+        upload = MaterialUpload.objects.select_for_update(of=('self',)).select_related('material').get(pk=upload.pk)
+        if upload.status == 'complete':
+            return upload, False
+        if upload.status == 'assembling':
+            raise ValueError('This upload is already being assembled; try again shortly.')
+
+        missing = sorted(set(range(1, upload.part_count + 1)) - set(upload.received_parts()))
+        if missing:
+            raise ValueError(f"Missing parts: {', '.join(str(n) for n in missing)}.")
+        upload.status = 'assembling'
+        upload.save(update_fields=['status'])
+    return upload, True
+
+
+def complete_upload(upload):
+    """
+    Assemble all parts, attach the result to the upload's material and clean up.
+    Only the status flips take the row lock: a second call while the parts are
+    being assembled is refused, and one after completion returns the material.
+    """
+    upload, claimed = _claim_for_assembly(upload)
+    if not claimed:
+        return upload.material
+
+    try:
+        material = _assemble(upload)
+    except BaseException:
+        MaterialUpload.objects.filter(pk=upload.pk, status='assembling').update(status='pending')
+        raise
+    upload.discard_parts()
+    return material
+
+
+def _assemble(upload):
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=settings.CHUNKED_UPLOAD_DIR, suffix='.assembling', delete=False) as out:
+        assembled_path = out.name
+        for number in range(1, upload.part_count + 1):
+            with open(upload.part_path(number), 'rb') as part:
+                for block in iter(lambda: part.read(COPY_BUFFER), b''):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+
+    try:
+        material = upload.material
+        file_hash = digest.hexdigest()
+        duplicate = LessonMaterial.objects.filter(file_hash=file_hash).exclude(file='').exclude(pk=material.pk).first()
+        if duplicate:
+            material.file.name = duplicate.file.name
+            material.file_text = duplicate.file_text
+        else:
+            with open(assembled_path, 'rb') as fh:
+                material.file.save(upload.filename, File(fh), save=False)
+            material.file_text = ''
+    finally:
+        os.remove(assembled_path)
+
+    material.file_size = size
+    material.file_hash = file_hash
+    material.file_mime_type = (
+        upload.mime_type or mimetypes.guess_type(upload.filename)[0] or 'application/octet-stream'
+    )
+    with transaction.atomic():
+        MaterialUpload.objects.filter(pk=upload.pk).update(status='complete')
+        material.save(update_fields=['file', 'file_size', 'file_mime_type', 'file_hash', 'file_text', 'updated_at'])
+        if not duplicate:
+            queue_text_extraction(material.pk)
+    return material
+
+
+def discard_abandoned_uploads(max_age=None):
+    """
+    Delete pending uploads older than `max_age` (CHUNKED_UPLOAD_EXPIRY_HOURS by
+    default) with their parts, plus part directories and half-assembled files
+    in CHUNKED_UPLOAD_DIR that no upload owns any more. Returns the number of
+    uploads deleted.
+    """
+    if max_age is None:
+        max_age = datetime.timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+    stale = MaterialUpload.objects.filter(status__in=['pending', 'assembling'], created_at__lt=timezone.now() - max_age)
+    for upload in stale:
+        upload.discard_parts()
+    deleted, _ = stale.delete()
+
+    if not os.path.isdir(settings.CHUNKED_UPLOAD_DIR):
+        return deleted
+    cutoff = time.time() - max_age.total_seconds()
+    live = {str(upload_id) for upload_id in MaterialUpload.objects.values_list('id', flat=True)}
+    for entry in os.scandir(settings.CHUNKED_UPLOAD_DIR):
+        if entry.stat().st_mtime >= cutoff:
+            continue
+        if entry.is_dir() and entry.name not in live:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.is_file() and entry.name.endswith('.assembling'):
+            os.remove(entry.path)
+    return deleted
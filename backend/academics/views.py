@@ -1,21 +1,82 @@
+import os
+from collections import defaultdict
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
+from django.db.models import Exists, OuterRef, Q, Subquery
 from django.utils import timezone
-from .models import AcademicYear, Term, ClassLevel, SchoolClass, Subject, AssessmentType, Assessment, StudentScore, ReportCard, SchoolEvent, LessonMaterial
+from .models import AcademicYear, Term, ClassLevel, SchoolClass, ClassEnrollment, Subject, AssessmentType, Assessment, StudentScore, ReportCard, SchoolEvent, LessonMaterial
 from .serializers import (
     AcademicYearSerializer, TermSerializer,
     ClassLevelSerializer, SchoolClassSerializer, SubjectSerializer,
     AssessmentTypeSerializer, AssessmentSerializer, StudentScoreSerializer,
-    ReportCardSerializer, SchoolEventSerializer, LessonMaterialSerializer
+    ReportCardSerializer, SchoolEventSerializer, LessonMaterialSerializer, RolloverSerializer
 )
 
+def _term_enrollments(**filters):
+    """ClassEnrollment rows for the outer row's student and term; the outer row must expose student_id and term."""
+    return ClassEnrollment.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=OuterRef('term__start_date')),
+        start_date__lte=OuterRef('term__end_date'),
+        student_id=OuterRef('student_id'),
+        academic_year_id=OuterRef('term__academic_year_id'),
+        **filters,
+    )
+
+
+def enrolled_during_term(**filters):
+    """
+    Exists() over ClassEnrollment for the outer row's student and term, so
+    report cards resolve to the class the pupil was in that term rather than
+    the one they are in today.
+    """
+    return Exists(_term_enrollments(**filters))
+
+
+def class_during_term():
+    """The class the outer row's pupil was in during its term; the latest enrolment wins after a mid-term move."""
+    return Subquery(_term_enrollments().order_by('-start_date').values('school_class_id')[:1])
+
+
 class AcademicYearViewSet(viewsets.ModelViewSet):
     queryset = AcademicYear.objects.all()
     serializer_class = AcademicYearSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=True, methods=['post'])
+    def rollover(self, request, pk=None):
+        """
+        Promote every active pupil of this academic year into `to_year`:
+        clone the classes, move pupils up one level and graduate the top level.
+        Pass `dry_run: true` to preview the plan without writing anything.
+        """
+        if request.user.role != 'admin':
+            return Response({'error': 'Only admins can roll over an academic year.'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = RolloverSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        from_year = self.get_object()
+        to_year = AcademicYear.objects.filter(id=params['to_year']).first()
+        if not to_year:
+            return Response({'error': 'Target academic year not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if to_year.start_date <= from_year.start_date:
+            return Response({'error': 'Target academic year must start after the current one.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        from .rollover import build_rollover_plan, execute_rollover
+        plan = build_rollover_plan(
+            from_year, to_year,
+            teacher_assignments=params.get('teacher_assignments'),
+            repeat_student_ids=params.get('repeat_student_ids'),
+        )
+        if params['dry_run']:
+            return Response({'dry_run': True, **plan.summary()})
+
+        summary = execute_rollover(plan, performed_by=request.user)
+        return Response({'dry_run': False, **summary})
+
 class TermViewSet(viewsets.ModelViewSet):
     queryset = Term.objects.all()
     serializer_class = TermSerializer
@@ -72,46 +133,20 @@ class TermViewSet(viewsets.ModelViewSet):
 
         # 2. Auto-Generate / Refresh School Fees for the Active Term
         fees_generated_count = 0
+        fees_queued = False
         try:
-            from accounts.models import User
-            from finance.models import FeeType, StudentFee
-            
-            active_students = User.objects.filter(
-                role='student',
-                is_active=True,
-                student_profile__current_class__isnull=False
-            ).select_related('student_profile__current_class__level', 'student_profile__parent')
-
-            parent_notifications = []
-
-            for student in active_students:
-                level = student.student_profile.current_class.level
-                fee_types = FeeType.objects.filter(level=level)
-
-                for ft in fee_types:
-                    sf, created = StudentFee.objects.get_or_create(
-                        student=student,
-                        fee_type=ft,
-                        term=term,
-                        defaults={'status': 'outstanding', 'amount_paid': 0}
-                    )
-                    if created:
-                        fees_generated_count += 1
-                        parent = student.student_profile.parent
-                        if parent:
-                            parent_notifications.append(
-                                Notification(
-                                    sender=request.user if request.user.is_authenticated else None,
-                                    recipient=parent,
-                                    title=f"New School Fees: {term.name}",
-                                    message=f"School fees for {term.name} ({ft.name} - ₦{ft.amount:,.2f}) have been published for {student.full_name}.",
-                                    category='finance',
-                                    audience='selected'
-                                )
-                            )
-
-            if parent_notifications:
-                Notification.objects.bulk_create(parent_notifications)
+            from finance.billing import count_students, generate_fees, queue_fee_generation, should_queue
+            options = {
+                'term_id': str(term.id),
+                'active_only': True,
+                'sender_id': str(request.user.id) if request.user.is_authenticated else None,
+                'notify': 'term',
+            }
+            if should_queue(count_students(active_only=True)):
+                queue_fee_generation(**options)
+                fees_queued = True
+            else:
+                fees_generated_count = generate_fees(**options)['created']
         except Exception as e:
             print(f"Error generating term student fees: {e}")
 
@@ -120,7 +155,8 @@ class TermViewSet(viewsets.ModelViewSet):
             'message': f"{term.name} ({term.academic_year.name}) is now active. Resumption date set for {formatted_resumption}.",
             'term': serializer.data,
             'notifications_sent': notifications_count,
-            'fees_generated': fees_generated_count
+            'fees_generated': fees_generated_count,
+            'fees_queued': fees_queued
         }, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], url_path='transition-vacation')
@@ -215,32 +251,24 @@ class StudentScoreViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         queryset = super().get_queryset()
-        from django.db.models import Exists, OuterRef
-
-        if user.role == 'student':
-            queryset = queryset.filter(
-                student=user
-            ).filter(
-                Exists(
-                    ReportCard.objects.filter(
-                        student_id=OuterRef('student_id'),
-                        term_id=OuterRef('assessment__term_id'),
-                        is_published=True
-                    )
-                )
-            )
-        elif user.role == 'parent':
-            queryset = queryset.filter(
-                student__student_profile__parent=user
-            ).filter(
-                Exists(
-                    ReportCard.objects.filter(
-                        student_id=OuterRef('student_id'),
-                        term_id=OuterRef('assessment__term_id'),
-                        is_published=True
-                    )
-                )
-            )
+        if user.role in ('student', 'parent'):
+            # Scores are visible once the term's report card is published. A pupil
+            # or parent has a handful of cards, so fetch those (student, term) pairs
+            # up front instead of checking a correlated subquery on every score row.
+            cards = ReportCard.objects.filter(is_published=True)
+            if user.role == 'student':
+                cards = cards.filter(student=user)
+            else:
+                cards = cards.filter(student__student_profile__parent=user)
+            published_terms = defaultdict(list)
+            for student_id, term_id in cards.values_list('student_id', 'term_id'):
+                published_terms[term_id].append(student_id)
+            if not published_terms:
+                return queryset.none()
+            visible = Q()
+            for term_id, student_ids in published_terms.items():
+                visible |= Q(assessment__term_id=term_id, student_id__in=student_ids)
+            queryset = queryset.filter(visible)
         elif user.role == 'teacher':
             queryset = queryset.filter(assessment__school_class__teacher=user)
             
@@ -360,6 +388,34 @@ class StudentScoreViewSet(viewsets.ModelViewSet):
         return Response({'message': f'Successfully updated {created_count} scores.'})
 
 
+def report_card_published_notifications(student, term_name, sender):
+    """Notifications for a pupil and their parent when the pupil's report card is published."""
+    from accounts.models import Notification
+    notifications = [
+        Notification(
+            sender=sender,
+            recipient=student,
+            title=f"Report Card Published: {term_name}",
+            message=f"Your terminal report card for {term_name} has been published. You can now view and print it.",
+            category='academics',
+            audience='selected'
+        )
+    ]
+    if hasattr(student, 'student_profile') and student.student_profile.parent:
+        parent = student.student_profile.parent
+        notifications.append(
+            Notification(
+                sender=sender,
+                recipient=parent,
+                title=f"Report Card Published: {student.first_name}",
+                message=f"The official report card for {student.full_name} for {term_name} has been published by the administration. You can now view it under the Academics section.",
+                category='academics',
+                audience='selected'
+            )
+        )
+    return notifications
+
+
 def send_report_card_notifications(report_card, user, is_new=False, was_published=False):
     try:
         from accounts.models import User as PortalUser, Notification
@@ -367,34 +423,9 @@ def send_report_card_notifications(report_card, user, is_new=False, was_publishe
         
         # If it was just published
         if report_card.is_published and not was_published:
-            student = report_card.student
-            term_name = report_card.term.name
-            
-            # Notify Student
-            notifications.append(
-                Notification(
-                    sender=user,
-                    recipient=student,
-                    title=f"Report Card Published: {term_name}",
-                    message=f"Your terminal report card for {term_name} has been published. You can now view and print it.",
-                    category='academics',
-                    audience='selected'
-                )
+            notifications.extend(
+                report_card_published_notifications(report_card.student, report_card.term.name, user)
             )
-            
-            # Notify Parent
-            if hasattr(student, 'student_profile') and student.student_profile.parent:
-                parent = student.student_profile.parent
-                notifications.append(
-                    Notification(
-                        sender=user,
-                        recipient=parent,
-                        title=f"Report Card Published: {student.first_name}",
-                        message=f"The official report card for {student.full_name} for {term_name} has been published by the administration. You can now view it under the Academics section.",
-                        category='academics',
-                        audience='selected'
-                    )
-                )
         
         # If a teacher added/updated comments (and it's not published yet)
         elif user.role == 'teacher':
@@ -435,7 +466,7 @@ class ReportCardViewSet(viewsets.ModelViewSet):
         elif user.role == 'parent':
             queryset = queryset.filter(student__student_profile__parent=user, is_published=True)
         elif user.role == 'teacher':
-            queryset = queryset.filter(student__student_profile__current_class__teacher=user)
+            queryset = queryset.filter(enrolled_during_term(school_class__teacher=user))
             
         student_id = self.request.query_params.get('student')
         if student_id:
@@ -443,7 +474,7 @@ class ReportCardViewSet(viewsets.ModelViewSet):
             
         school_class_id = self.request.query_params.get('school_class')
         if school_class_id:
-            queryset = queryset.filter(student__student_profile__current_class_id=school_class_id)
+            queryset = queryset.filter(enrolled_during_term(school_class_id=school_class_id))
             
         term_id = self.request.query_params.get('term')
         if term_id:
@@ -454,18 +485,67 @@ class ReportCardViewSet(viewsets.ModelViewSet):
             else:
                 queryset = queryset.filter(term_id=term_id)
 
+        if self.action in ('list', 'retrieve'):
+            # Class size and position need each card's term class; resolve it for
+            # the whole page here rather than one lookup per card in the serializer.
+            queryset = queryset.select_related('student__student_profile', 'term__academic_year').annotate(
+                term_class_id=class_during_term()
+            )
         return queryset
 
     def perform_create(self, serializer):
         report_card = serializer.save()
+        if report_card.is_published:
+            from .results import snapshot_report_cards
+            snapshot_report_cards([report_card])
         send_report_card_notifications(report_card, self.request.user, is_new=True, was_published=False)
 
     def perform_update(self, serializer):
         old_instance = self.get_object()
         was_published = old_instance.is_published
         report_card = serializer.save()
+        # (Re-)publishing refreshes the results snapshot; unpublishing drops it.
+        if serializer.validated_data.get('is_published'):
+            from .results import snapshot_report_cards
+            snapshot_report_cards([report_card])
+        elif not report_card.is_published and report_card.results is not None:
+            report_card.results = None
+            report_card.save(update_fields=['results'])
         send_report_card_notifications(report_card, self.request.user, is_new=False, was_published=was_published)
 
+    @action(detail=False, methods=['get'])
+    def results(self, request):
+        """
+        Published term results, one row per report card, read from the snapshot
+        frozen at publication. Accepts the same student / term filters as the list.
+        Cards published before snapshots existed are filled in by the
+        snapshot_report_cards management command.
+        """
+        qs = self.get_queryset().filter(is_published=True).select_related(
+            'student', 'term__academic_year'
+        ).order_by('-term__start_date', 'student__last_name', 'student__first_name')
+        page = self.paginate_queryset(qs)
+        cards = page if page is not None else list(qs)
+
+        data = [
+            {
+                'report_card': str(card.id),
+                'student': str(card.student_id),
+                'student_name': card.student.full_name,
+                'term': str(card.term_id),
+                'term_name': card.term.name,
+                'academic_year_name': card.term.academic_year.name,
+                'teacher_remarks': card.teacher_remarks,
+                'admin_remarks': card.admin_remarks,
+                'psychomotor': card.psychomotor,
+                'results': card.results,
+            }
+            for card in cards
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
     @action(detail=False, methods=['post'])
     def bulk_comment_and_publish(self, request):
         if request.user.role != 'admin':
@@ -481,28 +561,79 @@ class ReportCardViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'No current term configured.'}, status=status.HTTP_400_BAD_REQUEST)
             term_id = current_term.id
 
-        updated_count = 0
-        for record in records:
-            student_id = record['student_id']
-            old_rc = ReportCard.objects.filter(student_id=student_id, term_id=term_id).first()
-            was_published = old_rc.is_published if old_rc else False
+        term = Term.objects.filter(id=term_id).first()
+        if not term:
+            return Response({'error': 'Term not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-            defaults = {
-                'admin_remarks': record.get('admin_remarks', record.get('remarks', '')),
-                'is_published': record.get('is_published', False),
-            }
-            if 'psychomotor' in record:
-                defaults['psychomotor'] = record['psychomotor']
+        # The last record wins if a pupil appears twice.
+        records_by_student = {str(record['student_id']): record for record in records}
+
+        from django.db import transaction
+        from accounts.models import Notification, User as PortalUser
 
-            rc, created = ReportCard.objects.update_or_create(
-                student_id=student_id,
-                term_id=term_id,
-                defaults=defaults
+        with transaction.atomic():
+            existing = {
+                str(rc.student_id): rc
+                for rc in ReportCard.objects.select_for_update().filter(
+                    term=term, student_id__in=list(records_by_student)
+                ).order_by()
+            }
+            cards = []
+            newly_published = []
+            for student_id, record in records_by_student.items():
+                old_rc = existing.get(student_id)
+                is_published = bool(record.get('is_published', False))
+                if 'psychomotor' in record:
+                    psychomotor = record['psychomotor']
+                else:
+                    psychomotor = old_rc.psychomotor if old_rc else {}
+                cards.append(ReportCard(
+                    student_id=student_id,
+                    term=term,
+                    admin_remarks=record.get('admin_remarks', record.get('remarks', '')),
+                    is_published=is_published,
+                    psychomotor=psychomotor,
+                ))
+                if is_published and not (old_rc and old_rc.is_published):
+                    newly_published.append(student_id)
+
+            # One INSERT ... ON CONFLICT (student, term) DO UPDATE for the whole class.
+            ReportCard.objects.bulk_create(
+                cards,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['student', 'term'],
+                update_fields=['admin_remarks', 'is_published', 'psychomotor', 'updated_at'],
             )
-            send_report_card_notifications(rc, request.user, is_new=created, was_published=was_published)
-            updated_count += 1
 
-        return Response({'message': f'Successfully updated {updated_count} report cards.'})
+            # Every card published by this request gets a fresh results snapshot.
+            from .results import snapshot_report_cards
+            published_ids = [sid for sid, record in records_by_student.items() if record.get('is_published')]
+            published_cards = list(ReportCard.objects.filter(term=term, student_id__in=published_ids))
+            for card in published_cards:
+                card.term = term
+            snapshot_report_cards(published_cards)
+            ReportCard.objects.filter(
+                term=term, is_published=False, results__isnull=False,
+                student_id__in=list(records_by_student),
+            ).update(results=None)
+
+        notifications = []
+        for student in PortalUser.objects.filter(id__in=newly_published).select_related('student_profile__parent'):
+            notifications.extend(report_card_published_notifications(student, term.name, request.user))
+        if notifications:
+            try:
+                Notification.objects.bulk_create(notifications, batch_size=500)
+            except Exception as e:
+                print(f"Error dispatching report card notifications: {e}")
+
+        created_count = len(records_by_student) - len(existing)
+        return Response({
+            'message': f'Successfully updated {len(records_by_student)} report cards.',
+            'created': created_count,
+            'updated': len(existing),
+            'published': len(newly_published),
+        })
 
 
 class LessonMaterialViewSet(viewsets.ModelViewSet):
@@ -585,6 +716,157 @@ class LessonMaterialViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search over topic, lesson body and attachment text.
+        ?q= accepts web-search syntax ("quoted phrases", -exclude, or). The usual
+        status / school_class / subject filters still apply.
+        """
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+        from django.db.models import F, Value
+        from django.db.models.functions import Coalesce, Concat
+
+        q = (request.query_params.get('q') or '').strip()
+        if not q:
+            return Response({'error': 'q is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        query = SearchQuery(q, search_type='websearch', config='english')
+        highlight = {'start_sel': '<mark>', 'stop_sel': '</mark>', 'config': 'english'}
+        qs = (
+            self.get_queryset()
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-created_at')
+        )
+
+        page = self.paginate_queryset(qs)
+        rows = page if page is not None else list(qs)
+        # Headlines re-parse the text, so build them only for the rows being returned.
+        headlines = {
+            row['id']: row for row in LessonMaterial.objects.filter(id__in=[m.id for m in rows]).annotate(
+                topic_highlight=SearchHeadline('topic', query, **highlight),
+                snippet=SearchHeadline(
+                    Concat(
+                        'objectives', Value(' '), Coalesce('activities', Value('')), Value(' '),
+                        Coalesce('evaluation', Value('')), Value(' '), 'file_text',
+                    ),
+                    query, max_fragments=2, **highlight,
+                ),
+            ).values('id', 'topic_highlight', 'snippet')
+        }
+
+        data = self.get_serializer(rows, many=True).data
+        for item, material in zip(data, rows):
+            item['rank'] = material.rank
+            item['topic_highlight'] = headlines[material.id]['topic_highlight']
+            item['snippet'] = headlines[material.id]['snippet']
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    # ── Chunked / resumable attachment uploads ───────────────────────────────
+
+    def _upload_response(self, upload):
+        return {
+            'upload_id': str(upload.id),
+            'material': str(upload.material_id),
+            'filename': upload.filename,
+            'total_size': upload.total_size,
+            'chunk_size': upload.chunk_size,
+            'part_count': upload.part_count,
+            'received_parts': upload.received_parts(),
+            'status': upload.status,
+        }
+
+    def _get_upload(self, request, upload_id):
+        from django.shortcuts import get_object_or_404
+        from .models import MaterialUpload
+        uploads = MaterialUpload.objects.select_related('material')
+        if request.user.role != 'admin':
+            uploads = uploads.filter(teacher=request.user)
+        return get_object_or_404(uploads, id=upload_id)
+
+    @action(detail=True, methods=['post'], url_path='uploads')
+    def start_upload(self, request, pk=None):
+        """
+        Begin a resumable upload for this material's attachment.
+        Body: filename, size (bytes), optional mime_type. The response gives the
+        part size; PUT each part to uploads/<upload_id>/parts/<n>/ then call complete.
+        """
+        from django.conf import settings
+        from .models import MaterialUpload
+
+        if request.user.role not in ('teacher', 'admin'):
+            return Response({'error': 'Only teachers and admins can upload materials.'}, status=status.HTTP_403_FORBIDDEN)
+        material = self.get_object()
+        if request.user.role == 'teacher' and material.status == 'approved':
+            return Response({'error': 'Approved materials cannot be edited.'}, status=status.HTTP_403_FORBIDDEN)
+
+        filename = request.data.get('filename')
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({'error': 'size (in bytes) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not filename:
+            return Response({'error': 'filename is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if size <= 0 or size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            return Response(
+                {'error': f'File size must be between 1 byte and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        upload = MaterialUpload.objects.create(
+            teacher=request.user,
+            material=material,
+            filename=os.path.basename(filename),
+            total_size=size,
+            chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+            mime_type=request.data.get('mime_type') or '',
+        )
+        return Response(self._upload_response(upload), status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)')
+    def upload_status(self, request, upload_id=None):
+        """GET: which parts have arrived (resume from the gaps). DELETE: abandon the upload."""
+        upload = self._get_upload(request, upload_id)
+        if request.method == 'DELETE':
+            if upload.status == 'assembling':
+                return Response({'error': 'This upload is being assembled.'}, status=status.HTTP_400_BAD_REQUEST)
+            upload.discard_parts()
+            upload.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(self._upload_response(upload))
+
+    @action(detail=False, methods=['put'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/parts/(?P<part_number>\d+)')
+    def upload_part(self, request, upload_id=None, part_number=None):
+        """Raw request body is one part, streamed to disk without being parsed."""
+        from .uploads import write_part
+
+        upload = self._get_upload(request, upload_id)
+        if upload.status != 'pending':
+            return Response({'error': 'This upload has already been completed.'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.stream is None:
+            # Django gives no stream at all for an empty body.
+            return Response({'error': 'The part body is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            write_part(upload, int(part_number), request.stream)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self._upload_response(upload))
+
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/complete')
+    def complete_upload(self, request, upload_id=None):
+        from .uploads import complete_upload
+
+        upload = self._get_upload(request, upload_id)
+        try:
+            # Completing an assembled upload again returns its material, so a retry is safe.
+            material = complete_upload(upload)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(material).data)
+
 
 class SchoolEventViewSet(viewsets.ModelViewSet):
     queryset = SchoolEvent.objects.all()
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-19 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_support_tickets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherprofile',
+            name='account_name',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='teacherprofile',
+            name='account_number',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='teacherprofile',
+            name='bank_name',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
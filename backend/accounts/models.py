@@ -151,6 +151,32 @@ class StudentProfile(models.Model):
     def __str__(self):
         return f"{self.user.full_name} - {self.admission_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_class_id = instance.__dict__.get('current_class_id')
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        class_changed = (
+            self.current_class_id is not None if self._state.adding
+            else self.current_class_id != getattr(self, '_loaded_class_id', self.current_class_id)
+        )
+        loaded_parent_id = None if self._state.adding else getattr(self, '_loaded_parent_id', self.parent_id)
+        super().save(*args, **kwargs)
+        if class_changed:
+            from academics.models import ClassEnrollment
+            ClassEnrollment.move({self.user_id: self.current_class})
+        if class_changed or self.parent_id != loaded_parent_id:
+            # Statements list each child with their class, under the old and the new parent.
+            from django.db import transaction
+            from finance.statements import forget_statements
+            parent_ids = {loaded_parent_id, self.parent_id}
+            transaction.on_commit(lambda: forget_statements(parent_ids))
+        self._loaded_class_id = self.current_class_id
+        self._loaded_parent_id = self.parent_id
+
 # Teacher Profile
 class TeacherProfile(models.Model):
     EMPLOYMENT_STATUS_CHOICES = [
@@ -177,6 +203,10 @@ class TeacherProfile(models.Model):
     
     # Salary Information (encrypted in production)
     monthly_salary = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Salary account, used for the monthly bank payment schedule
+    bank_name = models.CharField(max_length=100, blank=True, null=True)
+    account_number = models.CharField(max_length=20, blank=True, null=True)
+    account_name = models.CharField(max_length=150, blank=True, null=True)
     
     # Additional Info
     is_class_teacher = models.BooleanField(default=False)
@@ -285,7 +285,9 @@ class CreateStudentSerializer(serializers.Serializer):
         school_class = None
         if current_class_name:
             from academics.models import SchoolClass
-            school_class = SchoolClass.objects.filter(name__iexact=current_class_name).first()
+            school_class = SchoolClass.objects.filter(name__iexact=current_class_name).order_by(
+                '-academic_year__is_current', '-academic_year__start_date'
+            ).first()
 
         # Auto-generate admission number if not provided
         import uuid as _uuid
@@ -379,7 +381,9 @@ class UpdateStudentSerializer(serializers.Serializer):
             current_class_name = validated_data['current_class']
             if current_class_name:
                 from academics.models import SchoolClass
-                school_class = SchoolClass.objects.filter(name__iexact=current_class_name).first()
+                school_class = SchoolClass.objects.filter(name__iexact=current_class_name).order_by(
+                    '-academic_year__is_current', '-academic_year__start_date'
+                ).first()
                 profile.current_class = school_class
             else:
                 profile.current_class = None
@@ -467,8 +467,19 @@ class StudentViewSet(viewsets.ModelViewSet):
         student_status = self.request.query_params.get('status')
         parent_id = self.request.query_params.get('parent_id')
         
+        term_id = self.request.query_params.get('term')
+        
         if class_name: queryset = queryset.filter(student_profile__current_class__name=class_name)
-        if school_class_id: queryset = queryset.filter(student_profile__current_class_id=school_class_id)
+        if school_class_id and term_id:
+            # Historical roster: who was in this class during that term.
+            from academics.models import ClassEnrollment, Term
+            term = Term.objects.filter(id=term_id).first()
+            if term:
+                roster = ClassEnrollment.objects.for_term(term).filter(school_class_id=school_class_id)
+                queryset = queryset.filter(id__in=roster.values('student_id'))
+            else:
+                queryset = queryset.none()
+        elif school_class_id: queryset = queryset.filter(student_profile__current_class_id=school_class_id)
         if student_status: queryset = queryset.filter(student_profile__status=student_status)
         if parent_id: queryset = queryset.filter(student_profile__parent_id=parent_id)
         return queryset
@@ -806,30 +817,14 @@ def dashboard_stats(request):
 
     # ── Finance ──────────────────────────────────────────────────────────────
     try:
-        from finance.models import StudentFee, PaymentRecord
+        from finance.models import StudentFee
         outstanding_fees_count = StudentFee.objects.filter(status__in=['outstanding', 'partial']).count()
-        total_collected_today = PaymentRecord.objects.filter(
-            date=today
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        # Fee defaulters: students with outstanding status
-        fee_defaulters = StudentFee.objects.filter(
-            status='outstanding'
-        ).select_related('student__student_profile').values(
-            'student__first_name', 'student__last_name',
-            'student__student_profile__admission_number',
-            'student__student_profile__current_class__name',
-            'fee_type__name', 'balance'
-        )[:10]
-        fee_defaulters_list = [
-            {
-                'name': f"{d['student__first_name']} {d['student__last_name']}",
-                'admission_number': d['student__student_profile__admission_number'],
-                'class_name': d['student__student_profile__current_class__name'] or 'Unassigned',
-                'fee_type': d['fee_type__name'],
-                'balance': float(d['balance']),
-            }
-            for d in fee_defaulters
-        ]
+        # PaymentRecord.date is a datetime, so read the day's collection rollups instead.
+        from finance.analytics import collected_on
+        total_collected_today = collected_on(timezone.localdate())
+        # Largest debts first, balances computed in the database; cached briefly.
+        from finance.defaulters import top_defaulters
+        fee_defaulters_list = top_defaulters(10)
     except Exception:
         outstanding_fees_count = 0
         total_collected_today = 0
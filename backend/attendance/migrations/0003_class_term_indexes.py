@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-19 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0010_class_enrollment'),
+        ('attendance', '0002_add_attendance_submission_and_is_locked'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentattendance',
+            index=models.Index(fields=['school_class', 'term'], name='attendance__school__aef4d7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentattendance',
+            index=models.Index(fields=['school_class', 'date'], name='attendance__school__dcae22_idx'),
+        ),
+    ]
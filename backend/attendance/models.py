@@ -28,6 +28,10 @@ class StudentAttendance(models.Model):
     class Meta:
         unique_together = ('student', 'date')
         verbose_name_plural = "Student Attendance"
+        indexes = [
+            models.Index(fields=['school_class', 'term']),
+            models.Index(fields=['school_class', 'date']),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} - {self.date} ({self.status})"
@@ -29,6 +29,10 @@ class StudentAttendanceViewSet(viewsets.ModelViewSet):
         if school_class:
             queryset = queryset.filter(school_class_id=school_class)
 
+        term = self.request.query_params.get('term')
+        if term:
+            queryset = queryset.filter(term_id=term)
+
         return queryset
 
     @action(detail=False, methods=['post'])
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FeeType, StudentFee, PaymentRecord, Payroll, PayrollAuditLog
+from .models import FeeType, StudentFee, PaymentRecord, ReceiptSequence, PaystackEvent, FeeLedgerRollup, FeeCollectionRollup, FeeReconciliationRun, FeeDiscrepancy, Payroll, PayrollAuditLog, PayrollPeriodSummary
 
 @admin.register(FeeType)
 class FeeTypeAdmin(admin.ModelAdmin):
@@ -15,9 +15,42 @@ class StudentFeeAdmin(admin.ModelAdmin):
 
 @admin.register(PaymentRecord)
 class PaymentRecordAdmin(admin.ModelAdmin):
-    list_display = ('student_fee', 'amount', 'payment_method', 'date', 'received_by')
+    list_display = ('student_fee', 'amount', 'payment_method', 'date', 'received_by', 'receipt_number')
     list_filter = ('payment_method', 'date')
-    search_fields = ('transaction_id', 'student_fee__student__email')
+    search_fields = ('transaction_id', 'receipt_number', 'student_fee__student__email')
+
+@admin.register(ReceiptSequence)
+class ReceiptSequenceAdmin(admin.ModelAdmin):
+    list_display = ('year', 'last_number')
+
+@admin.register(PaystackEvent)
+class PaystackEventAdmin(admin.ModelAdmin):
+    list_display = ('event', 'reference', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'event')
+    search_fields = ('reference',)
+    readonly_fields = ('payload',)
+
+@admin.register(FeeLedgerRollup)
+class FeeLedgerRollupAdmin(admin.ModelAdmin):
+    list_display = ('term', 'level', 'school_class', 'fee_type', 'billed', 'paid', 'updated_at')
+    list_filter = ('term', 'level')
+
+@admin.register(FeeCollectionRollup)
+class FeeCollectionRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'term', 'school_class', 'fee_type', 'payment_method', 'amount', 'payments')
+    list_filter = ('payment_method', 'term', 'level')
+    date_hierarchy = 'day'
+
+@admin.register(FeeReconciliationRun)
+class FeeReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'status', 'repair', 'fees_checked', 'discrepancy_count', 'repaired_count', 'finished_at')
+    list_filter = ('status', 'repair')
+
+@admin.register(FeeDiscrepancy)
+class FeeDiscrepancyAdmin(admin.ModelAdmin):
+    list_display = ('student_fee', 'recorded_amount_paid', 'ledger_amount_paid', 'recorded_status', 'expected_status', 'repaired', 'run')
+    list_filter = ('repaired', 'expected_status')
+    raw_id_fields = ('student_fee', 'run')
 
 @admin.register(Payroll)
 class PayrollAdmin(admin.ModelAdmin):
@@ -31,3 +64,9 @@ class PayrollAuditLogAdmin(admin.ModelAdmin):
     list_display = ('payroll', 'user', 'action', 'timestamp')
     list_filter = ('action', 'timestamp')
     search_fields = ('payroll__teacher__email', 'payroll__teacher__first_name', 'payroll__teacher__last_name', 'action')
+
+
+@admin.register(PayrollPeriodSummary)
+class PayrollPeriodSummaryAdmin(admin.ModelAdmin):
+    list_display = ('month', 'year', 'total_staff', 'total_gross', 'total_net', 'closed_by', 'closed_at')
+    list_filter = ('year',)
@@ -0,0 +1,181 @@
+"""
+Fee collection analytics.
+
+Everything here reads the rollup tables kept by finance.rollups, never the
+fee or payment rows: FeeLedgerRollup holds billed / paid per (term, level,
+class, fee type) and FeeCollectionRollup the payments per day, bucket and
+payment method. `collection_breakdown` slices billed, collected and
+outstanding totals by any combination of those dimensions; `daily_collections`
+is the per-day series for charts.
+
+Bills have no payment method, so rows split by method carry the billed total
+of their slice: their collection_rate is that method's share of it, and
+outstanding is only given on rows that are not split by method.
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.db.models import F, Sum
+
+from .models import FeeCollectionRollup, FeeLedgerRollup, PaymentRecord
+
+
+ZERO = Decimal('0.00')
+MAX_SERIES_DAYS = 366
+
+# Dimension -> (rollup column, label column). Both rollups share the first four.
+DIMENSIONS = {
+    'term': ('term_id', 'term__name'),
+    'level': ('level_id', 'level__name'),
+    'class': ('school_class_id', 'school_class__name'),
+    'fee_type': ('fee_type_id', 'fee_type__name'),
+    'method': ('payment_method', None),
+}
+METHODS = dict(PaymentRecord.PAYMENT_METHOD_CHOICES)
+
+
+class AnalyticsError(ValueError):
+    """A dimension, filter or date range the analytics cannot serve."""
+
+
+def parse_dimensions(value):
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in DIMENSIONS]
+    if unknown:
+        raise AnalyticsError(f"Unknown dimension(s): {', '.join(unknown)}. Use {', '.join(DIMENSIONS)}.")
+    return list(dict.fromkeys(names))
+
+
+def parse_filters(params):
+    """{dimension: value} from query params named after the dimensions."""
+    filters = {}
+    for name in DIMENSIONS:
+        value = params.get(name)
+        if not value:
+            continue
+        if name == 'method':
+            if value not in METHODS:
+                raise AnalyticsError(f"method must be one of {', '.join(METHODS)}.")
+        else:
+            try:
+                value = uuid.UUID(value)
+            except ValueError:
+                raise AnalyticsError(f'{name} must be a valid id.')
+        filters[name] = value
+    return filters
+
+
+def _filtered(queryset, filters):
+    return queryset.filter(**{
+        DIMENSIONS[name][0]: value for name, value in filters.items()
+        if name != 'method' or queryset.model is FeeCollectionRollup
+    })
+
+
+def _columns(dimensions):
+    return [column for name in dimensions for column in DIMENSIONS[name] if column]
+
+
+def _labelled(row, dimensions):
+    """A values() row with its dimension columns renamed to <dim>_id / <dim>_name (method stays `method`)."""
+    out = {}
+    for name in dimensions:
+        key, label = DIMENSIONS[name]
+        if label is None:
+            out[name] = row.pop(key)
+            out['method_name'] = METHODS.get(out[name], out[name])
+        else:
+            out[f'{name}_id'] = row.pop(key)
+            out[f'{name}_name'] = row.pop(label)
+    if 'class' in dimensions and out['class_id'] is None:
+        out['class_name'] = 'Unassigned'
+    out.update(row)
+    return out
+
+
+def _rate(collected, billed):
+    return (collected / billed * 100).quantize(Decimal('0.1')) if billed else Decimal('0.0')
+
+
+def _slice_key(row, dimensions):
+    return tuple(row[f'{name}_id'] for name in dimensions)
+
+
+def collection_breakdown(dimensions=(), filters=None):
+    """
+    Billed, collected and outstanding totals with collection rates, one row
+    per combination of `dimensions`, plus the overall totals.
+    """
+    filters = filters or {}
+    by_method = 'method' in dimensions or 'method' in filters
+    ledger_dimensions = [name for name in dimensions if name != 'method']
+    ledger = _filtered(FeeLedgerRollup.objects.all(), filters).order_by()
+
+    billed_rows = [
+        _labelled(row, ledger_dimensions)
+        for row in ledger.values(*_columns(ledger_dimensions)).annotate(
+            billed=Sum('billed', default=ZERO), collected=Sum('paid', default=ZERO),
+        )
+    ]
+    total_billed = sum((row['billed'] for row in billed_rows), ZERO)
+    if by_method:
+        billed = {_slice_key(row, ledger_dimensions): row['billed'] for row in billed_rows}
+        rows = [
+            _labelled(row, dimensions)
+            for row in _filtered(FeeCollectionRollup.objects.all(), filters).order_by()
+            .values(*_columns(dimensions)).annotate(collected=Sum('amount', default=ZERO), payments=Sum('payments'))
+        ]
+        for row in rows:
+            row['billed'] = billed.get(_slice_key(row, ledger_dimensions), ZERO)
+            row['outstanding'] = None
+            row['collection_rate'] = _rate(row['collected'], row['billed'])
+    else:
+        rows = billed_rows
+        for row in rows:
+            row['outstanding'] = row['billed'] - row['collected']
+            row['collection_rate'] = _rate(row['collected'], row['billed'])
+    collected = sum((row['collected'] for row in rows), ZERO)
+    rows.sort(key=lambda row: [str(row[f'{name}_name'] or '') for name in dimensions])
+
+    return {
+        'dimensions': list(dimensions),
+        'filters': {name: str(value) for name, value in filters.items()},
+        'totals': {
+            'billed': total_billed,
+            'collected': collected,
+            'outstanding': None if 'method' in filters else total_billed - collected,
+            'collection_rate': _rate(collected, total_billed),
+        },
+        'rows': rows,
+    }
+
+
+def daily_collections(start, end, filters=None, by_method=False):
+    """Collections per day from `start` to `end` inclusive, days without payments included as zero."""
+    if end < start:
+        raise AnalyticsError('from must not be after to.')
+    if (end - start).days >= MAX_SERIES_DAYS:
+        raise AnalyticsError(f'The date range is limited to {MAX_SERIES_DAYS} days.')
+    rollups = _filtered(FeeCollectionRollup.objects.filter(day__gte=start, day__lte=end), filters or {}).order_by()
+    days = {}
+    for row in rollups.values('day', 'payment_method').annotate(amount=Sum('amount'), count=Sum('payments')):
+        day = days.setdefault(row['day'], {'collected': ZERO, 'payments': 0, 'methods': {}})
+        day['collected'] += row['amount']
+        day['payments'] += row['count']
+        day['methods'][row['payment_method']] = row['amount']
+
+    series = []
+    for offset in range((end - start).days + 1):
+        date = start + datetime.timedelta(days=offset)
+        day = days.get(date, {'collected': ZERO, 'payments': 0, 'methods': {}})
+        point = {'date': date, 'collected': day['collected'], 'payments': day['payments']}
+        if by_method:
+            point['methods'] = day['methods']
+        series.append(point)
+    return series
+
+
+def collected_on(date):
+    """Total collected on one day, for the dashboard."""
+    return FeeCollectionRollup.objects.filter(day=date).aggregate(total=Sum('amount', default=ZERO))['total']
@@ -0,0 +1,86 @@
+"""
+Payroll audit trail.
+
+An audit entry stores only what the action changed: `changes` maps each field
+that moved to its [old, new] pair, so an entry costs O(changed fields) however
+long the payroll's history gets. `payroll_state` walks the entries backwards
+from the current row to rebuild the payroll as it stood at any earlier moment.
+The generated totals are left out; they follow from the stored fields.
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.db import models
+from django.utils import timezone
+
+from .models import Payroll, PayrollAuditLog
+
+
+AUDIT_SCHEMA_VERSION = 2
+
+CREATION_ACTIONS = ('payroll_created', 'payroll_generation')
+
+# Bookkeeping columns that are not part of a payroll's state.
+UNAUDITED_FIELDS = {'id', 'created_at', 'updated_at', 'payslip_file', 'payslip_version'}
+
+AUDITED_FIELDS = [
+    field for field in Payroll._meta.concrete_fields
+    if field.name not in UNAUDITED_FIELDS and not field.generated
+]
+
+
+def _json(field, value):
+    if isinstance(value, (int, float, str, Decimal)) and isinstance(field, models.DecimalField):
+        # Same text for 5000 set in memory and 5000.00 read back from the database.
+        return str(Decimal(str(value)).quantize(Decimal(1).scaleb(-field.decimal_places)))
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def payroll_snapshot(payroll):
+    """The audited fields of `payroll` as JSON-ready values, keyed by field name."""
+    return {field.name: _json(field, getattr(payroll, field.attname)) for field in AUDITED_FIELDS}
+
+
+def payroll_diff(before, after):
+    """{field: [old, new]} for every field whose value differs between two snapshots."""
+    return {
+        name: [before.get(name), value]
+        for name, value in after.items()
+        if before.get(name) != value
+    }
+
+
+def audit_entry(payroll, user, action, before=None, timestamp=None):
+    """
+    An unsaved PayrollAuditLog for `action`, holding the diff between `before`
+    (a payroll_snapshot taken before the change; None for a new payroll) and
+    the payroll now.
+    """
+    return PayrollAuditLog(
+        payroll=payroll,
+        user=user if getattr(user, 'is_authenticated', False) else None,
+        action=action,
+        changes=payroll_diff(before or {}, payroll_snapshot(payroll)),
+        schema_version=AUDIT_SCHEMA_VERSION,
+        timestamp=timestamp or timezone.now(),
+    )
+
+
+def payroll_state(payroll, at):
+    """
+    The audited fields of `payroll` as they stood at `at`, rebuilt by undoing
+    every later audit entry; None if the payroll had not been created yet.
+    """
+    state = payroll_snapshot(payroll)
+    later = payroll.audit_logs.filter(timestamp__gt=at).order_by('-timestamp').values_list('action', 'changes')
+    for action, changes in later:
+        if action in CREATION_ACTIONS:
+            return None
+        for name, (old, _new) in (changes or {}).items():
+            state[name] = old
+    return state
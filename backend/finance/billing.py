@@ -0,0 +1,164 @@
+"""
+Set-based fee generation.
+
+`generate_fees` bills every (student, fee_type, term) pair that does not exist
+yet with a fixed number of queries: the pupils, the fee types and the pairs
+already billed are each read as one set, the missing rows go in with
+bulk_create(ignore_conflicts=True), and parents are notified in one insert.
+Runs for the same term are serialised on the term row, so the created and
+skipped counts it returns are exact. Large schools run it through Celery via
+`queue_fee_generation`.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from academics.models import Term
+
+from .models import FeeType, StudentFee
+from .rollups import rebuild_rollups
+from .statements import forget_statements
+
+
+def _students(student_ids=None, level_id=None, active_only=False):
+    from accounts.models import User
+    students = User.objects.filter(role='student')
+    if student_ids:
+        students = students.filter(id__in=student_ids)
+    elif level_id:
+        students = students.filter(student_profile__current_class__level_id=level_id)
+    else:
+        students = students.filter(student_profile__current_class__isnull=False)
+    if active_only:
+        students = students.filter(is_active=True)
+    return students
+
+
+def count_students(student_ids=None, level_id=None, active_only=False):
+    return _students(student_ids, level_id, active_only).count()
+
+
+def generate_fees(term_id, fee_type_ids=None, student_ids=None, match_level=True,
+                  active_only=False, sender_id=None, notify='assignment'):
+    """
+    Bill `fee_type_ids` (all fee types when None) for `term_id`.
+
+    With `match_level` a pupil is only billed fee types of their current class
+    level; without it every selected pupil gets every selected fee type.
+    `notify` picks the message set: 'assignment' (pupil and parent), 'term'
+    (parents, on term activation) or None. Returns {'created', 'skipped'}.
+    """
+    with transaction.atomic():
+        term = Term.objects.select_for_update().select_related('academic_year').get(id=term_id)
+
+        fee_types = FeeType.objects.all()
+        if fee_type_ids is not None:
+            fee_types = fee_types.filter(id__in=fee_type_ids)
+        fee_types = {ft.id: ft for ft in fee_types}
+        if not fee_types:
+            return {'created': 0, 'skipped': 0}
+
+        level_id = None
+        if match_level and not student_ids and len({ft.level_id for ft in fee_types.values()}) == 1:
+            level_id = next(iter(fee_types.values())).level_id
+        students = _students(student_ids, level_id, active_only)
+        pupils = list(students.values_list(
+            'id', 'first_name', 'last_name',
+            'student_profile__parent_id', 'student_profile__current_class__level_id',
+        ))
+
+        billed = set(StudentFee.objects.filter(
+            term=term, fee_type_id__in=list(fee_types), student__in=students
+        ).values_list('student_id', 'fee_type_id'))
+
+        new_fees, skipped = [], 0
+        for student_id, _first, _last, _parent_id, pupil_level_id in pupils:
+            for fee_type in fee_types.values():
+                if match_level and fee_type.level_id != pupil_level_id:
+                    continue
+                if (student_id, fee_type.id) in billed:
+                    skipped += 1
+                    continue
+                new_fees.append(StudentFee(
+                    student_id=student_id, fee_type=fee_type, term=term,
+                    status='outstanding', amount_paid=0,
+                ))
+
+        StudentFee.objects.bulk_create(new_fees, batch_size=1000, ignore_conflicts=True)
+        # Ids are generated client-side, so rows that hit a conflict are simply absent.
+        inserted = set(StudentFee.objects.filter(
+            term=term, id__in=[fee.id for fee in new_fees]
+        ).values_list('id', flat=True)) if new_fees else set()
+        created = [fee for fee in new_fees if fee.id in inserted]
+        skipped += len(new_fees) - len(created)
+
+        if created:
+            rebuild_rollups([term.id])
+
+    if created:
+        forget_statements({row[3] for row in pupils})
+
+    if created and notify:
+        from accounts.models import Notification
+        try:
+            pupils = {row[0]: row for row in pupils}
+            Notification.objects.bulk_create(
+                _notifications(created, pupils, term, sender_id, notify), batch_size=1000
+            )
+        except Exception as e:
+            print(f"Error sending fee notifications: {e}")
+
+    return {'created': len(created), 'skipped': skipped}
+
+
+def _notifications(fees, pupils, term, sender_id, notify):
+    from accounts.models import Notification
+    for fee in fees:
+        _id, first_name, last_name, parent_id, _level = pupils[fee.student_id]
+        fee_type = fee.fee_type
+        full_name = f"{first_name} {last_name}"
+        if notify == 'term':
+            if parent_id:
+                yield Notification(
+                    sender_id=sender_id,
+                    recipient_id=parent_id,
+                    title=f"New School Fees: {term.name}",
+                    message=f"School fees for {term.name} ({fee_type.name} - ₦{fee_type.amount:,.2f}) have been published for {full_name}.",
+                    category='finance',
+                    audience='selected'
+                )
+            continue
+
+        yield Notification(
+            sender_id=sender_id,
+            recipient_id=fee.student_id,
+            title=f"New Fee: {fee_type.name}",
+            message=f"A new fee of ₦{fee_type.amount:,.2f} for {fee_type.name} has been assigned for this term.",
+            category='finance',
+            audience='selected'
+        )
+        if parent_id:
+            yield Notification(
+                sender_id=sender_id,
+                recipient_id=parent_id,
+                title=f"Tuition Invoice: {first_name}",
+                message=f"A new fee of ₦{fee_type.amount:,.2f} for {fee_type.name} has been assigned to your child, {full_name}.",
+                category='finance',
+                audience='selected'
+            )
+
+
+def should_queue(pupil_count):
+    """Whether a run over `pupil_count` pupils is big enough to hand to Celery."""
+    return pupil_count > settings.FEE_GENERATION_ASYNC_THRESHOLD
+
+
+def queue_fee_generation(**kwargs):
+    """Run generate_fees on a worker once the current transaction commits."""
+    from .tasks import generate_fees_task
+
+    def dispatch():
+        try:
+            generate_fees_task.delay(**kwargs)
+        except Exception as e:
+            print(f"Error queueing fee generation for term {kwargs.get('term_id')}: {e}")
+    transaction.on_commit(dispatch)
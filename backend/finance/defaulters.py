@@ -0,0 +1,123 @@
+"""
+Fee defaulters.
+
+Balances are computed in the database (StudentFee.objects.with_balance()), so
+owing fees can be filtered, summed and sorted in SQL. `defaulters` groups the
+owing fees by pupil or by parent in one GROUP BY and splits each total into
+age buckets: this term, last term and older. `top_defaulters` caches the
+largest debtors for the admin dashboard.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q, Sum
+
+from academics.models import Term
+
+from .models import StudentFee
+
+
+TOP_DEFAULTERS_CACHE_KEY = 'finance:top_defaulters:{limit}'
+
+PUPIL_FIELDS = {
+    'pupil_id': 'student_id',
+    'first_name': 'student__first_name',
+    'last_name': 'student__last_name',
+    'admission_number': 'student__student_profile__admission_number',
+    'class_name': 'student__student_profile__current_class__name',
+    'parent_id': 'student__student_profile__parent_id',
+    'parent_first_name': 'student__student_profile__parent__first_name',
+    'parent_last_name': 'student__student_profile__parent__last_name',
+}
+
+PARENT_FIELDS = {
+    'parent_id': 'student__student_profile__parent_id',
+    'parent_first_name': 'student__student_profile__parent__first_name',
+    'parent_last_name': 'student__student_profile__parent__last_name',
+    'parent_email': 'student__student_profile__parent__email',
+}
+
+
+def aging_terms():
+    """(current term, the term before it); either may be None."""
+    current = Term.objects.filter(is_current=True).first() or Term.objects.order_by('-start_date').first()
+    if current is None:
+        return None, None
+    previous = Term.objects.filter(start_date__lt=current.start_date).order_by('-start_date').first()
+    return current, previous
+
+
+def _buckets(current, previous):
+    zero = Decimal('0.00')
+    # term is never null, so `nothing` is a filter no fee matches.
+    nothing = Q(term__isnull=True)
+    if current is None:
+        this_term, last_term, older = ~nothing, nothing, nothing
+    else:
+        # Fees billed ahead for a future term are counted with the current one.
+        this_term = Q(term__start_date__gte=current.start_date)
+        if previous is None:
+            last_term, older = nothing, Q(term__start_date__lt=current.start_date)
+        else:
+            last_term = Q(term_id=previous.id)
+            older = Q(term__start_date__lt=previous.start_date)
+    return {
+        'total_owed': Sum('balance_due', default=zero),
+        'this_term': Sum('balance_due', filter=this_term, default=zero),
+        'last_term': Sum('balance_due', filter=last_term, default=zero),
+        'older': Sum('balance_due', filter=older, default=zero),
+        'fees': Count('id'),
+    }
+
+
+def defaulters(group='pupil', queryset=None):
+    """
+    Owing fees grouped by pupil (or by parent), largest debt first. Returns a
+    values() queryset, so callers can paginate it without loading every row.
+    """
+    fees = (queryset if queryset is not None else StudentFee.objects.all()).owing().order_by()
+    current, previous = aging_terms()
+    aggregates = _buckets(current, previous)
+    if group == 'parent':
+        fields = PARENT_FIELDS
+        fees = fees.filter(student__student_profile__parent__isnull=False)
+        aggregates['pupils'] = Count('student_id', distinct=True)
+        tie_break = ['parent_last_name', 'parent_first_name', 'parent_id']
+    else:
+        fields = PUPIL_FIELDS
+        aggregates['fee_name'] = Max('fee_type__name')
+        tie_break = ['last_name', 'first_name', 'pupil_id']
+    columns = {alias: F(path) for alias, path in fields.items()}
+    return fees.values(**columns).annotate(**aggregates).order_by('-total_owed', *tie_break)
+
+
+def top_defaulters(limit=10):
+    """The `limit` pupils owing the most, cached for FEE_DEFAULTERS_CACHE_TTL seconds."""
+    key = TOP_DEFAULTERS_CACHE_KEY.format(limit=limit)
+    try:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        print(f"Error reading cached fee defaulters: {e}")
+
+    rows = [
+        {
+            'student_id': str(row['pupil_id']),
+            'name': f"{row['first_name']} {row['last_name']}",
+            'admission_number': row['admission_number'],
+            'class_name': row['class_name'] or 'Unassigned',
+            'fee_type': row['fee_name'] if row['fees'] == 1 else f"{row['fees']} fees",
+            'balance': float(row['total_owed']),
+            'this_term': float(row['this_term']),
+            'last_term': float(row['last_term']),
+            'older': float(row['older']),
+        }
+        for row in defaulters()[:limit]
+    ]
+    try:
+        cache.set(key, rows, settings.FEE_DEFAULTERS_CACHE_TTL)
+    except Exception as e:
+        print(f"Error caching fee defaulters: {e}")
+    return rows
@@ -0,0 +1,191 @@
+"""
+Streaming payroll exports.
+
+Each report is a list of columns over one `select_related('teacher__teacher_profile')`
+query read with `.iterator()`, so a register for any number of staff is a
+single query and rows are written out as they are fetched. CSV goes through
+csv.writer; XLSX is written as a zip whose sheet is compressed and flushed row
+by row, so neither format holds the whole file in memory.
+"""
+import calendar
+import csv
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from .models import Payroll
+
+
+BANK_SCHEDULE_EXCLUDED_STATUSES = ['draft', 'preview', 'failed', 'reversed', 'cancelled']
+
+
+def _profile(payroll, attribute, default=None):
+    return getattr(getattr(payroll.teacher, 'teacher_profile', None), attribute, None) or default
+
+
+def _staff_id(payroll):
+    return _profile(payroll, 'staff_id', payroll.teacher.username)
+
+
+def _reference(payroll):
+    return payroll.payment_reference or f"PAY-{payroll.year}{payroll.month:02d}-{str(payroll.id)[:8].upper()}"
+
+
+REPORT_COLUMNS = {
+    'salary_register': [
+        ('Staff ID', _staff_id),
+        ('Full Name', lambda p: p.teacher.full_name),
+        ('Role', lambda p: p.teacher.role),
+        ('Department', lambda p: p.department or 'Teaching'),
+        ('Basic Salary', lambda p: p.basic_salary),
+        ('Total Allowances', lambda p: p.total_allowances),
+        ('Bonuses', lambda p: p.bonuses),
+        ('Gross Salary', lambda p: p.gross_salary),
+        ('Total Deductions', lambda p: p.total_deductions),
+        ('Net Salary', lambda p: p.net_salary),
+        ('Status', lambda p: p.status),
+        ('Payment Date', lambda p: p.payment_date),
+        ('Payment Reference', lambda p: p.payment_reference),
+    ],
+    'deduction_report': [
+        ('Staff ID', _staff_id),
+        ('Full Name', lambda p: p.teacher.full_name),
+        ('Tax', lambda p: p.tax),
+        ('Pension', lambda p: p.pension),
+        ('Loans', lambda p: p.loans),
+        ('Other Deductions', lambda p: p.other_deductions),
+        ('Leave Adjustment', lambda p: p.leave_adjustment),
+        ('Attendance Adjustment', lambda p: p.attendance_adjustment),
+        ('Total Deductions', lambda p: p.total_deductions),
+    ],
+    'allowance_report': [
+        ('Staff ID', _staff_id),
+        ('Full Name', lambda p: p.teacher.full_name),
+        ('Housing Allowance', lambda p: p.housing_allowance),
+        ('Transport Allowance', lambda p: p.transport_allowance),
+        ('Meal Allowance', lambda p: p.meal_allowance),
+        ('Responsibility Allowance', lambda p: p.responsibility_allowance),
+        ('Overtime', lambda p: p.overtime),
+        ('Total Allowances', lambda p: p.total_allowances),
+    ],
+    'bank_schedule': [
+        ('Account Number', lambda p: _profile(p, 'account_number', '')),
+        ('Account Name', lambda p: _profile(p, 'account_name', p.teacher.full_name)),
+        ('Bank', lambda p: _profile(p, 'bank_name', '')),
+        ('Amount', lambda p: p.net_salary),
+        ('Narration', lambda p: f"Salary {calendar.month_name[p.month]} {p.year} - {_staff_id(p)}"),
+        ('Reference', _reference),
+    ],
+}
+
+
+def report_queryset(report_type, month, year):
+    records = Payroll.objects.filter(month=month, year=year).select_related('teacher__teacher_profile')
+    if report_type == 'bank_schedule':
+        records = records.exclude(status__in=BANK_SCHEDULE_EXCLUDED_STATUSES)
+    return records.order_by('teacher__last_name', 'teacher__first_name', 'id')
+
+
+def report_rows(report_type, month, year):
+    """Header row, then one row per payroll record, from a single streamed query."""
+    columns = REPORT_COLUMNS[report_type]
+    yield [header for header, _ in columns]
+    for payroll in report_queryset(report_type, month, year).iterator(chunk_size=500):
+        yield [value(payroll) for _, value in columns]
+
+
+class _Echo:
+    """File-like object whose write() hands the value straight back."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+class _Chunks:
+    """Unseekable sink for zipfile that collects written bytes until drained."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+_XLSX_STATIC = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c t="n"><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def stream_xlsx(rows, sheet_name='Report'):
+    """Minimal single-sheet XLSX, compressed and yielded as rows are produced."""
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        yield sink.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for row in rows:
+                sheet.write(('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>').encode())
+                data = sink.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
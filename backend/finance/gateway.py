@@ -0,0 +1,258 @@
+"""
+HTTP client for the payment gateway.
+
+One PaystackClient per process keeps a pooled keep-alive session, so calls
+reuse TLS connections instead of handshaking every time. Timeouts are tight,
+failed calls are retried a bounded number of times with jittered backoff
+within a total deadline per call, and a circuit breaker fails fast while the gateway is degraded so web workers are
+not tied up waiting on it. The transport is pluggable: FakeTransport answers
+from in-memory handlers for tests and benchmarks.
+"""
+import random
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+PAYSTACK_API = 'https://api.paystack.co'
+
+GatewayResponse = namedtuple('GatewayResponse', ['status_code', 'data'])
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or kept failing."""
+
+
+class CircuitOpen(GatewayError):
+    """Calls are being refused because the gateway recently kept failing."""
+
+
+class RequestsTransport:
+    """Sends requests over a shared, pooled requests.Session."""
+
+    def __init__(self, pool_size=10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def send(self, method, url, headers=None, json=None, timeout=None):
+        r = self.session.request(method, url, headers=headers, json=json, timeout=timeout)
+        try:
+            data = r.json()
+        except ValueError:
+            data = {}
+        return GatewayResponse(r.status_code, data)
+
+
+class FakeTransport:
+    """
+    In-memory transport. Routes map (method, path) to a GatewayResponse, a
+    (status_code, data) tuple, or a callable taking (json, path) and returning
+    one; callables may raise requests exceptions to simulate outages. Every
+    call is recorded in `calls`, and `latency` (seconds) is slept per call.
+    """
+
+    def __init__(self, routes=None, latency=0.0):
+        self.routes = dict(routes or {})
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def add(self, method, path, response):
+        self.routes[(method.upper(), path)] = response
+
+    def send(self, method, url, headers=None, json=None, timeout=None):
+        path = '/' + url.split('://', 1)[-1].split('/', 1)[-1]
+        with self._lock:
+            self.calls.append((method, path, json))
+        if self.latency:
+            time.sleep(self.latency)
+
+        response = self.routes.get((method.upper(), path))
+        if response is None:
+            # Fall back to the longest registered prefix, e.g. /transaction/verify/
+            prefixes = [key for key in self.routes if key[0] == method.upper() and path.startswith(key[1])]
+            if prefixes:
+                response = self.routes[max(prefixes, key=lambda key: len(key[1]))]
+        if response is None:
+            return GatewayResponse(404, {'status': False, 'message': f'No fake route for {method} {path}'})
+        if callable(response):
+            response = response(json, path)
+        return GatewayResponse(*response)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and refuses calls for
+    `reset_timeout` seconds; then lets one trial call through (half-open) and
+    closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class PaystackClient:
+    """
+    Gateway client. `request` returns a GatewayResponse for any answer below
+    500; connection errors, timeouts and 5xx answers are retried (POSTs only
+    when the request never reached the gateway) and raise GatewayError once
+    retries run out. `deadline` caps the seconds one call may take across all
+    attempts and backoff: attempts get what is left of it as their timeouts,
+    and no retry starts once it has passed.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url=PAYSTACK_API, transport=None, connect_timeout=3.05, read_timeout=10.0,
+                 retries=2, backoff=0.25, deadline=None, breaker=None, sleep=time.sleep, clock=time.monotonic):
+        self.base_url = base_url.rstrip('/')
+        self.transport = transport or RequestsTransport()
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.clock = clock
+
+    def headers(self):
+        return {
+            'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
+            'Content-Type': 'application/json',
+        }
+
+    def request(self, method, path, json=None):
+        method = method.upper()
+        error = None
+        expires = self.clock() + self.deadline if self.deadline else None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Full jitter keeps retries from many workers from arriving together.
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if expires is not None and self.clock() + delay >= expires:
+                    break
+                self.sleep(delay)
+            timeout = self.timeout
+            if expires is not None:
+                remaining = expires - self.clock()
+                if remaining <= 0:
+                    break
+                timeout = tuple(min(limit, remaining) for limit in self.timeout)
+            if not self.breaker.allow():
+                raise CircuitOpen('Payment gateway is temporarily unavailable. Please try again shortly.')
+            answered = False
+            try:
+                response = self.transport.send(
+                    method, f'{self.base_url}{path}', headers=self.headers(), json=json, timeout=timeout
+                )
+                answered = True
+            except requests.ConnectTimeout as e:
+                # Never reached the gateway, so even a POST is safe to resend.
+                error = e
+                continue
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                # A POST that may have reached the gateway is not resent.
+                if method != 'GET':
+                    break
+                continue
+            except requests.RequestException as e:
+                error = e
+                break
+            finally:
+                # Any attempt without an answer is a failure, whatever raised, so a
+                # half-open trial call is never left claimed.
+                if not answered:
+                    self.breaker.record_failure()
+
+            if response.status_code in self.RETRY_STATUSES:
+                self.breaker.record_failure()
+                error = GatewayError(f'Payment gateway returned {response.status_code}.')
+                if method != 'GET' and response.status_code != 429:
+                    break
+                continue
+
+            self.breaker.record_success()
+            return response
+        if error is None:
+            raise GatewayError('Payment gateway call deadline passed before a request could be sent.')
+        raise GatewayError(f'Payment gateway error: {error}')
+
+    async def arequest(self, method, path, json=None):
+        """`request` for async (ASGI) views; the call runs on a worker thread."""
+        return await sync_to_async(self.request, thread_sensitive=False)(method, path, json=json)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide PaystackClient, built from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaystackClient(
+                    connect_timeout=settings.PAYSTACK_CONNECT_TIMEOUT,
+                    read_timeout=settings.PAYSTACK_READ_TIMEOUT,
+                    retries=settings.PAYSTACK_MAX_RETRIES,
+                    deadline=settings.PAYSTACK_CALL_DEADLINE,
+                    breaker=CircuitBreaker(
+                        failure_threshold=settings.PAYSTACK_CIRCUIT_THRESHOLD,
+                        reset_timeout=settings.PAYSTACK_CIRCUIT_RESET,
+                    ),
+                )
+    return _client
+
+
+def set_client(client):
+    """Swap the process-wide client (e.g. for one on a FakeTransport); returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from finance.models import FeeLedgerRollup
+from finance.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute FeeLedgerRollup totals from StudentFee rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', action='append', dest='terms', help='Term id to rebuild (repeatable); default all')
+
+    def handle(self, *args, **options):
+        rebuild_rollups(options['terms'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {FeeLedgerRollup.objects.count()} fee rollup rows.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from finance.reconciliation import RECONCILE_CHUNK_SIZE, reconcile_fees
+
+
+class Command(BaseCommand):
+    help = 'Compare StudentFee.amount_paid and status with the PaymentRecord ledger, optionally repairing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help='Correct mismatched fees instead of only reporting them')
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE, help='Fees read per batch')
+
+    def handle(self, *args, **options):
+        run = reconcile_fees(repair=options['repair'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {run.fees_checked} fee(s): {run.discrepancy_count} discrepancy(ies), '
+            f'{run.repaired_count} repaired. Run {run.id}.'
+        ))
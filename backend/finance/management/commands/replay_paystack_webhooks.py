@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from finance.gateway import FakeTransport, PaystackClient, set_client
+from finance.models import PaystackEvent
+from finance.paystack import sign
+from portal.celery import app as celery_app
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay Paystack webhook payloads from a JSON fixture (one event or a list) through '
+        'the webhook endpoint in-process, signed with a local secret. No network is used, '
+        'so bursts of deliveries can be load-tested against a local database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', help='Path to a JSON file holding a Paystack event or a list of events')
+        parser.add_argument('--repeat', type=int, default=1, help='Deliver each event this many times')
+        parser.add_argument('--distinct', action='store_true',
+                            help='Suffix references per repeat so every delivery is a new transaction')
+        parser.add_argument('--fee', help='StudentFee id to set as metadata.student_fee_id on every event')
+        parser.add_argument('--process', action='store_true',
+                            help='Run the crediting task inline instead of queueing it')
+        parser.add_argument('--secret', default='replay-secret', help='Signing secret to use for the replay')
+        parser.add_argument('--gateway-latency', type=float, default=None, metavar='SECONDS',
+                            help='Re-verify each event against a fake gateway answering after this delay')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['fixture']) as fh:
+                events = json.load(fh)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read fixture: {e}')
+        if isinstance(events, dict):
+            events = [events]
+
+        bodies = []
+        for n in range(max(options['repeat'], 1)):
+            for event in events:
+                event = json.loads(json.dumps(event))
+                data = event.setdefault('data', {})
+                if options['distinct']:
+                    data['reference'] = f"{data.get('reference', 'REPLAY')}-{n}"
+                if options['fee']:
+                    data.setdefault('metadata', {})['student_fee_id'] = options['fee']
+                bodies.append(json.dumps(event).encode())
+
+        reverify = options['gateway_latency'] is not None
+        previous_client = None
+        if reverify:
+            verified = {}
+            for body in bodies:
+                data = json.loads(body)['data']
+                verified[data.get('reference')] = data
+            transport = FakeTransport(latency=options['gateway_latency'])
+            transport.add('GET', '/transaction/verify/', lambda payload, path: (
+                200, {'status': True, 'data': dict(verified.get(path.rsplit('/', 1)[-1], {}))}
+            ))
+            previous_client = set_client(PaystackClient(transport=transport))
+
+        client = Client(HTTP_HOST='localhost')
+        statuses = {}
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = options['process']
+        started = time.perf_counter()
+        try:
+            with override_settings(PAYSTACK_SECRET_KEY=options['secret'], PAYSTACK_WEBHOOK_REVERIFY=reverify):
+                for body in bodies:
+                    response = client.post(
+                        '/api/finance/paystack/webhook/', data=body, content_type='application/json',
+                        HTTP_X_PAYSTACK_SIGNATURE=sign(body, options['secret']),
+                    )
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            celery_app.conf.task_always_eager = eager
+            if reverify:
+                set_client(previous_client)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'Delivered {len(bodies)} events in {elapsed:.2f}s '
+                          f'({len(bodies) / elapsed if elapsed else 0:.0f}/s); responses: {statuses}')
+        if options['process']:
+            references = {json.loads(body)['data'].get('reference') for body in bodies}
+            counts = {}
+            for state in PaystackEvent.objects.filter(reference__in=references).values_list('status', flat=True):
+                counts[state] = counts.get(state, 0) + 1
+            self.stdout.write(self.style.SUCCESS(f'Event outcomes: {counts}'))
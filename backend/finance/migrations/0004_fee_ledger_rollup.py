@@ -0,0 +1,53 @@
+# Generated by Django 5.0 on 2026-10-19 02:40
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    StudentFee = apps.get_model('finance', 'StudentFee')
+    FeeLedgerRollup = apps.get_model('finance', 'FeeLedgerRollup')
+    totals = StudentFee.objects.order_by().values(
+        'term_id', 'fee_type__level_id', 'student__student_profile__current_class_id'
+    ).annotate(billed=Sum('fee_type__amount'), paid=Sum('amount_paid'))
+    FeeLedgerRollup.objects.bulk_create([
+        FeeLedgerRollup(
+            term_id=row['term_id'],
+            level_id=row['fee_type__level_id'],
+            school_class_id=row['student__student_profile__current_class_id'],
+            billed=row['billed'] or 0,
+            paid=row['paid'] or 0,
+        )
+        for row in totals
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0013_report_card_results'),
+        ('finance', '0003_alter_studentfee_options'),
+        ('accounts', '0015_support_tickets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeLedgerRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('billed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_rollups', to='academics.classlevel')),
+                ('school_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fee_rollups', to='academics.schoolclass')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_rollups', to='academics.term')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='feeledgerrollup',
+            constraint=models.UniqueConstraint(fields=('term', 'level', 'school_class'), name='unique_fee_rollup_bucket', nulls_distinct=False),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
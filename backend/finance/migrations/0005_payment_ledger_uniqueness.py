@@ -0,0 +1,39 @@
+# Generated by Django 5.0 on 2026-10-19 02:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_transaction_ids(apps, schema_editor):
+    """Blank references become NULL; repeated ones keep the oldest and suffix the rest."""
+    PaymentRecord = apps.get_model('finance', 'PaymentRecord')
+    PaymentRecord.objects.filter(transaction_id='').update(transaction_id=None)
+    duplicated = PaymentRecord.objects.exclude(transaction_id=None).values('transaction_id').annotate(
+        n=Count('id')
+    ).filter(n__gt=1).values_list('transaction_id', flat=True)
+    for reference in list(duplicated):
+        later = PaymentRecord.objects.filter(transaction_id=reference).order_by('date')[1:]
+        for index, payment in enumerate(later, start=2):
+            payment.transaction_id = f"{reference[:90]}-dup{index}"
+            payment.save(update_fields=['transaction_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_fee_ledger_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentrecord',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(dedupe_transaction_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='paymentrecord',
+            name='transaction_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
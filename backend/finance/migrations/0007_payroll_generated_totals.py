@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-19 02:55
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_paystack_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='gross_salary',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('basic_salary'), '+', models.F('housing_allowance')), '+', models.F('transport_allowance')), '+', models.F('meal_allowance')), '+', models.F('responsibility_allowance')), '+', models.F('overtime')), '+', models.F('bonuses')), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='net_salary',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('basic_salary'), '+', models.F('housing_allowance')), '+', models.F('transport_allowance')), '+', models.F('meal_allowance')), '+', models.F('responsibility_allowance')), '+', models.F('overtime')), '+', models.F('bonuses')), '-', models.F('tax')), '-', models.F('pension')), '-', models.F('loans')), '-', models.F('other_deductions')), '-', models.F('deductions')), '-', models.F('leave_adjustment')), '-', models.F('attendance_adjustment')), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='total_allowances',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('housing_allowance'), '+', models.F('transport_allowance')), '+', models.F('meal_allowance')), '+', models.F('responsibility_allowance')), '+', models.F('overtime')), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='total_deductions',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('tax'), '+', models.F('pension')), '+', models.F('loans')), '+', models.F('other_deductions')), '+', models.F('deductions')), '+', models.F('leave_adjustment')), '+', models.F('attendance_adjustment')), output_field=models.DecimalField(decimal_places=2, max_digits=14)),
+        ),
+        migrations.AddIndex(
+            model_name='payroll',
+            index=models.Index(fields=['year', 'month', 'net_salary'], name='finance_pay_year_440260_idx'),
+        ),
+    ]
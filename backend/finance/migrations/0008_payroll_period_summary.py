@@ -0,0 +1,47 @@
+# Generated by Django 5.0 on 2026-10-19 02:58
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_payroll_generated_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollPeriodSummary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('total_staff', models.PositiveIntegerField(default=0)),
+                ('staff_paid', models.PositiveIntegerField(default=0)),
+                ('total_basic', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_allowances', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_bonuses', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_deductions', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_pension', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_gross', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_net', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('departments', models.JSONField(blank=True, default=dict)),
+                ('status_counts', models.JSONField(blank=True, default=dict)),
+                ('closed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closed_payroll_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='payrollperiodsummary',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_payroll_period_summary'),
+        ),
+    ]
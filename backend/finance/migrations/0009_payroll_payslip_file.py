@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_payroll_period_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='payslip_file',
+            field=models.FileField(blank=True, editable=False, max_length=255, null=True, upload_to='payslips/'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='payslip_version',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
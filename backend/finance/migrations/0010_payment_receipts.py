@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-19 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_payroll_payslip_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptSequence',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='paymentrecord',
+            name='receipt_file',
+            field=models.FileField(blank=True, editable=False, max_length=255, null=True, upload_to='receipts/'),
+        ),
+        migrations.AddField(
+            model_name='paymentrecord',
+            name='receipt_number',
+            field=models.CharField(blank=True, editable=False, max_length=30, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0 on 2026-10-19 03:28
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_payment_receipts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeReconciliationRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('repair', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('fees_checked', models.PositiveIntegerField(default=0)),
+                ('discrepancy_count', models.PositiveIntegerField(default=0)),
+                ('repaired_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeeDiscrepancy',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('recorded_amount_paid', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('ledger_amount_paid', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('recorded_status', models.CharField(max_length=20)),
+                ('expected_status', models.CharField(max_length=20)),
+                ('repaired', models.BooleanField(default=False)),
+                ('student_fee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='finance.studentfee')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='finance.feereconciliationrun')),
+            ],
+            options={
+                'ordering': ['run', 'student_fee'],
+            },
+        ),
+    ]
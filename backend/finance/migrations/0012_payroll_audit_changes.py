@@ -0,0 +1,70 @@
+from django.db import migrations, models
+
+
+# Payroll fields as they stood when audit entries switched to diffs.
+AUDITED_FIELDS = [
+    'teacher', 'month', 'year', 'department', 'salary_grade', 'payment_schedule', 'basic_salary',
+    'housing_allowance', 'transport_allowance', 'meal_allowance', 'responsibility_allowance', 'overtime',
+    'bonuses', 'tax', 'pension', 'loans', 'other_deductions', 'deductions', 'leave_adjustment',
+    'attendance_adjustment', 'status', 'due_date', 'payment_date', 'payment_method', 'payment_reference',
+    'approved_by', 'approved_at', 'locked_at', 'notes',
+]
+
+# Keys the old hand-built entries used for payroll fields.
+ALIASES = {'method': 'payment_method', 'reason': 'notes'}
+
+
+def _fields(value):
+    fields = {}
+    for key, field_value in (value or {}).items():
+        name = ALIASES.get(key, key)
+        if name in AUDITED_FIELDS:
+            fields[name] = None if field_value == 'None' else field_value
+    return fields
+
+
+def compact_audit_logs(apps, schema_editor):
+    """
+    Replace the full before/after serializer dumps (which embedded every
+    earlier audit entry) with the {field: [old, new]} diff of payroll fields.
+    """
+    PayrollAuditLog = apps.get_model('finance', 'PayrollAuditLog')
+    batch = []
+    legacy = PayrollAuditLog.objects.filter(schema_version=1).only('id', 'previous_value', 'updated_value')
+    for log in legacy.iterator(chunk_size=500):
+        before, after = _fields(log.previous_value), _fields(log.updated_value)
+        log.changes = {
+            name: [before.get(name), after.get(name)]
+            for name in AUDITED_FIELDS
+            if (name in before or name in after) and before.get(name) != after.get(name)
+        }
+        log.schema_version = 2
+        log.previous_value = None
+        log.updated_value = None
+        batch.append(log)
+        if len(batch) == 500:
+            PayrollAuditLog.objects.bulk_update(batch, ['changes', 'schema_version', 'previous_value', 'updated_value'])
+            batch = []
+    if batch:
+        PayrollAuditLog.objects.bulk_update(batch, ['changes', 'schema_version', 'previous_value', 'updated_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0011_fee_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollauditlog',
+            name='changes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='payrollauditlog',
+            name='schema_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.RunPython(compact_audit_logs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_payroll_audit_changes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='payrollauditlog',
+            name='previous_value',
+        ),
+        migrations.RemoveField(
+            model_name='payrollauditlog',
+            name='updated_value',
+        ),
+        migrations.AlterField(
+            model_name='payrollauditlog',
+            name='schema_version',
+            field=models.PositiveSmallIntegerField(default=2),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-19 03:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_drop_payroll_audit_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='payrollauditlog',
+            options={'ordering': ['-timestamp', '-id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='payrollauditlog',
+            name='finance_pay_action_317a75_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='payrollauditlog',
+            name='finance_pay_timesta_8472db_idx',
+        ),
+        migrations.AddIndex(
+            model_name='payrollauditlog',
+            index=models.Index(fields=['timestamp', 'id'], name='finance_pay_timesta_3ae8be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payrollauditlog',
+            index=models.Index(fields=['action', 'timestamp', 'id'], name='finance_pay_action_b7275f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payrollauditlog',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='finance_pay_user_id_da73ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payrollauditlog',
+            index=models.Index(fields=['payroll', 'timestamp', 'id'], name='finance_pay_payroll_f9d177_idx'),
+        ),
+    ]
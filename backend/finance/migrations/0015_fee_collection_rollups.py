@@ -0,0 +1,45 @@
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0013_report_card_results'),
+        ('finance', '0014_payroll_audit_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='feeledgerrollup',
+            name='unique_fee_rollup_bucket',
+        ),
+        migrations.AddField(
+            model_name='feeledgerrollup',
+            name='fee_type',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='finance.feetype'),
+        ),
+        migrations.CreateModel(
+            name='FeeCollectionRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('transfer', 'Bank Transfer'), ('card', 'Card Payment'), ('online', 'Online Gateway')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('fee_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_rollups', to='finance.feetype')),
+                ('level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_rollups', to='academics.classlevel')),
+                ('school_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='collection_rollups', to='academics.schoolclass')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_rollups', to='academics.term')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'day'], name='finance_fee_term_id_faf06b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feecollectionrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'term', 'level', 'school_class', 'fee_type', 'payment_method'), name='unique_fee_collection_bucket', nulls_distinct=False),
+        ),
+    ]
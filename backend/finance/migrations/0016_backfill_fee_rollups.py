@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def rebuild_rollups(apps, schema_editor):
+    """Recount the ledger rollups per fee type and backfill the daily collection rollups."""
+    StudentFee = apps.get_model('finance', 'StudentFee')
+    PaymentRecord = apps.get_model('finance', 'PaymentRecord')
+    FeeLedgerRollup = apps.get_model('finance', 'FeeLedgerRollup')
+    FeeCollectionRollup = apps.get_model('finance', 'FeeCollectionRollup')
+
+    totals = StudentFee.objects.order_by().values(
+        'term_id', 'fee_type_id', 'fee_type__level_id', 'student__student_profile__current_class_id'
+    ).annotate(billed=Sum('fee_type__amount'), paid=Sum('amount_paid'))
+    FeeLedgerRollup.objects.all().delete()
+    FeeLedgerRollup.objects.bulk_create([
+        FeeLedgerRollup(
+            term_id=row['term_id'],
+            level_id=row['fee_type__level_id'],
+            school_class_id=row['student__student_profile__current_class_id'],
+            fee_type_id=row['fee_type_id'],
+            billed=row['billed'] or 0,
+            paid=row['paid'] or 0,
+        )
+        for row in totals
+    ], batch_size=500)
+
+    daily = PaymentRecord.objects.order_by().values(
+        'payment_method',
+        'student_fee__term_id', 'student_fee__fee_type_id', 'student_fee__fee_type__level_id',
+        'student_fee__student__student_profile__current_class_id',
+        day=TruncDate('date'),
+    ).annotate(amount=Sum('amount'), count=Count('id'))
+    FeeCollectionRollup.objects.bulk_create([
+        FeeCollectionRollup(
+            day=row['day'],
+            term_id=row['student_fee__term_id'],
+            level_id=row['student_fee__fee_type__level_id'],
+            school_class_id=row['student_fee__student__student_profile__current_class_id'],
+            fee_type_id=row['student_fee__fee_type_id'],
+            payment_method=row['payment_method'],
+            amount=row['amount'] or 0,
+            payments=row['count'],
+        )
+        for row in daily
+    ], batch_size=500)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0015_fee_collection_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0016_backfill_fee_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feeledgerrollup',
+            name='fee_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='finance.feetype'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeledgerrollup',
+            constraint=models.UniqueConstraint(fields=('term', 'level', 'school_class', 'fee_type'), name='unique_fee_rollup_bucket', nulls_distinct=False),
+        ),
+    ]
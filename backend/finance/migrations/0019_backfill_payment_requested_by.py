@@ -0,0 +1,19 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_requested_by(apps, schema_editor):
+    """Keys posted so far came from the cashier who received the payment."""
+    PaymentRecord = apps.get_model('finance', 'PaymentRecord')
+    PaymentRecord.objects.exclude(idempotency_key=None).update(requested_by=F('received_by'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0018_payment_idempotency_per_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_requested_by, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,9 @@
 import uuid
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 from django.utils import timezone
-from academics.models import Term, ClassLevel
+from academics.models import Term, ClassLevel, SchoolClass
 
 class FeeType(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -14,6 +15,15 @@ class FeeType(models.Model):
     def __str__(self):
         return f"{self.name} - {self.amount}"
 
+class StudentFeeQuerySet(models.QuerySet):
+    def with_balance(self):
+        """Annotate `balance_due`, the database-side equivalent of StudentFee.balance."""
+        return self.annotate(balance_due=F('fee_type__amount') - F('amount_paid'))
+
+    def owing(self):
+        return self.with_balance().filter(balance_due__gt=0)
+
+
 class StudentFee(models.Model):
     STATUS_CHOICES = [
         ('paid', 'Fully Paid'),
@@ -31,9 +41,12 @@ class StudentFee(models.Model):
     term = models.ForeignKey(Term, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='outstanding')
     amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    
+
+    objects = StudentFeeQuerySet.as_manager()
+
     @property
     def balance(self):
+        # Keep in step with StudentFeeQuerySet.with_balance().
         return self.fee_type.amount - self.amount_paid
 
     class Meta:
@@ -54,7 +67,18 @@ class PaymentRecord(models.Model):
     student_fee = models.ForeignKey(StudentFee, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
-    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
+    # Client-supplied key (Idempotency-Key header) so a retried request posts once.
+    # Keys are unique per requester, so two clients choosing the same key do not collide.
+    idempotency_key = models.CharField(max_length=100, blank=True, null=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        editable=False,
+    )
     date = models.DateTimeField(default=timezone.now)
     received_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
@@ -62,10 +86,182 @@ class PaymentRecord(models.Model):
         null=True,
         limit_choices_to={'role': 'admin'}
     )
+    # Set once by the receipt task (finance.receipts.issue_receipt); never re-rendered.
+    receipt_number = models.CharField(max_length=30, unique=True, blank=True, null=True, editable=False)
+    receipt_file = models.FileField(upload_to='receipts/', max_length=255, blank=True, null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['requested_by', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_payment_idempotency_key_per_user',
+            ),
+        ]
 
     def __str__(self):
         return f"Payment of {self.amount} for {self.student_fee.student.full_name}"
 
+
+class ReceiptSequence(models.Model):
+    """Last receipt number issued in a year; the row is locked while a number is taken."""
+    year = models.PositiveIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Receipts {self.year}: {self.last_number}"
+
+
+class PaystackEvent(models.Model):
+    """A webhook delivery from Paystack, stored verbatim before it is processed."""
+
+    STATUS_CHOICES = [
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    event = models.CharField(max_length=60)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    payment = models.ForeignKey(
+        PaymentRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='paystack_events'
+    )
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.reference} ({self.status})"
+
+
+class FeeLedgerRollup(models.Model):
+    """
+    Running billed / paid totals per (term, level, class, fee type), kept in
+    step with StudentFee and PaymentRecord by finance.rollups so the fee
+    summary header and collections analytics read a handful of rows instead
+    of aggregating every fee.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name='fee_rollups')
+    level = models.ForeignKey(ClassLevel, on_delete=models.CASCADE, related_name='fee_rollups')
+    school_class = models.ForeignKey(
+        SchoolClass, on_delete=models.CASCADE, null=True, blank=True, related_name='fee_rollups'
+    )
+    fee_type = models.ForeignKey(FeeType, on_delete=models.CASCADE, related_name='rollups')
+    billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'level', 'school_class', 'fee_type'],
+                name='unique_fee_rollup_bucket',
+                nulls_distinct=False,
+            ),
+        ]
+
+    @property
+    def outstanding(self):
+        return self.billed - self.paid
+
+    def __str__(self):
+        return f"Fees {self.term} / {self.school_class or self.level}: {self.paid} of {self.billed}"
+
+
+class FeeCollectionRollup(models.Model):
+    """
+    Payments received per day and (term, level, class, fee type, method), kept
+    in step with PaymentRecord by finance.rollups so the collections time
+    series and the per-method figures never scan the payment ledger.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    day = models.DateField()
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name='collection_rollups')
+    level = models.ForeignKey(ClassLevel, on_delete=models.CASCADE, related_name='collection_rollups')
+    school_class = models.ForeignKey(
+        SchoolClass, on_delete=models.CASCADE, null=True, blank=True, related_name='collection_rollups'
+    )
+    fee_type = models.ForeignKey(FeeType, on_delete=models.CASCADE, related_name='collection_rollups')
+    payment_method = models.CharField(max_length=20, choices=PaymentRecord.PAYMENT_METHOD_CHOICES)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'term', 'level', 'school_class', 'fee_type', 'payment_method'],
+                name='unique_fee_collection_bucket',
+                nulls_distinct=False,
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'day']),
+        ]
+
+    def __str__(self):
+        return f"Collected {self.day}: {self.amount} by {self.payment_method}"
+
+
+class FeeReconciliationRun(models.Model):
+    """One pass of finance.reconciliation over every StudentFee."""
+
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    repair = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    fees_checked = models.PositiveIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+    repaired_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Fee reconciliation {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+
+
+class FeeDiscrepancy(models.Model):
+    """A StudentFee whose amount_paid or status disagreed with its PaymentRecord ledger."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    run = models.ForeignKey(FeeReconciliationRun, on_delete=models.CASCADE, related_name='discrepancies')
+    student_fee = models.ForeignKey(StudentFee, on_delete=models.CASCADE, related_name='discrepancies')
+    recorded_amount_paid = models.DecimalField(max_digits=12, decimal_places=2)
+    ledger_amount_paid = models.DecimalField(max_digits=12, decimal_places=2)
+    recorded_status = models.CharField(max_length=20)
+    expected_status = models.CharField(max_length=20)
+    repaired = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['run', 'student_fee']
+
+    @property
+    def difference(self):
+        return self.recorded_amount_paid - self.ledger_amount_paid
+
+    def __str__(self):
+        return f"{self.student_fee_id}: recorded {self.recorded_amount_paid}, ledger {self.ledger_amount_paid}"
+
 class Payroll(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -135,42 +331,63 @@ class Payroll(models.Model):
     approved_at = models.DateTimeField(blank=True, null=True)
     locked_at = models.DateTimeField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    # Rendered payslip PDF and the updated_at it was rendered from; a newer
+    # updated_at means the stored file is stale.
+    payslip_file = models.FileField(upload_to='payslips/', max_length=255, blank=True, null=True, editable=False)
+    payslip_version = models.DateTimeField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
-    @property
-    def total_allowances(self):
-        return (
-            self.housing_allowance +
-            self.transport_allowance +
-            self.meal_allowance +
-            self.responsibility_allowance +
-            self.overtime
-        )
+    # Totals are computed and stored by the database, so reports can aggregate,
+    # filter and sort on them in SQL. Saving an existing row drops the loaded
+    # values and they are re-read on next access.
+    total_allowances = models.GeneratedField(
+        expression=(
+            F('housing_allowance') + F('transport_allowance') + F('meal_allowance') +
+            F('responsibility_allowance') + F('overtime')
+        ),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        db_persist=True,
+    )
+    total_deductions = models.GeneratedField(
+        expression=(
+            F('tax') + F('pension') + F('loans') + F('other_deductions') +
+            F('deductions') + F('leave_adjustment') + F('attendance_adjustment')
+        ),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        db_persist=True,
+    )
+    gross_salary = models.GeneratedField(
+        expression=(
+            F('basic_salary') + F('housing_allowance') + F('transport_allowance') +
+            F('meal_allowance') + F('responsibility_allowance') + F('overtime') + F('bonuses')
+        ),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        db_persist=True,
+    )
+    net_salary = models.GeneratedField(
+        expression=(
+            F('basic_salary') + F('housing_allowance') + F('transport_allowance') +
+            F('meal_allowance') + F('responsibility_allowance') + F('overtime') + F('bonuses') -
+            F('tax') - F('pension') - F('loans') - F('other_deductions') -
+            F('deductions') - F('leave_adjustment') - F('attendance_adjustment')
+        ),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        db_persist=True,
+    )
+
+    GENERATED_TOTALS = ('total_allowances', 'total_deductions', 'gross_salary', 'net_salary')
 
     @property
     def total_bonuses(self):
         return self.bonuses
 
-    @property
-    def total_deductions(self):
-        return (
-            self.tax +
-            self.pension +
-            self.loans +
-            self.other_deductions +
-            self.deductions +
-            self.leave_adjustment +
-            self.attendance_adjustment
-        )
-
-    @property
-    def gross_salary(self):
-        return self.basic_salary + self.total_allowances + self.total_bonuses
-
-    @property
-    def net_salary(self):
-        return self.gross_salary - self.total_deductions
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding:
+            for name in self.GENERATED_TOTALS:
+                self.__dict__.pop(name, None)
 
     class Meta:
         unique_together = ('teacher', 'month', 'year')
@@ -178,6 +395,7 @@ class Payroll(models.Model):
             models.Index(fields=['year', 'month']),
             models.Index(fields=['status']),
             models.Index(fields=['payment_date']),
+            models.Index(fields=['year', 'month', 'net_salary']),
         ]
 
     def __str__(self):
@@ -189,16 +407,58 @@ class PayrollAuditLog(models.Model):
     payroll = models.ForeignKey(Payroll, on_delete=models.CASCADE, related_name='audit_logs')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     action = models.CharField(max_length=80)
-    previous_value = models.JSONField(blank=True, null=True)
-    updated_value = models.JSONField(blank=True, null=True)
+    # {field: [old, new]} for the fields the action changed; see finance.audit.
+    changes = models.JSONField(default=dict, blank=True)
+    schema_version = models.PositiveSmallIntegerField(default=2)
     timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        ordering = ['-timestamp']
+        ordering = ['-timestamp', '-id']
+        # One index per audit trail filter, each ending in the (timestamp, id)
+        # cursor order so a filtered page is a single index range scan.
         indexes = [
-            models.Index(fields=['action']),
-            models.Index(fields=['timestamp']),
+            models.Index(fields=['timestamp', 'id']),
+            models.Index(fields=['action', 'timestamp', 'id']),
+            models.Index(fields=['user', 'timestamp', 'id']),
+            models.Index(fields=['payroll', 'timestamp', 'id']),
         ]
 
     def __str__(self):
         return f"{self.action} - {self.payroll}"
+
+
+class PayrollPeriodSummary(models.Model):
+    """
+    Frozen totals of a closed payroll month. Written once when every row of the
+    month is locked or paid; its existence marks the period closed, after which
+    the month's payroll rows can no longer change.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    total_staff = models.PositiveIntegerField(default=0)
+    staff_paid = models.PositiveIntegerField(default=0)
+    total_basic = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_allowances = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_bonuses = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_tax = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_pension = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_net = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    departments = models.JSONField(default=dict, blank=True)
+    status_counts = models.JSONField(default=dict, blank=True)
+    closed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='closed_payroll_periods'
+    )
+    closed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='unique_payroll_period_summary'),
+        ]
+
+    def __str__(self):
+        return f"Payroll period {self.month}/{self.year} (closed)"
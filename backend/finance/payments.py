@@ -0,0 +1,132 @@
+"""
+Posting payments against a StudentFee.
+
+PaymentRecord is the append-only ledger: every payment is one new row, never
+edited or deleted. `post_payment` locks the fee row, appends the ledger entry
+and moves amount_paid / status in the same transaction, so a cashier and a
+gateway callback paying the same fee at once cannot lose an update. A repeated
+transaction_id or idempotency key returns the original entry instead of
+posting twice; idempotency keys are scoped to the user who sent them. A
+replay whose fee or amount differs from the original entry is refused with
+PaymentConflict rather than answered with someone else's payment. Each new
+entry's receipt is queued once it commits.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import PaymentRecord, StudentFee
+from .rollups import adjust_rollup, record_collection
+
+
+class PaymentError(Exception):
+    """The payment cannot be posted (bad amount, overpayment, unknown fee)."""
+
+
+class PaymentConflict(PaymentError):
+    """The reference or idempotency key was already used for a different fee or amount."""
+
+
+def to_amount(value):
+    try:
+        amount = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise PaymentError('Invalid amount.')
+    if amount <= 0:
+        raise PaymentError('Amount must be greater than zero.')
+    return amount
+
+
+def fee_status(amount_paid, fee_amount):
+    """The status a fee with `amount_paid` of `fee_amount` paid should have."""
+    if amount_paid >= fee_amount:
+        return 'paid'
+    if amount_paid > 0:
+        return 'partial'
+    return 'outstanding'
+
+
+def find_existing_payment(transaction_id=None, idempotency_key=None, requested_by=None):
+    lookup = Q()
+    if transaction_id:
+        lookup |= Q(transaction_id=transaction_id)
+    if idempotency_key:
+        lookup |= Q(idempotency_key=idempotency_key, requested_by=requested_by)
+    if not lookup:
+        return None
+    return PaymentRecord.objects.filter(lookup).select_related('student_fee__fee_type').first()
+
+
+def _replay(existing, student_fee_id, amount):
+    """(existing, False) when the request repeats `existing`; PaymentConflict when it does not."""
+    if str(existing.student_fee_id) != str(student_fee_id) or existing.amount != amount:
+        raise PaymentConflict(
+            'This transaction reference or idempotency key was already used for a different fee or amount.'
+        )
+    return existing, False
+
+
+def post_payment(student_fee_id, amount, payment_method, transaction_id=None,
+                 idempotency_key=None, received_by=None, requested_by=None, allow_overpayment=False):
+    """
+    Append a payment for `student_fee_id`. Returns (payment, created); `created`
+    is False when the transaction_id, or `requested_by`'s idempotency key, was
+    already posted for the same fee and amount.
+    """
+    amount = to_amount(amount)
+    transaction_id = transaction_id or None
+    idempotency_key = idempotency_key or None
+
+    existing = find_existing_payment(transaction_id, idempotency_key, requested_by)
+    if existing:
+        return _replay(existing, student_fee_id, amount)
+
+    try:
+        with transaction.atomic():
+            try:
+                fee = StudentFee.objects.select_for_update(of=('self',)).select_related('fee_type', 'term').get(
+                    id=student_fee_id
+                )
+            except (StudentFee.DoesNotExist, ValueError):
+                raise PaymentError('Student fee not found.')
+
+            # Re-check under the lock: a concurrent request may have just posted it.
+            existing = find_existing_payment(transaction_id, idempotency_key, requested_by)
+            if existing:
+                return _replay(existing, student_fee_id, amount)
+
+            remaining = fee.fee_type.amount - fee.amount_paid
+            if not allow_overpayment and amount > remaining:
+                raise PaymentError(
+                    f'Amount ₦{amount:,.2f} exceeds remaining balance of ₦{remaining:,.2f}.'
+                )
+
+            payment = PaymentRecord.objects.create(
+                student_fee=fee,
+                amount=amount,
+                payment_method=payment_method,
+                transaction_id=transaction_id,
+                idempotency_key=idempotency_key,
+                requested_by=requested_by if idempotency_key else None,
+                received_by=received_by,
+            )
+            fee.amount_paid += amount
+            fee.status = fee_status(fee.amount_paid, fee.fee_type.amount)
+            fee.save(update_fields=['amount_paid', 'status'])
+            adjust_rollup(fee, paid=amount)
+            record_collection(payment)
+            # Rendered on a worker after commit, never inside the payment request.
+            from .tasks import queue_receipt
+            queue_receipt(payment.id)
+            from .statements import forget_student_statements
+            transaction.on_commit(lambda: forget_student_statements([fee.student_id]))
+    except IntegrityError:
+        # Same reference posted against a different fee at the same moment.
+        existing = find_existing_payment(transaction_id, idempotency_key, requested_by)
+        if existing:
+            return _replay(existing, student_fee_id, amount)
+        raise
+
+    payment.student_fee = fee
+    return payment, True
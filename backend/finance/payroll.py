@@ -0,0 +1,322 @@
+"""
+Payroll period totals, period close and bulk status changes.
+
+`payroll_totals` sums a month in one aggregate over the generated total
+columns. Once every row of a month is locked or paid, `close_period` freezes
+those totals (plus per-department figures and a status histogram) into a
+PayrollPeriodSummary; historical reports and trends then read one summary row
+per month instead of every payroll row.
+
+Bulk pay/approve lock the selected rows and write them, their audit logs and
+their notifications with set-based statements inside one transaction, and
+monthly generation creates any number of months of payroll the same way.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Min, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .audit import audit_entry, payroll_snapshot
+from .models import Payroll, PayrollAuditLog, PayrollPeriodSummary
+
+
+CLOSABLE_STATUSES = ('locked', 'paid')
+BULK_CHUNK_SIZE = 500
+
+
+class PeriodError(Exception):
+    """The payroll period cannot be closed, or is closed and cannot change."""
+
+
+def payroll_totals(queryset):
+    """Period totals and status counts for a payroll queryset in one aggregate query."""
+    zero = Decimal('0.00')
+    return queryset.order_by().aggregate(
+        net=Sum('net_salary', default=zero),
+        gross=Sum('gross_salary', default=zero),
+        basic=Sum('basic_salary', default=zero),
+        allowances=Sum('total_allowances', default=zero),
+        bonuses=Sum('bonuses', default=zero),
+        deductions=Sum('total_deductions', default=zero),
+        tax=Sum('tax', default=zero),
+        pension=Sum('pension', default=zero),
+        total_staff=Count('id'),
+        staff_paid=Count('id', filter=Q(status='paid')),
+        pending=Count('id', filter=~Q(status__in=['paid', 'reversed', 'cancelled'])),
+        locked=Count('id', filter=Q(status='locked')),
+        approved=Count('id', filter=Q(status__in=['approved', 'locked', 'processing', 'paid'])),
+        due_date=Min('due_date'),
+    )
+
+
+def is_period_closed(year, month):
+    return PayrollPeriodSummary.objects.filter(year=year, month=month).exists()
+
+
+def ensure_period_open(payroll):
+    if is_period_closed(payroll.year, payroll.month):
+        raise PeriodError(f'Payroll for {payroll.month}/{payroll.year} is closed and can no longer be changed.')
+
+
+def open_period_payrolls(queryset):
+    """Restrict a payroll queryset to months that have not been closed."""
+    return queryset.filter(~Exists(PayrollPeriodSummary.objects.filter(
+        year=OuterRef('year'), month=OuterRef('month')
+    )))
+
+
+@transaction.atomic
+def close_period(year, month, user=None):
+    """Freeze the totals of a fully locked/paid month. Returns the PayrollPeriodSummary."""
+    rows = Payroll.objects.filter(year=year, month=month)
+    # Lock the month's rows so none can change between the check and the snapshot.
+    statuses = list(rows.select_for_update().order_by().values_list('status', flat=True))
+    if not statuses:
+        raise PeriodError(f'There is no payroll for {month}/{year}.')
+    open_rows = sum(1 for value in statuses if value not in CLOSABLE_STATUSES)
+    if open_rows:
+        raise PeriodError(f'{open_rows} payroll record(s) for {month}/{year} are not locked or paid yet.')
+    if is_period_closed(year, month):
+        raise PeriodError(f'Payroll for {month}/{year} is already closed.')
+
+    totals = payroll_totals(rows)
+    departments = {
+        row['department'] or 'Unassigned': {
+            'staff': row['staff'],
+            'gross': str(row['gross']),
+            'deductions': str(row['deductions']),
+            'net': str(row['net']),
+        }
+        for row in rows.order_by().values('department').annotate(
+            staff=Count('id'),
+            gross=Sum('gross_salary'),
+            deductions=Sum('total_deductions'),
+            net=Sum('net_salary'),
+        )
+    }
+    status_counts = {
+        row['status']: row['count']
+        for row in rows.order_by().values('status').annotate(count=Count('id'))
+    }
+
+    try:
+        with transaction.atomic():
+            return PayrollPeriodSummary.objects.create(
+                year=year,
+                month=month,
+                total_staff=totals['total_staff'],
+                staff_paid=totals['staff_paid'],
+                total_basic=totals['basic'],
+                total_allowances=totals['allowances'],
+                total_bonuses=totals['bonuses'],
+                total_deductions=totals['deductions'],
+                total_tax=totals['tax'],
+                total_pension=totals['pension'],
+                total_gross=totals['gross'],
+                total_net=totals['net'],
+                departments=departments,
+                status_counts=status_counts,
+                closed_by=user,
+            )
+    except IntegrityError:
+        raise PeriodError(f'Payroll for {month}/{year} is already closed.')
+
+
+def period_trend(year):
+    """
+    Month-by-month totals for `year` plus year-to-date figures: closed months
+    come from their summary rows, the remaining months from one grouped query.
+    """
+    zero = Decimal('0.00')
+    months = {}
+    for summary in PayrollPeriodSummary.objects.filter(year=year):
+        months[summary.month] = {
+            'month': summary.month,
+            'closed': True,
+            'total_staff': summary.total_staff,
+            'staff_paid': summary.staff_paid,
+            'total_gross': summary.total_gross,
+            'total_deductions': summary.total_deductions,
+            'total_net': summary.total_net,
+        }
+
+    live = open_period_payrolls(Payroll.objects.filter(year=year)).order_by().values('month').annotate(
+        total_staff=Count('id'),
+        staff_paid=Count('id', filter=Q(status='paid')),
+        total_gross=Sum('gross_salary', default=zero),
+        total_deductions=Sum('total_deductions', default=zero),
+        total_net=Sum('net_salary', default=zero),
+    )
+    for row in live:
+        months[row['month']] = {**row, 'closed': False}
+
+    periods = [months[month] for month in sorted(months)]
+    year_to_date = {
+        key: sum((period[key] for period in periods), zero)
+        for key in ('total_gross', 'total_deductions', 'total_net')
+    }
+    return {'year': year, 'periods': periods, 'year_to_date': year_to_date}
+
+
+def _chunks(rows, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _staff_notification(payroll, user, title, message):
+    from accounts.models import Notification
+    return Notification(
+        sender=user if getattr(user, 'is_authenticated', False) else None,
+        recipient_id=payroll.teacher_id,
+        title=title,
+        message=message,
+        category='finance',
+        audience='selected'
+    )
+
+
+@transaction.atomic
+def bulk_pay_payrolls(ids, payment_method, user, progress=None):
+    """
+    Mark the given payrolls paid in one transaction: rows are locked, then
+    written with bulk_update, and audit logs and notifications go in with one
+    bulk_create each per chunk. `progress(done, total)` is called after each chunk.
+    """
+    from accounts.models import Notification
+
+    records = list(
+        open_period_payrolls(Payroll.objects.filter(id__in=ids))
+        .exclude(status__in=['paid', 'reversed', 'cancelled'])
+        .select_for_update().order_by('id')
+    )
+    now = timezone.now()
+    done = 0
+    for chunk in _chunks(records):
+        logs, notifications = [], []
+        for payroll in chunk:
+            previous = payroll_snapshot(payroll)
+            payroll.status = 'paid'
+            payroll.payment_date = now.date()
+            payroll.payment_method = payment_method
+            payroll.payment_reference = f"BULK-{payroll.year}{payroll.month:02d}-{str(payroll.id)[:8].upper()}"
+            payroll.updated_at = now
+            logs.append(audit_entry(payroll, user, 'salary_payment_processed', previous, now))
+            notifications.append(_staff_notification(
+                payroll, user, 'Salary Paid',
+                f'Your salary of ₦{float(payroll.net_salary):,.2f} for {payroll.month}/{payroll.year} has been paid. '
+                f'Reference: {payroll.payment_reference}.'
+            ))
+        Payroll.objects.bulk_update(
+            chunk, ['status', 'payment_date', 'payment_method', 'payment_reference', 'updated_at']
+        )
+        PayrollAuditLog.objects.bulk_create(logs)
+        Notification.objects.bulk_create(notifications)
+        done += len(chunk)
+        if progress:
+            progress(done, len(records))
+    return {'paid_count': done}
+
+
+@transaction.atomic
+def bulk_approve_payrolls(ids, user, progress=None):
+    """Approve the given draft/preview payrolls in one transaction; see bulk_pay_payrolls."""
+    from accounts.models import Notification
+
+    records = list(
+        Payroll.objects.filter(id__in=ids, status__in=['draft', 'preview'])
+        .select_for_update().order_by('id')
+    )
+    now = timezone.now()
+    approver = user if getattr(user, 'is_authenticated', False) else None
+    done = 0
+    for chunk in _chunks(records):
+        logs, notifications = [], []
+        for payroll in chunk:
+            previous = payroll_snapshot(payroll)
+            payroll.status = 'approved'
+            payroll.approved_by = approver
+            payroll.approved_at = now
+            payroll.updated_at = now
+            logs.append(audit_entry(payroll, user, 'payroll_approved', previous, now))
+            notifications.append(_staff_notification(
+                payroll, user, 'Payroll Approved', f'Your payroll for {payroll.month}/{payroll.year} has been approved.'
+            ))
+        Payroll.objects.bulk_update(chunk, ['status', 'approved_by', 'approved_at', 'updated_at'])
+        PayrollAuditLog.objects.bulk_create(logs)
+        Notification.objects.bulk_create(notifications)
+        done += len(chunk)
+        if progress:
+            progress(done, len(records))
+    return {'approved_count': done}
+
+
+DEFAULT_BASIC_SALARY = Decimal('50000.00')
+
+
+@transaction.atomic
+def generate_payroll(year, months, user=None, include_admin=False, department=None,
+                     salary_grade=None, due_date=None):
+    """
+    Create draft payroll for every active staff member for each of `months` of
+    `year`, skipping rows that already exist and months that are closed.
+    Returns {'created', 'skipped', 'closed_months', 'periods': [...]}.
+    """
+    from accounts.models import User
+
+    roles = ['teacher', 'admin'] if include_admin else ['teacher']
+    staff = list(User.objects.filter(role__in=roles, is_active=True).select_related('teacher_profile'))
+    closed = set(PayrollPeriodSummary.objects.filter(year=year, month__in=months).values_list('month', flat=True))
+    open_months = [month for month in months if month not in closed]
+    existing = set(Payroll.objects.filter(
+        year=year, month__in=open_months, teacher__in=staff
+    ).values_list('teacher_id', 'month'))
+
+    new_rows = []
+    for month in open_months:
+        for member in staff:
+            if (member.id, month) in existing:
+                continue
+            profile = getattr(member, 'teacher_profile', None)
+            new_rows.append(Payroll(
+                teacher=member,
+                month=month,
+                year=year,
+                basic_salary=getattr(profile, 'monthly_salary', None) or DEFAULT_BASIC_SALARY,
+                bonuses=0,
+                deductions=0,
+                status='draft',
+                department=department or ('Teaching' if member.role == 'teacher' else 'Administration'),
+                salary_grade=salary_grade or None,
+                due_date=due_date or None,
+            ))
+
+    Payroll.objects.bulk_create(new_rows, batch_size=1000, ignore_conflicts=True)
+    # Ids are generated client-side; rows another run created first are simply absent.
+    inserted = set(Payroll.objects.filter(
+        id__in=[row.id for row in new_rows]
+    ).values_list('id', flat=True)) if new_rows else set()
+    created = [row for row in new_rows if row.id in inserted]
+
+    now = timezone.now()
+    PayrollAuditLog.objects.bulk_create([
+        audit_entry(row, user, 'payroll_generation', None, now)
+        for row in created
+    ], batch_size=1000)
+
+    created_per_month = {}
+    for row in created:
+        created_per_month[row.month] = created_per_month.get(row.month, 0) + 1
+    periods = [{
+        'month': month,
+        'year': year,
+        'closed': month in closed,
+        'created': created_per_month.get(month, 0),
+        'skipped': 0 if month in closed else len(staff) - created_per_month.get(month, 0),
+    } for month in months]
+    return {
+        'created': len(created),
+        'skipped': sum(period['skipped'] for period in periods),
+        'closed_months': sorted(closed),
+        'periods': periods,
+    }
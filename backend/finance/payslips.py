@@ -0,0 +1,209 @@
+"""
+Payslip PDFs.
+
+A payslip is rendered with reportlab once per version of its payroll row and
+kept in media storage; `payslip_file` re-renders only when the row's
+updated_at has moved past the stored payslip_version. A month batch is split
+by finance.tasks into chunks of `stale_payroll_ids` that workers render in
+parallel with `render_payslips`; `bundle_month` then puts every payslip of the
+month into one ZIP in storage.
+"""
+import calendar
+import io
+import zipfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import Payroll
+
+
+SCHOOL_NAME = 'Anyi Primary School'
+
+EARNINGS = [
+    ('Basic Salary', 'basic_salary'),
+    ('Housing Allowance', 'housing_allowance'),
+    ('Transport Allowance', 'transport_allowance'),
+    ('Meal Allowance', 'meal_allowance'),
+    ('Responsibility Allowance', 'responsibility_allowance'),
+    ('Overtime', 'overtime'),
+    ('Bonuses', 'bonuses'),
+]
+
+DEDUCTIONS = [
+    ('Tax (PAYE)', 'tax'),
+    ('Pension', 'pension'),
+    ('Loans', 'loans'),
+    ('Other Deductions', 'other_deductions'),
+    ('Deductions', 'deductions'),
+    ('Leave Adjustment', 'leave_adjustment'),
+    ('Attendance Adjustment', 'attendance_adjustment'),
+]
+
+
+def payslip_path(payroll):
+    return f'payslips/{payroll.year}/{payroll.month:02d}/{payroll.id}.pdf'
+
+
+def month_zip_path(year, month):
+    return f'payslips/{year}/{month:02d}/payslips-{year}-{month:02d}.zip'
+
+
+def payslip_data(payroll):
+    """Plain, picklable payslip contents, so rendering can run in another process."""
+    teacher = payroll.teacher
+    profile = getattr(teacher, 'teacher_profile', None)
+    return {
+        'school': SCHOOL_NAME,
+        'period': f'{calendar.month_name[payroll.month]} {payroll.year}',
+        'staff_name': teacher.full_name,
+        'staff_id': getattr(profile, 'staff_id', None) or teacher.username,
+        'department': payroll.department or ('Teaching' if teacher.role == 'teacher' else 'Administration'),
+        'salary_grade': payroll.salary_grade or '-',
+        'status': payroll.get_status_display(),
+        'payment_date': str(payroll.payment_date) if payroll.payment_date else '-',
+        'payment_reference': payroll.payment_reference or '-',
+        'earnings': [(label, str(getattr(payroll, field))) for label, field in EARNINGS if getattr(payroll, field)],
+        'deductions': [(label, str(getattr(payroll, field))) for label, field in DEDUCTIONS if getattr(payroll, field)],
+        'gross': str(payroll.gross_salary),
+        'total_deductions': str(payroll.total_deductions),
+        'net': str(payroll.net_salary),
+    }
+
+
+def _money(value):
+    # The base fonts have no naira sign.
+    return f'NGN {float(value):,.2f}'
+
+
+def render_payslip(data):
+    """Render payslip_data() output to PDF bytes."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"Payslip - {data['staff_name']} - {data['period']}",
+    )
+    styles = getSampleStyleSheet()
+    grid = TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8eef7')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ])
+
+    details = Table([
+        ['Staff', data['staff_name'], 'Staff ID', data['staff_id']],
+        ['Department', data['department'], 'Grade', data['salary_grade']],
+        ['Status', data['status'], 'Paid on', data['payment_date']],
+        ['Reference', data['payment_reference'], '', ''],
+    ], colWidths=[28 * mm, 60 * mm, 25 * mm, 60 * mm])
+    details.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+    ]))
+
+    earnings = Table(
+        [['Earnings', 'Amount']] + [[label, _money(value)] for label, value in data['earnings']]
+        + [['Gross Salary', _money(data['gross'])]],
+        colWidths=[120 * mm, 53 * mm],
+    )
+    earnings.setStyle(grid)
+    deductions = Table(
+        [['Deductions', 'Amount']] + [[label, _money(value)] for label, value in data['deductions']]
+        + [['Total Deductions', _money(data['total_deductions'])]],
+        colWidths=[120 * mm, 53 * mm],
+    )
+    deductions.setStyle(grid)
+    net = Table([['Net Pay', _money(data['net'])]], colWidths=[120 * mm, 53 * mm])
+    net.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('LINEABOVE', (0, 0), (-1, 0), 1, colors.black),
+    ]))
+
+    doc.build([
+        Paragraph(data['school'], styles['Title']),
+        Paragraph(f"Payslip for {data['period']}", styles['Heading2']),
+        Spacer(1, 6 * mm), details,
+        Spacer(1, 6 * mm), earnings,
+        Spacer(1, 4 * mm), deductions,
+        Spacer(1, 6 * mm), net,
+    ])
+    return buffer.getvalue()
+
+
+def is_current(payroll):
+    return bool(
+        payroll.payslip_file
+        and payroll.payslip_version == payroll.updated_at
+        and default_storage.exists(payroll.payslip_file.name)
+    )
+
+
+def store_payslip(payroll, pdf):
+    """Write a rendered payslip over any previous one and record the version it matches."""
+    name = payslip_path(payroll)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    name = default_storage.save(name, ContentFile(pdf))
+    # update() leaves updated_at alone, so the stored version keeps matching the row.
+    Payroll.objects.filter(id=payroll.id, updated_at=payroll.updated_at).update(
+        payslip_file=name, payslip_version=payroll.updated_at
+    )
+    payroll.payslip_file.name = name
+    payroll.payslip_version = payroll.updated_at
+    return name
+
+
+def payslip_file(payroll):
+    """Storage name of an up-to-date payslip PDF for `payroll`, rendering it if needed."""
+    if not is_current(payroll):
+        store_payslip(payroll, render_payslip(payslip_data(payroll)))
+    return payroll.payslip_file.name
+
+
+def stale_payroll_ids(year, month):
+    """Ids of the month's payroll rows whose stored payslip is missing or out of date."""
+    payrolls = Payroll.objects.filter(year=year, month=month).only(
+        'id', 'payslip_file', 'payslip_version', 'updated_at'
+    ).order_by('id')
+    return [str(payroll.id) for payroll in payrolls if not is_current(payroll)]
+
+
+def render_payslips(payroll_ids):
+    """Render and store the payslips of `payroll_ids` that are still stale; returns how many were rendered."""
+    rendered = 0
+    for payroll in Payroll.objects.filter(id__in=payroll_ids).select_related('teacher__teacher_profile'):
+        if not is_current(payroll):
+            store_payslip(payroll, render_payslip(payslip_data(payroll)))
+            rendered += 1
+    return rendered
+
+
+def bundle_month(year, month):
+    """ZIP every payslip of a month (rendering any that went stale meanwhile); returns the ZIP's storage name."""
+    payrolls = (
+        Payroll.objects.filter(year=year, month=month)
+        .select_related('teacher__teacher_profile')
+        .order_by('teacher__last_name', 'teacher__first_name')
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for payroll in payrolls:
+            profile = getattr(payroll.teacher, 'teacher_profile', None)
+            staff_id = getattr(profile, 'staff_id', None) or payroll.teacher.username
+            with default_storage.open(payslip_file(payroll), 'rb') as fh:
+                archive.writestr(f'{staff_id}-{payroll.teacher.last_name}-{year}-{month:02d}.pdf', fh.read())
+
+    name = month_zip_path(year, month)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
@@ -0,0 +1,121 @@
+"""
+Paystack integration: webhook signatures, transaction verification and the
+crediting step shared by the manual verify endpoint and the webhook task.
+"""
+import hashlib
+import hmac
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .gateway import get_client
+from .payments import post_payment
+
+
+class PaystackError(Exception):
+    """Paystack answered, but the transaction cannot be credited."""
+
+
+def sign(body, secret=None):
+    """HMAC-SHA512 of the raw request body, as sent in X-Paystack-Signature."""
+    secret = secret if secret is not None else settings.PAYSTACK_SECRET_KEY
+    return hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+
+
+def valid_signature(body, signature):
+    if not settings.PAYSTACK_SECRET_KEY or not signature:
+        return False
+    return hmac.compare_digest(sign(body), signature)
+
+
+def _data(response, default_message):
+    if response.status_code == 200 and response.data.get('status') is True:
+        return response.data.get('data') or {}
+    raise PaystackError(response.data.get('message', default_message))
+
+
+def initialize_transaction(payload):
+    """Start a transaction and return Paystack's data (authorization_url, reference, ...)."""
+    response = get_client().request('POST', '/transaction/initialize', json=payload)
+    return _data(response, 'Failed to initialize Paystack transaction.')
+
+
+def verify_transaction(reference):
+    """
+    Ask Paystack for the transaction behind `reference` and return its data.
+    An unreachable or failing gateway raises GatewayError so callers can retry.
+    """
+    response = get_client().request('GET', f'/transaction/verify/{reference}')
+    return _data(response, 'Failed to verify transaction with Paystack.')
+
+
+ainitialize_transaction = sync_to_async(initialize_transaction, thread_sensitive=False)
+averify_transaction = sync_to_async(verify_transaction, thread_sensitive=False)
+
+
+def credit_transaction(data, student_fee_id=None, idempotency_key=None, requested_by=None):
+    """
+    Credit a verified Paystack transaction (the `data` object of a verify
+    response or charge.success event) to its StudentFee. Returns (payment, created).
+    """
+    if data.get('status') != 'success':
+        raise PaystackError(f"Transaction verification failed: status is {data.get('status')}")
+
+    reference = data.get('reference')
+    if not reference:
+        raise PaystackError('Transaction reference is missing.')
+    fee_id = (data.get('metadata') or {}).get('student_fee_id') or student_fee_id
+    if not fee_id:
+        raise PaystackError('Student fee information missing in transaction metadata.')
+    try:
+        amount = Decimal(str(data.get('amount'))) / 100
+    except (InvalidOperation, TypeError):
+        raise PaystackError('Transaction amount is missing.')
+
+    # Money has already left the payer, so an overpayment is credited rather than refused.
+    payment, created = post_payment(
+        fee_id, amount, 'online',
+        transaction_id=reference,
+        idempotency_key=idempotency_key,
+        requested_by=requested_by,
+        allow_overpayment=True,
+    )
+    if created:
+        notify_online_payment(payment)
+    return payment, created
+
+
+def notify_online_payment(payment):
+    try:
+        from accounts.models import Notification
+        student_fee = payment.student_fee
+        student = student_fee.student
+        fee_name = student_fee.fee_type.name
+        parent = student.student_profile.parent if hasattr(student, 'student_profile') else None
+
+        msg = f"A payment of ₦{payment.amount:,.2f} has been verified for {student.full_name}'s {fee_name} via online gateway. New status: {student_fee.get_status_display()}."
+        notifications = [
+            Notification(
+                sender=None,
+                recipient=student,
+                title="Fee Payment Recorded",
+                message=f"Online payment of ₦{payment.amount:,.2f} was successfully recorded for your {fee_name}.",
+                category='finance',
+                audience='selected'
+            )
+        ]
+        if parent:
+            notifications.append(
+                Notification(
+                    sender=None,
+                    recipient=parent,
+                    title="Online Payment Verified",
+                    message=msg,
+                    category='finance',
+                    audience='selected'
+                )
+            )
+        Notification.objects.bulk_create(notifications)
+    except Exception as e:
+        print(f"Error sending online payment notification: {e}")
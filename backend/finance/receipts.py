@@ -0,0 +1,162 @@
+"""
+Payment receipt PDFs.
+
+Every posted PaymentRecord gets one numbered receipt. post_payment queues
+`issue_receipt` on a worker once the payment commits, so the payment request
+never waits on reportlab. `issue_receipt` locks the payment row and returns
+the stored file if it already exists, so a receipt is rendered once however
+many times the task runs. Numbers come from a per-year ReceiptSequence row and
+have no gaps.
+"""
+import io
+import zipfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import PaymentRecord, ReceiptSequence
+from .payslips import SCHOOL_NAME, _money
+
+
+def receipt_path(payment):
+    return f'receipts/{payment.date.year}/{payment.id}.pdf'
+
+
+def next_receipt_number(year):
+    with transaction.atomic():
+        sequence, _ = ReceiptSequence.objects.select_for_update().get_or_create(year=year)
+        sequence.last_number += 1
+        sequence.save(update_fields=['last_number'])
+    return f'RCT-{year}-{sequence.last_number:06d}'
+
+
+def receipt_data(payment):
+    fee = payment.student_fee
+    student = fee.student
+    profile = getattr(student, 'student_profile', None)
+    parent = getattr(profile, 'parent', None)
+    paid_to_date = PaymentRecord.objects.filter(
+        student_fee=fee, date__lte=payment.date
+    ).aggregate(total=Sum('amount'))['total'] or payment.amount
+    return {
+        'school': SCHOOL_NAME,
+        'receipt_number': payment.receipt_number,
+        'date': payment.date.strftime('%d %B %Y, %H:%M'),
+        'pupil': student.full_name,
+        'admission_number': getattr(profile, 'admission_number', None) or '-',
+        'class_name': getattr(getattr(profile, 'current_class', None), 'name', None) or '-',
+        'parent': parent.full_name if parent else '-',
+        'fee_type': fee.fee_type.name,
+        'term': str(fee.term),
+        'method': payment.get_payment_method_display(),
+        'reference': payment.transaction_id or '-',
+        'received_by': payment.received_by.full_name if payment.received_by else '-',
+        'amount': str(payment.amount),
+        'fee_amount': str(fee.fee_type.amount),
+        'paid_to_date': str(paid_to_date),
+        'balance': str(max(fee.fee_type.amount - paid_to_date, 0)),
+    }
+
+
+def render_receipt(data):
+    """Render receipt_data() output to PDF bytes."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A5
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A5, leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm,
+        title=f"Receipt {data['receipt_number']}",
+    )
+    styles = getSampleStyleSheet()
+    details = Table([
+        ['Receipt No.', data['receipt_number']],
+        ['Date', data['date']],
+        ['Pupil', data['pupil']],
+        ['Admission No.', data['admission_number']],
+        ['Class', data['class_name']],
+        ['Parent', data['parent']],
+        ['Fee', data['fee_type']],
+        ['Term', data['term']],
+        ['Method', data['method']],
+        ['Reference', data['reference']],
+        ['Received by', data['received_by']],
+    ], colWidths=[32 * mm, 92 * mm])
+    details.setStyle(TableStyle([('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold')]))
+
+    amounts = Table([
+        ['Amount Paid', _money(data['amount'])],
+        ['Fee Amount', _money(data['fee_amount'])],
+        ['Paid to Date', _money(data['paid_to_date'])],
+        ['Balance', _money(data['balance'])],
+    ], colWidths=[72 * mm, 52 * mm])
+    amounts.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ]))
+
+    doc.build([
+        Paragraph(data['school'], styles['Title']),
+        Paragraph('Payment Receipt', styles['Heading2']),
+        Spacer(1, 4 * mm), details,
+        Spacer(1, 6 * mm), amounts,
+    ])
+    return buffer.getvalue()
+
+
+def _locked_payment(payment_id):
+    return PaymentRecord.objects.select_for_update(of=('self',)).select_related(
+        'student_fee__student__student_profile__parent',
+        'student_fee__student__student_profile__current_class',
+        'student_fee__fee_type', 'student_fee__term__academic_year', 'received_by',
+    ).get(id=payment_id)
+
+
+def _is_issued(payment):
+    return bool(payment.receipt_file and default_storage.exists(payment.receipt_file.name))
+
+
+def issue_receipt(payment_id):
+    """Number and render the receipt for a payment, once. Returns (storage name, receipt number)."""
+    # The number is committed on its own so the year's sequence row is not held during rendering.
+    with transaction.atomic():
+        payment = _locked_payment(payment_id)
+        if not payment.receipt_number:
+            payment.receipt_number = next_receipt_number(payment.date.year)
+            PaymentRecord.objects.filter(id=payment.id).update(receipt_number=payment.receipt_number)
+
+    with transaction.atomic():
+        payment = _locked_payment(payment_id)
+        if _is_issued(payment):
+            return payment.receipt_file.name, payment.receipt_number
+        pdf = render_receipt(receipt_data(payment))
+        name = receipt_path(payment)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        name = default_storage.save(name, ContentFile(pdf))
+        PaymentRecord.objects.filter(id=payment.id).update(receipt_file=name)
+    return name, payment.receipt_number
+
+
+def receipt_file(payment):
+    """Storage name of the payment's receipt, issuing it now if the task has not run yet."""
+    if not _is_issued(payment):
+        name, payment.receipt_number = issue_receipt(payment.id)
+        payment.receipt_file.name = name
+    return payment.receipt_file.name
+
+
+def receipts_zip(payments):
+    """One ZIP of the receipts of `payments`, issuing any that are missing."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for payment in payments:
+            with default_storage.open(receipt_file(payment), 'rb') as fh:
+                archive.writestr(f'{payment.receipt_number}.pdf', fh.read())
+    return buffer.getvalue()
@@ -0,0 +1,131 @@
+"""
+Fee reconciliation.
+
+StudentFee.amount_paid and status are running totals kept next to the
+PaymentRecord ledger. `reconcile_fees` walks every fee in id order, a chunk at
+a time (keyset pagination, so no chunk gets slower and nothing holds the
+whole table), compares each fee with the sum of its payments in the same
+query, and records every mismatch as a FeeDiscrepancy. With `repair` the
+mismatched fees of a chunk are locked, re-checked and corrected in one short
+transaction, and the rollups of the terms they belong to are recounted at
+the end; nothing else runs inside a transaction.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FeeDiscrepancy, FeeReconciliationRun, PaymentRecord, StudentFee
+from .payments import fee_status
+from .rollups import rebuild_rollups
+from .statements import forget_student_statements
+
+
+RECONCILE_CHUNK_SIZE = 2000
+
+
+def _ledger_total():
+    return Coalesce(
+        Subquery(
+            PaymentRecord.objects.filter(student_fee=OuterRef('pk')).order_by()
+            .values('student_fee').annotate(total=Sum('amount')).values('total')
+        ),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def _chunks(chunk_size):
+    fees = StudentFee.objects.order_by('id').annotate(ledger=_ledger_total()).values(
+        'id', 'amount_paid', 'status', 'ledger', 'fee_type__amount'
+    )
+    last_id = None
+    while True:
+        page = fees if last_id is None else fees.filter(id__gt=last_id)
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def _mismatches(run, rows):
+    found = []
+    for row in rows:
+        expected = fee_status(row['ledger'], row['fee_type__amount'])
+        if row['amount_paid'] != row['ledger'] or row['status'] != expected:
+            found.append(FeeDiscrepancy(
+                run=run,
+                student_fee_id=row['id'],
+                recorded_amount_paid=row['amount_paid'],
+                ledger_amount_paid=row['ledger'],
+                recorded_status=row['status'],
+                expected_status=expected,
+            ))
+    return found
+
+
+@transaction.atomic
+def _repair(discrepancies):
+    """Correct the chunk's mismatched fees under a row lock; returns the ids of their terms."""
+    fee_ids = [d.student_fee_id for d in discrepancies]
+    fees = StudentFee.objects.select_for_update(of=('self',)).select_related('fee_type').in_bulk(fee_ids)
+    # Summed only once the locks are held: a statement that locks and sums at once
+    # would keep the ledger it read before waiting and miss a payment committed meanwhile.
+    ledgers = dict(
+        PaymentRecord.objects.filter(student_fee_id__in=list(fees)).order_by()
+        .values('student_fee_id').annotate(total=Sum('amount')).values_list('student_fee_id', 'total')
+    )
+    terms, students = set(), set()
+    for discrepancy in discrepancies:
+        fee = fees.get(discrepancy.student_fee_id)
+        if fee is None:
+            continue
+        # Work from the locked row, not the chunk: it may have been fixed or paid since.
+        ledger = ledgers.get(fee.id, Decimal('0.00'))
+        expected = fee_status(ledger, fee.fee_type.amount)
+        if fee.amount_paid == ledger and fee.status == expected:
+            continue
+        fee.amount_paid = ledger
+        fee.status = expected
+        fee.save(update_fields=['amount_paid', 'status'])
+        discrepancy.repaired = True
+        terms.add(fee.term_id)
+        students.add(fee.student_id)
+    transaction.on_commit(lambda: forget_student_statements(students))
+    return terms
+
+
+def reconcile_fees(repair=False, chunk_size=RECONCILE_CHUNK_SIZE):
+    """Compare every fee with its payment ledger; returns the FeeReconciliationRun."""
+    run = FeeReconciliationRun.objects.create(repair=repair)
+    repaired_terms = set()
+    try:
+        for rows in _chunks(chunk_size):
+            discrepancies = _mismatches(run, rows)
+            if discrepancies and repair:
+                repaired_terms |= _repair(discrepancies)
+                run.repaired_count += sum(1 for d in discrepancies if d.repaired)
+            FeeDiscrepancy.objects.bulk_create(discrepancies)
+            run.fees_checked += len(rows)
+            run.discrepancy_count += len(discrepancies)
+            FeeReconciliationRun.objects.filter(id=run.id).update(
+                fees_checked=run.fees_checked,
+                discrepancy_count=run.discrepancy_count,
+                repaired_count=run.repaired_count,
+            )
+        if repaired_terms:
+            # Drift may or may not have reached the rollups, so recount the affected terms.
+            rebuild_rollups(repaired_terms)
+    except Exception as e:
+        run.status, run.error = 'failed', str(e)
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+
+    run.status = 'completed'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+    return run
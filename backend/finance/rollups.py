@@ -0,0 +1,149 @@
+"""
+Maintenance of FeeLedgerRollup and FeeCollectionRollup.
+
+Payments and newly billed fees adjust their bucket in place with F()
+expressions; bulk fee generation and fee-type price changes rebuild the
+affected terms with one GROUP BY per table. A fee is bucketed under the class
+the pupil was enrolled in during the fee's term (the latest one if they moved
+mid-term), so moving a pupil later does not shift past terms.
+
+Adjustments hold a shared advisory lock on their term and rebuilds an
+exclusive one, so a rebuild waits for in-flight payments to commit before it
+aggregates, and payments arriving during a rebuild wait for it to finish.
+"""
+import zlib
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import FeeCollectionRollup, FeeLedgerRollup, PaymentRecord, StudentFee
+
+
+# First key of the two-key advisory locks taken on a term's rollups.
+ROLLUP_LOCK_NAMESPACE = 0x526f6c6c  # 'Roll'
+
+
+def _lock_terms(term_ids, shared=False):
+    """Take the transaction-scoped rollup lock of each term, in a fixed order."""
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    keys = sorted({zlib.crc32(str(term_id).encode()) - 2 ** 31 for term_id in term_ids})
+    with connection.cursor() as cursor:
+        for key in keys:
+            cursor.execute(f'SELECT {function}(%s, %s)', [ROLLUP_LOCK_NAMESPACE, key])
+
+
+def _enrolled_class(student, term):
+    """Subquery of the class `student` was in during `term` (OuterRef paths of the outer query)."""
+    from academics.models import ClassEnrollment
+    return Subquery(
+        ClassEnrollment.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=OuterRef(f'{term}__start_date')),
+            student_id=OuterRef(student),
+            academic_year_id=OuterRef(f'{term}__academic_year_id'),
+            start_date__lte=OuterRef(f'{term}__end_date'),
+        ).order_by('-start_date').values('school_class_id')[:1]
+    )
+
+
+def _bucket(student_fee):
+    from academics.models import ClassEnrollment
+    return {
+        'term_id': student_fee.term_id,
+        'level_id': student_fee.fee_type.level_id,
+        'school_class_id': ClassEnrollment.objects.for_term(student_fee.term).filter(
+            student_id=student_fee.student_id
+        ).order_by('-start_date').values_list('school_class_id', flat=True).first(),
+        'fee_type_id': student_fee.fee_type_id,
+    }
+
+
+def _bump(model, bucket, **amounts):
+    """Add `amounts` to the rollup row of `bucket`, creating it if needed."""
+    increments = {name: F(name) + value for name, value in amounts.items()}
+    with transaction.atomic():
+        _lock_terms([bucket['term_id']], shared=True)
+        updated = model.objects.filter(**bucket).update(**increments)
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                model.objects.create(**amounts, **bucket)
+        except IntegrityError:
+            # Another request created the bucket first.
+            model.objects.filter(**bucket).update(**increments)
+
+
+def adjust_rollup(student_fee, billed=Decimal('0'), paid=Decimal('0')):
+    """Add `billed` / `paid` (either may be negative) to the fee's bucket."""
+    _bump(FeeLedgerRollup, _bucket(student_fee), billed=Decimal(str(billed)), paid=Decimal(str(paid)))
+
+
+def record_collection(payment):
+    """Count a newly posted payment in its day's collection bucket."""
+    bucket = {
+        **_bucket(payment.student_fee),
+        'day': timezone.localdate(payment.date),
+        'payment_method': payment.payment_method,
+    }
+    _bump(FeeCollectionRollup, bucket, amount=Decimal(str(payment.amount)), payments=1)
+
+
+@transaction.atomic
+def rebuild_rollups(term_ids=None):
+    """Recompute the rollups of the given terms (all terms when None) from StudentFee and PaymentRecord."""
+    from academics.models import Term
+    _lock_terms(Term.objects.values_list('id', flat=True) if term_ids is None else term_ids)
+
+    fees = StudentFee.objects.all()
+    payments = PaymentRecord.objects.all()
+    rollups = FeeLedgerRollup.objects.all()
+    collections = FeeCollectionRollup.objects.all()
+    if term_ids is not None:
+        term_ids = list(term_ids)
+        fees = fees.filter(term_id__in=term_ids)
+        payments = payments.filter(student_fee__term_id__in=term_ids)
+        rollups = rollups.filter(term_id__in=term_ids)
+        collections = collections.filter(term_id__in=term_ids)
+
+    totals = fees.order_by().annotate(enrolled_class=_enrolled_class('student_id', 'term')).values(
+        'term_id', 'fee_type_id', 'fee_type__level_id', 'enrolled_class'
+    ).annotate(billed=Sum('fee_type__amount'), paid=Sum('amount_paid'))
+    # TruncDate uses the current time zone, as record_collection's localdate does.
+    daily = payments.order_by().annotate(
+        enrolled_class=_enrolled_class('student_fee__student_id', 'student_fee__term'),
+    ).values(
+        'payment_method',
+        'student_fee__term_id', 'student_fee__fee_type_id', 'student_fee__fee_type__level_id', 'enrolled_class',
+        day=TruncDate('date'),
+    ).annotate(amount=Sum('amount'), count=Count('id'))
+
+    rollups.delete()
+    FeeLedgerRollup.objects.bulk_create([
+        FeeLedgerRollup(
+            term_id=row['term_id'],
+            level_id=row['fee_type__level_id'],
+            school_class_id=row['enrolled_class'],
+            fee_type_id=row['fee_type_id'],
+            billed=row['billed'] or 0,
+            paid=row['paid'] or 0,
+        )
+        for row in totals
+    ], batch_size=500)
+
+    collections.delete()
+    FeeCollectionRollup.objects.bulk_create([
+        FeeCollectionRollup(
+            day=row['day'],
+            term_id=row['student_fee__term_id'],
+            level_id=row['student_fee__fee_type__level_id'],
+            school_class_id=row['enrolled_class'],
+            fee_type_id=row['student_fee__fee_type_id'],
+            payment_method=row['payment_method'],
+            amount=row['amount'] or 0,
+            payments=row['count'],
+        )
+        for row in daily
+    ], batch_size=500)
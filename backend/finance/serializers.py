@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import FeeType, StudentFee, PaymentRecord, Payroll, PayrollAuditLog
+from .models import FeeType, StudentFee, PaymentRecord, Payroll, PayrollAuditLog, PayrollPeriodSummary
 from accounts.serializers import UserSerializer
 
 class FeeTypeSerializer(serializers.ModelSerializer):
@@ -26,7 +26,10 @@ class PaymentRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PaymentRecord
-        fields = '__all__'
+        exclude = ('receipt_file',)
+        read_only_fields = ['received_by', 'idempotency_key']
+        # A repeated reference is answered idempotently by the view, not rejected.
+        extra_kwargs = {'transaction_id': {'validators': []}}
 
 class PayrollSerializer(serializers.ModelSerializer):
     teacher_name = serializers.CharField(source='teacher.full_name', read_only=True)
@@ -57,16 +60,26 @@ class PayrollSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Payroll
-        fields = '__all__'
+        # Payslip files are served through the payslip_pdf action, not exposed as media URLs.
+        exclude = ('payslip_file', 'payslip_version')
 
 
 class PayrollAuditLogSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.full_name', read_only=True, allow_null=True)
+    # The old and new sides of `changes`, in the shape clients already read.
+    previous_value = serializers.SerializerMethodField()
+    updated_value = serializers.SerializerMethodField()
 
     class Meta:
         model = PayrollAuditLog
         fields = '__all__'
 
+    def get_previous_value(self, obj):
+        return {name: old for name, (old, _new) in obj.changes.items()} or None
+
+    def get_updated_value(self, obj):
+        return {name: new for name, (_old, new) in obj.changes.items()} or None
+
 
 class PayrollDetailSerializer(PayrollSerializer):
     """Extended payroll serializer including nested audit logs — used for payslip detail views."""
@@ -98,3 +111,11 @@ class PayrollDetailSerializer(PayrollSerializer):
 
     class Meta(PayrollSerializer.Meta):
         pass
+
+
+class PayrollPeriodSummarySerializer(serializers.ModelSerializer):
+    closed_by_name = serializers.CharField(source='closed_by.full_name', read_only=True, allow_null=True)
+
+    class Meta:
+        model = PayrollPeriodSummary
+        fields = '__all__'
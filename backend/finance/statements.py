@@ -0,0 +1,204 @@
+"""
+Parent fee statements.
+
+A statement covers every child of a parent and every term they were billed
+for. It is built from two queries: one GROUP BY over the children's fees for
+the per-term billed/paid/balance totals, and one over their payments. The
+result (and its PDF) is cached per parent; posting a payment or billing new
+fees for one of the parent's children drops the cached copy.
+"""
+import io
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import PaymentRecord, StudentFee
+from .payslips import SCHOOL_NAME, _money
+
+
+STATEMENT_CACHE_KEY = 'finance:statement:{parent_id}'
+STATEMENT_PDF_CACHE_KEY = 'finance:statement-pdf:{parent_id}'
+STATEMENT_CACHE_TTL = 60 * 60 * 24
+
+
+def _payments(parent_id):
+    """Payments of the parent's children, keyed by (student id, term id), oldest first."""
+    grouped = {}
+    rows = PaymentRecord.objects.filter(
+        student_fee__student__student_profile__parent_id=parent_id
+    ).order_by('date').values(
+        'id', 'date', 'amount', 'payment_method', 'transaction_id', 'receipt_number',
+        'student_fee__student_id', 'student_fee__term_id', 'student_fee__fee_type__name',
+    )
+    for row in rows:
+        grouped.setdefault((row['student_fee__student_id'], row['student_fee__term_id']), []).append({
+            'id': str(row['id']),
+            'date': row['date'],
+            'amount': row['amount'],
+            'method': row['payment_method'],
+            'reference': row['transaction_id'],
+            'receipt_number': row['receipt_number'],
+            'fee_type': row['student_fee__fee_type__name'],
+        })
+    return grouped
+
+
+def build_statement(parent):
+    """Per child and per term billed, paid and balance totals with the payments behind them."""
+    zero = Decimal('0.00')
+    terms = StudentFee.objects.filter(
+        student__student_profile__parent=parent
+    ).with_balance().order_by().values(
+        'student_id', 'student__first_name', 'student__last_name',
+        'student__student_profile__admission_number', 'student__student_profile__current_class__name',
+        'term_id', 'term__name', 'term__academic_year__name', 'term__start_date',
+    ).annotate(
+        billed=Sum('fee_type__amount', default=zero),
+        paid=Sum('amount_paid', default=zero),
+        balance=Sum('balance_due', default=zero),
+        fees=Count('id'),
+    ).order_by('student__first_name', 'student__last_name', 'student_id', 'term__start_date')
+    payments = _payments(parent.id)
+
+    children = {}
+    for row in terms:
+        child = children.setdefault(row['student_id'], {
+            'student_id': str(row['student_id']),
+            'name': f"{row['student__first_name']} {row['student__last_name']}",
+            'admission_number': row['student__student_profile__admission_number'],
+            'class_name': row['student__student_profile__current_class__name'] or 'Unassigned',
+            'terms': [],
+            'billed': zero, 'paid': zero, 'balance': zero,
+        })
+        child['terms'].append({
+            'term_id': str(row['term_id']),
+            'term': row['term__name'],
+            'academic_year': row['term__academic_year__name'],
+            'fees': row['fees'],
+            'billed': row['billed'],
+            'paid': row['paid'],
+            'balance': row['balance'],
+            'payments': payments.get((row['student_id'], row['term_id']), []),
+        })
+        for key in ('billed', 'paid', 'balance'):
+            child[key] += row[key]
+
+    children = list(children.values())
+    return {
+        'school': SCHOOL_NAME,
+        'parent': {'id': str(parent.id), 'name': parent.full_name, 'email': parent.email},
+        'children': children,
+        'billed': sum((child['billed'] for child in children), zero),
+        'paid': sum((child['paid'] for child in children), zero),
+        'balance': sum((child['balance'] for child in children), zero),
+        'generated_at': timezone.now(),
+    }
+
+
+def _cached(key, build):
+    try:
+        value = cache.get(key)
+        if value is not None:
+            return value
+    except Exception as e:
+        print(f"Error reading cached fee statement: {e}")
+    value = build()
+    try:
+        cache.set(key, value, STATEMENT_CACHE_TTL)
+    except Exception as e:
+        print(f"Error caching fee statement: {e}")
+    return value
+
+
+def parent_statement(parent):
+    return _cached(STATEMENT_CACHE_KEY.format(parent_id=parent.id), lambda: build_statement(parent))
+
+
+def statement_pdf(parent):
+    return _cached(
+        STATEMENT_PDF_CACHE_KEY.format(parent_id=parent.id), lambda: render_statement(parent_statement(parent))
+    )
+
+
+def forget_statements(parent_ids):
+    """Drop the cached statements of these parents (None ids are skipped)."""
+    keys = []
+    for parent_id in {p for p in parent_ids if p}:
+        keys += [STATEMENT_CACHE_KEY.format(parent_id=parent_id), STATEMENT_PDF_CACHE_KEY.format(parent_id=parent_id)]
+    if not keys:
+        return
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        print(f"Error clearing cached fee statements: {e}")
+
+
+def forget_student_statements(student_ids):
+    from accounts.models import StudentProfile
+    forget_statements(
+        StudentProfile.objects.filter(user_id__in=list(student_ids)).values_list('parent_id', flat=True)
+    )
+
+
+def render_statement(data):
+    """Render a parent statement to PDF bytes."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"Fee Statement - {data['parent']['name']}",
+    )
+    styles = getSampleStyleSheet()
+    grid = TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8eef7')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ])
+
+    story = [
+        Paragraph(data['school'], styles['Title']),
+        Paragraph(f"Fee Statement for {data['parent']['name']}", styles['Heading2']),
+        Paragraph(f"Generated {data['generated_at']:%d %B %Y, %H:%M}", styles['Normal']),
+    ]
+    for child in data['children']:
+        story += [
+            Spacer(1, 6 * mm),
+            Paragraph(f"{child['name']} ({child['admission_number'] or '-'}, {child['class_name']})", styles['Heading3']),
+        ]
+        rows = [['Term', 'Billed', 'Paid', 'Balance']]
+        for term in child['terms']:
+            rows.append([
+                f"{term['term']} {term['academic_year']}",
+                _money(term['billed']), _money(term['paid']), _money(term['balance']),
+            ])
+            for payment in term['payments']:
+                rows.append([
+                    f"    {payment['date']:%d %b %Y} {payment['fee_type']} ({payment['receipt_number'] or payment['method']})",
+                    '', _money(payment['amount']), '',
+                ])
+        rows.append(['Total', _money(child['billed']), _money(child['paid']), _money(child['balance'])])
+        table = Table(rows, colWidths=[82 * mm, 30 * mm, 30 * mm, 30 * mm])
+        table.setStyle(grid)
+        story.append(table)
+
+    summary = Table([
+        ['Total Billed', _money(data['billed'])],
+        ['Total Paid', _money(data['paid'])],
+        ['Balance Due', _money(data['balance'])],
+    ], colWidths=[120 * mm, 52 * mm])
+    summary.setStyle(TableStyle([
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('LINEABOVE', (0, 0), (-1, 0), 1, colors.black),
+    ]))
+    story += [Spacer(1, 8 * mm), summary]
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,189 @@
+import random
+import uuid
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .billing import generate_fees
+from .gateway import GatewayError
+from .models import PaystackEvent
+from .payments import PaymentError
+from .payroll import bulk_approve_payrolls, bulk_pay_payrolls
+from .payslips import bundle_month, render_payslips, stale_payroll_ids
+from .receipts import issue_receipt
+from .reconciliation import reconcile_fees
+from .paystack import PaystackError, credit_transaction, verify_transaction
+
+
+@shared_task(bind=True, max_retries=5)
+def process_paystack_event(self, event_id):
+    """Verify and credit a stored Paystack webhook event. Safe to run more than once."""
+    event = PaystackEvent.objects.filter(id=event_id).first()
+    if not event or event.status in ('processed', 'ignored'):
+        return None
+
+    if event.event != 'charge.success':
+        PaystackEvent.objects.filter(id=event.id).update(status='ignored', processed_at=timezone.now())
+        return None
+
+    data = event.payload.get('data') or {}
+    try:
+        if settings.PAYSTACK_WEBHOOK_REVERIFY:
+            # Trust Paystack's verify API over the event body for the amount and status.
+            verified = verify_transaction(event.reference)
+            verified.setdefault('metadata', data.get('metadata'))
+            data = verified
+        payment, created = credit_transaction(data)
+    except (PaystackError, PaymentError) as e:
+        PaystackEvent.objects.filter(id=event.id).update(
+            status='failed', error=str(e), attempts=event.attempts + 1, processed_at=timezone.now()
+        )
+        return None
+    except (GatewayError, OperationalError) as e:
+        PaystackEvent.objects.filter(id=event.id).update(error=str(e), attempts=event.attempts + 1)
+        # Exponential backoff with jitter so a Paystack outage does not get a synchronized retry storm.
+        countdown = 2 ** self.request.retries * 30 + random.uniform(0, 15)
+        raise self.retry(exc=e, countdown=countdown)
+
+    PaystackEvent.objects.filter(id=event.id).update(
+        status='processed', payment=payment, error='', attempts=event.attempts + 1, processed_at=timezone.now()
+    )
+    return str(payment.id)
+
+
+def queue_paystack_event(event_id):
+    """Hand a stored webhook event to a worker once it has been committed."""
+    def dispatch():
+        try:
+            process_paystack_event.delay(str(event_id))
+        except Exception as e:
+            print(f"Error queueing Paystack event {event_id}: {e}")
+    transaction.on_commit(dispatch)
+
+
+@shared_task
+def generate_fees_task(**kwargs):
+    """Celery entry point for billing.generate_fees on large schools."""
+    return generate_fees(**kwargs)
+
+
+def progress_reporter(task):
+    """
+    A progress(done, total) callback that records PROGRESS state for `task`, or
+    None when there is no result to update: run eagerly or without an id,
+    update_state would write to the result backend (and fail without Redis).
+    """
+    if not task.request.id or task.request.is_eager:
+        return None
+
+    def progress(done, total):
+        task.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+    return progress
+
+
+@shared_task(bind=True)
+def bulk_payroll_task(self, operation, ids, user_id=None, payment_method='bank_transfer'):
+    """Run a bulk pay/approve on a worker, reporting progress as task state."""
+    from accounts.models import User
+    user = User.objects.filter(id=user_id).first() if user_id else None
+    progress = progress_reporter(self)
+
+    if operation == 'pay':
+        return bulk_pay_payrolls(ids, payment_method, user, progress)
+    return bulk_approve_payrolls(ids, user, progress)
+
+
+def queue_bulk_payroll(operation, ids, user_id, payment_method='bank_transfer'):
+    """Queue bulk_payroll_task after commit; returns the task id to poll for progress."""
+    task_id = str(uuid.uuid4())
+
+    def dispatch():
+        try:
+            bulk_payroll_task.apply_async(
+                args=[operation, [str(i) for i in ids], str(user_id)],
+                kwargs={'payment_method': payment_method},
+                task_id=task_id,
+            )
+        except Exception as e:
+            print(f"Error queueing bulk payroll {operation}: {e}")
+    transaction.on_commit(dispatch)
+    return task_id
+
+
+@shared_task
+def render_payslip_chunk_task(payroll_ids):
+    """Render one chunk of a month's payslips; a header task of render_payslips_task's chord."""
+    return render_payslips(payroll_ids)
+
+
+@shared_task
+def bundle_payslips_task(rendered, year, month):
+    """Chord callback: bundle the month's payslips into one ZIP once every chunk has rendered."""
+    return {'file': bundle_month(year, month), 'year': year, 'month': month, 'rendered': sum(rendered)}
+
+
+@shared_task(bind=True)
+def render_payslips_task(self, year, month):
+    """
+    Render a month's payslips and bundle them into one ZIP in media storage.
+    The stale payslips are split into PAYSLIP_RENDER_CHUNK_SIZE chunks that the
+    workers render in parallel (a chord); the task is replaced by that chord,
+    so its callback, which builds the ZIP, reports under this task's id.
+    """
+    ids = stale_payroll_ids(year, month)
+    size = settings.PAYSLIP_RENDER_CHUNK_SIZE
+    chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+    if not chunks:
+        return bundle_payslips_task([], year, month)
+    return self.replace(chord(
+        [render_payslip_chunk_task.s(chunk) for chunk in chunks],
+        bundle_payslips_task.s(year, month),
+    ))
+
+
+def queue_payslip_batch(year, month):
+    """Queue render_payslips_task after commit; returns the task id to poll."""
+    task_id = str(uuid.uuid4())
+
+    def dispatch():
+        try:
+            render_payslips_task.apply_async(args=[year, month], task_id=task_id)
+        except Exception as e:
+            print(f"Error queueing payslip batch for {month}/{year}: {e}")
+    transaction.on_commit(dispatch)
+    return task_id
+
+
+@shared_task(bind=True, max_retries=3)
+def issue_receipt_task(self, payment_id):
+    """Render a payment's receipt; a receipt that already exists is left alone."""
+    try:
+        return issue_receipt(payment_id)[1]
+    except OperationalError as e:
+        raise self.retry(exc=e, countdown=10 * 2 ** self.request.retries)
+
+
+def queue_receipt(payment_id):
+    """Queue the receipt for a payment once the payment has been committed."""
+    def dispatch():
+        try:
+            issue_receipt_task.delay(str(payment_id))
+        except Exception as e:
+            print(f"Error queueing receipt for payment {payment_id}: {e}")
+    transaction.on_commit(dispatch)
+
+
+@shared_task
+def reconcile_fees_task(repair=None):
+    """Nightly check of StudentFee.amount_paid/status against the payment ledger."""
+    if repair is None:
+        repair = settings.FEE_RECONCILIATION_REPAIR
+    run = reconcile_fees(repair=repair)
+    return {
+        'run': str(run.id),
+        'fees_checked': run.fees_checked,
+        'discrepancies': run.discrepancy_count,
+        'repaired': run.repaired_count,
+    }
@@ -3,17 +3,25 @@ Finance App — Unit Tests
 Covers: FeeType, StudentFee, PaymentRecord, Payroll, Paystack mock flow.
 """
 
+import json
 from decimal import Decimal
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from rest_framework.test import APITestCase
+import asyncio
+import requests
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from unittest.mock import patch
 
 from academics.models import AcademicYear, Term, ClassLevel, SchoolClass
 from accounts.models import StudentProfile
-from finance.models import FeeType, StudentFee, PaymentRecord, Payroll, PayrollAuditLog
+from finance.models import FeeType, StudentFee, PaymentRecord, PaystackEvent, Payroll, PayrollAuditLog, FeeLedgerRollup
+from finance.payments import post_payment
+from finance.gateway import CircuitBreaker, CircuitOpen, FakeTransport, GatewayError, PaystackClient, set_client
+from finance.paystack import sign
+from finance.tasks import process_paystack_event
 
 User = get_user_model()
 
@@ -110,6 +118,15 @@ class FinanceTestBase(APITestCase):
             amount_paid=Decimal("0.00"),
         )
 
+    def use_temp_media(self):
+        import shutil
+        import tempfile
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root, PAYSLIP_RENDER_CHUNK_SIZE=2)
+        media.enable()
+        self.addCleanup(media.disable)
+
 
 # ────────────────────────────────────────────────────────────
 #   FeeType CRUD tests
@@ -215,6 +232,287 @@ class StudentFeeTests(FinanceTestBase):
         })
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertIn("assigned", resp.data.get("message", "").lower())
+        self.assertEqual((resp.data["created"], resp.data["skipped"]), (1, 1))
+
+    def add_pupils(self, count, level=None):
+        school_class, tag = self.school_class, 1
+        if level is not None:
+            school_class = SchoolClass.objects.create(name=level.name, level=level, academic_year=self.year)
+            tag = level.numeric_level
+        for i in range(count):
+            pupil = User.objects.create_user(
+                email=f"bulk{tag}-{i}@test.com", username=f"bulk_{tag}_{i}",
+                first_name="Bulk", last_name=str(i), role="student", password="pass",
+            )
+            StudentProfile.objects.create(
+                user=pupil, admission_number=f"ADM-BULK-{tag}-{i}",
+                current_class=school_class, parent=self.parent,
+            )
+
+    def test_fee_generation_counts_are_exact_and_query_count_is_flat(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from finance.billing import generate_fees
+
+        self.add_pupils(3)
+        with CaptureQueriesContext(connection) as small:
+            result = generate_fees(self.term.id, fee_type_ids=[self.fee_type.id])
+        self.assertEqual(result, {"created": 3, "skipped": 1})
+
+        other_level = ClassLevel.objects.create(name="Primary 2", numeric_level=2)
+        FeeType.objects.create(name="Tuition P2", amount=Decimal("60000.00"), level=other_level)
+        self.add_pupils(30, level=other_level)
+        with CaptureQueriesContext(connection) as large:
+            result = generate_fees(self.term.id, notify="term")
+        self.assertEqual(result, {"created": 30, "skipped": 4})
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(StudentFee.objects.filter(term=self.term).count(), 34)
+        self.assertEqual(
+            FeeLedgerRollup.objects.get(term=self.term, level=other_level).billed, Decimal("1800000.00")
+        )
+
+    @override_settings(FEE_GENERATION_ASYNC_THRESHOLD=0)
+    def test_bulk_assign_is_queued_for_large_schools(self):
+        url = reverse("studentfee-bulk-assign")
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            resp = self.client.post(url, {"fee_type": str(self.fee_type.id), "term": str(self.term.id)})
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(resp.data["queued"])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_summary_reads_rollup_and_matches_aggregate(self):
+        from finance.models import FeeLedgerRollup
+        from finance.rollups import rebuild_rollups
+
+        rebuild_rollups()
+        self.client.force_authenticate(user=self.admin)
+        self.client.post(
+            reverse("studentfee-record-payment", kwargs={"pk": self.student_fee.id}),
+            {"amount": "12345.67", "payment_method": "cash"},
+        )
+        rollup = FeeLedgerRollup.objects.get(term=self.term, school_class=self.school_class)
+        self.assertEqual((rollup.billed, rollup.paid), (Decimal("50000.00"), Decimal("12345.67")))
+
+        url = reverse("studentfee-summary")
+        with self.assertNumQueries(1):
+            staff = self.client.get(url, {"term": str(self.term.id)})
+        self.assertEqual(staff.data["total_paid"], Decimal("12345.67"))
+        self.assertEqual(staff.data["total_outstanding"], Decimal("37654.33"))
+        self.assertEqual(staff.data["collection_rate"], Decimal("24.7"))
+
+        self.client.force_authenticate(user=self.parent)
+        with self.assertNumQueries(1):
+            parent = self.client.get(url)
+        for key in ("total_billed", "total_paid", "total_outstanding", "collection_rate"):
+            self.assertEqual(parent.data[key], staff.data[key])
+
+    def test_rollups_keep_the_class_of_the_term_and_new_fees_adjust_in_place(self):
+        from finance.rollups import rebuild_rollups
+
+        rebuild_rollups()
+        self.client.force_authenticate(user=self.admin)
+        bus = FeeType.objects.create(name="Bus", amount=Decimal("8000.00"), level=self.level)
+        with patch("finance.views.rebuild_rollups") as rebuild:
+            resp = self.client.post(reverse("studentfee-list"), {
+                "student": str(self.student.id), "fee_type": str(bus.id), "term": str(self.term.id),
+            })
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        rebuild.assert_not_called()
+        self.assertEqual(FeeLedgerRollup.objects.get(fee_type=bus).billed, Decimal("8000.00"))
+
+        # Moving the pupil after the term leaves the term's fees with the class they were in.
+        self.student_profile.current_class = SchoolClass.objects.create(
+            name="Primary 1B", level=self.level, academic_year=self.year
+        )
+        self.student_profile.save()
+        post_payment(self.student_fee.id, "5000", "cash")
+        rebuild_rollups([self.term.id])
+        self.assertEqual(
+            set(FeeLedgerRollup.objects.filter(term=self.term).values_list("school_class", flat=True)),
+            {self.school_class.id},
+        )
+        self.assertEqual(FeeLedgerRollup.objects.get(fee_type=self.fee_type).paid, Decimal("5000.00"))
+
+    def test_collections_analytics_slices_rollups(self):
+        from finance.analytics import collected_on
+        from finance.models import FeeCollectionRollup
+        from finance.rollups import rebuild_rollups
+
+        rebuild_rollups()
+        bus = FeeType.objects.create(name="Bus Fee", amount=Decimal("10000.00"), level=self.level)
+        bus_fee = StudentFee.objects.create(student=self.student, fee_type=bus, term=self.term)
+        rebuild_rollups([self.term.id])
+        post_payment(self.student_fee.id, "20000", "cash")
+        post_payment(self.student_fee.id, "5000", "card")
+        post_payment(bus_fee.id, "10000", "cash")
+        self.assertEqual(collected_on(timezone.localdate()), Decimal("35000.00"))
+
+        url = reverse("studentfee-collections")
+        self.client.force_authenticate(user=self.parent)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(2):
+            resp = self.client.get(url, {"group_by": "fee_type", "term": str(self.term.id)})
+        self.assertEqual(
+            [(r["fee_type_name"], r["billed"], r["collected"], r["outstanding"], r["collection_rate"]) for r in resp.data["rows"]],
+            [("Bus Fee", Decimal("10000.00"), Decimal("10000.00"), Decimal("0.00"), Decimal("100.0")),
+             ("Tuition Fee", Decimal("50000.00"), Decimal("25000.00"), Decimal("25000.00"), Decimal("50.0"))],
+        )
+        self.assertEqual(resp.data["totals"]["collection_rate"], Decimal("58.3"))
+        self.assertEqual(resp.data["series"]["days"][-1]["collected"], Decimal("35000.00"))
+        self.assertEqual(len(resp.data["series"]["days"]), 30)
+
+        resp = self.client.get(url, {"group_by": "fee_type,method"})
+        self.assertEqual(
+            [(r["fee_type_name"], r["method"], r["collected"], r["collection_rate"]) for r in resp.data["rows"]],
+            [("Bus Fee", "cash", Decimal("10000.00"), Decimal("100.0")),
+             ("Tuition Fee", "card", Decimal("5000.00"), Decimal("10.0")),
+             ("Tuition Fee", "cash", Decimal("20000.00"), Decimal("40.0"))],
+        )
+        self.assertEqual(resp.data["series"]["days"][-1]["methods"], {"cash": Decimal("30000.00"), "card": Decimal("5000.00")})
+        totals = self.client.get(url, {"method": "cash", "class": str(self.school_class.id)}).data["totals"]
+        self.assertEqual((totals["billed"], totals["collected"], totals["outstanding"]),
+                         (Decimal("60000.00"), Decimal("30000.00"), None))
+        self.assertEqual(self.client.get(url, {"group_by": "colour"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"from": "2026-01-01", "to": "2027-06-01"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # The incremental buckets match a rebuild from the ledger.
+        incremental = sorted(FeeCollectionRollup.objects.values_list("day", "fee_type_id", "payment_method", "amount", "payments"))
+        rebuild_rollups()
+        self.assertEqual(sorted(FeeCollectionRollup.objects.values_list("day", "fee_type_id", "payment_method", "amount", "payments")), incremental)
+
+    def test_parent_statement_groups_children_and_terms_and_is_cached(self):
+        from finance.statements import STATEMENT_CACHE_KEY, STATEMENT_PDF_CACHE_KEY, forget_statements
+
+        forget_statements([self.parent.id])
+        self.addCleanup(forget_statements, [self.parent.id])
+        earlier = Term.objects.create(academic_year=self.year, name="2nd Term", start_date="2026-01-05", end_date="2026-04-02")
+        self.add_pupils(1)
+        sibling = User.objects.get(username="bulk_1_0")
+        old_fee = StudentFee.objects.create(student=sibling, fee_type=self.fee_type, term=earlier)
+        post_payment(old_fee.id, "30000", "cash")
+        post_payment(old_fee.id, "20000", "transfer")
+        post_payment(self.student_fee.id, "15000", "cash")
+        StudentFee.objects.create(student=sibling, fee_type=self.fee_type, term=self.term)
+
+        url = reverse("studentfee-statement")
+        self.client.force_authenticate(user=self.parent)
+        with self.assertNumQueries(2):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data["billed"], resp.data["paid"], resp.data["balance"]),
+                         (Decimal("150000.00"), Decimal("65000.00"), Decimal("85000.00")))
+        bulk, student = resp.data["children"]
+        self.assertEqual([(t["term"], t["balance"], len(t["payments"])) for t in bulk["terms"]],
+                         [("2nd Term", Decimal("0.00"), 2), ("3rd Term", Decimal("50000.00"), 0)])
+        self.assertEqual((student["name"], student["paid"]), ("Student User", Decimal("15000.00")))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, resp.data)
+        resp = self.client.get(url, {"export": "pdf"})
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"%PDF"))
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.post(self.list_url, {
+            "student": str(self.student.id), "fee_type": str(self.fee_type.id), "term": str(earlier.id),
+        })
+        from django.core.cache import cache
+        self.assertIsNone(cache.get(STATEMENT_CACHE_KEY.format(parent_id=self.parent.id)))
+        self.assertIsNone(cache.get(STATEMENT_PDF_CACHE_KEY.format(parent_id=self.parent.id)))
+        resp = self.client.get(url, {"parent": str(self.parent.id)})
+        self.assertEqual(resp.data["billed"], Decimal("200000.00"))
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_statements_are_dropped_when_fee_types_or_parents_change(self):
+        from django.core.cache import cache
+        from finance.statements import STATEMENT_CACHE_KEY, forget_statements, parent_statement
+
+        other_parent = User.objects.create_user(
+            email="parent2@test.com", username="parent2", first_name="Other", last_name="Parent",
+            role="parent", password="securepassword123",
+        )
+        keys = [STATEMENT_CACHE_KEY.format(parent_id=parent.id) for parent in (self.parent, other_parent)]
+        self.addCleanup(forget_statements, [self.parent.id, other_parent.id])
+        parent_statement(self.parent)
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.patch(
+            reverse("feetype-detail", kwargs={"pk": self.fee_type.id}), {"amount": "60000.00"}
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertEqual(parent_statement(self.parent)["billed"], Decimal("60000.00"))
+
+        parent_statement(other_parent)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student_profile.parent = other_parent
+            self.student_profile.save()
+        self.assertEqual(cache.get_many(keys), {})
+        self.assertEqual(parent_statement(other_parent)["billed"], Decimal("60000.00"))
+        self.assertEqual(parent_statement(self.parent)["billed"], Decimal("0.00"))
+
+        self.client.delete(reverse("feetype-detail", kwargs={"pk": self.fee_type.id}))
+        self.assertIsNone(cache.get(keys[1]))
+
+    def test_fee_list_does_not_query_per_row(self):
+        self.add_pupils(5)
+        for pupil in User.objects.filter(username__startswith="bulk_1_"):
+            StudentFee.objects.create(student=pupil, fee_type=self.fee_type, term=self.term)
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(2):
+            resp = self.client.get(self.list_url)
+        self.assertEqual(resp.data["results"][0]["class_name"], "Primary 1")
+
+    def test_defaulters_are_sorted_by_debt_and_bucketed_by_age(self):
+        from django.core.cache import cache
+        from finance.defaulters import TOP_DEFAULTERS_CACHE_KEY, top_defaulters
+
+        second = Term.objects.create(academic_year=self.year, name="2nd Term", start_date="2026-01-05", end_date="2026-04-02")
+        first = Term.objects.create(academic_year=self.year, name="1st Term", start_date="2025-09-01", end_date="2025-12-15")
+        StudentFee.objects.create(student=self.student, fee_type=self.fee_type, term=second, amount_paid=Decimal("20000.00"))
+        StudentFee.objects.create(student=self.student, fee_type=self.fee_type, term=first, amount_paid=Decimal("45000.00"))
+        self.add_pupils(2)
+        small, settled = User.objects.filter(username__startswith="bulk_1_").order_by("username")
+        StudentFee.objects.create(student=small, fee_type=self.fee_type, term=self.term, amount_paid=Decimal("40000.00"))
+        StudentFee.objects.create(
+            student=settled, fee_type=self.fee_type, term=self.term, status="paid", amount_paid=Decimal("50000.00")
+        )
+
+        url = reverse("studentfee-defaulters")
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(4):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 2)
+        top, bottom = resp.data["results"]
+        self.assertEqual((top["pupil_id"], top["fees"]), (self.student.id, 3))
+        self.assertEqual(
+            (top["total_owed"], top["this_term"], top["last_term"], top["older"]),
+            (Decimal("85000.00"), Decimal("50000.00"), Decimal("30000.00"), Decimal("5000.00")),
+        )
+        self.assertEqual((bottom["pupil_id"], bottom["total_owed"]), (small.id, Decimal("10000.00")))
+
+        resp = self.client.get(url, {"min_owed": "20000"})
+        self.assertEqual(resp.data["count"], 1)
+        resp = self.client.get(url, {"group": "parent"})
+        self.assertEqual(resp.data["count"], 1)
+        self.assertEqual(
+            (resp.data["results"][0]["pupils"], resp.data["results"][0]["total_owed"]), (2, Decimal("95000.00"))
+        )
+
+        cache.delete(TOP_DEFAULTERS_CACHE_KEY.format(limit=10))
+        dashboard = top_defaulters(10)
+        self.assertEqual(
+            [(row["name"], row["fee_type"], row["balance"]) for row in dashboard],
+            [("Student User", "3 fees", 85000.0), ("Bulk 0", "Tuition Fee", 10000.0)],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(top_defaulters(10), dashboard)
 
 
 # ────────────────────────────────────────────────────────────
@@ -266,6 +564,177 @@ class PaymentRecordTests(FinanceTestBase):
         resp = self.client.post(self.record_url, {"amount": "0"})
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_retried_request_with_same_idempotency_key_posts_once(self):
+        self.client.force_authenticate(user=self.admin)
+        for _ in range(3):
+            resp = self.client.post(
+                self.record_url, {"amount": "1000", "payment_method": "cash"},
+                HTTP_IDEMPOTENCY_KEY="till-7-receipt-0042",
+            )
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.student_fee.refresh_from_db()
+        self.assertEqual(self.student_fee.amount_paid, Decimal("1000.00"))
+        self.assertEqual(PaymentRecord.objects.filter(student_fee=self.student_fee).count(), 1)
+
+    def test_reused_reference_for_another_fee_or_amount_conflicts(self):
+        bus_fee = StudentFee.objects.create(
+            student=self.student, fee_type=FeeType.objects.create(name="Bus", amount=Decimal("8000.00"), level=self.level),
+            term=self.term,
+        )
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.post(self.record_url, {"amount": "1000", "transaction_id": "TRF-0042"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        other_url = reverse("studentfee-record-payment", kwargs={"pk": bus_fee.id})
+        resp = self.client.post(other_url, {"amount": "1000", "transaction_id": "TRF-0042"})
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        resp = self.client.post(self.record_url, {"amount": "2000", "transaction_id": "TRF-0042"})
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        bus_fee.refresh_from_db()
+        self.assertEqual(bus_fee.amount_paid, Decimal("0.00"))
+        self.assertEqual(PaymentRecord.objects.count(), 1)
+
+    def test_idempotency_keys_are_scoped_per_user(self):
+        bursar = User.objects.create_user(
+            email="bursar@test.com", username="bursar", first_name="Bursar", last_name="User",
+            role="admin", password="securepassword123",
+        )
+        for user in (self.admin, bursar):
+            self.client.force_authenticate(user=user)
+            resp = self.client.post(
+                self.record_url, {"amount": "1000", "payment_method": "cash"}, HTTP_IDEMPOTENCY_KEY="receipt-1",
+            )
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertNotIn("already", resp.data["message"])
+        self.student_fee.refresh_from_db()
+        self.assertEqual(self.student_fee.amount_paid, Decimal("2000.00"))
+
+    def test_payment_ledger_is_append_only(self):
+        payment = PaymentRecord.objects.create(
+            student_fee=self.student_fee, amount=Decimal("100"), payment_method="cash"
+        )
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("paymentrecord-detail", kwargs={"pk": payment.id})
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.patch(url, {"amount": "1"}).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_receipts_are_queued_after_commit_and_rendered_once(self):
+        import io
+        import zipfile
+        from finance import receipts
+
+        self.use_temp_media()
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            resp = self.client.post(self.record_url, {"amount": "20000", "payment_method": "cash"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 2)
+        payment = PaymentRecord.objects.get(id=resp.data["payment_id"])
+        self.assertIsNone(payment.receipt_number)
+
+        with patch("finance.receipts.render_receipt", wraps=receipts.render_receipt) as render:
+            first = receipts.issue_receipt(payment.id)
+            second = receipts.issue_receipt(payment.id)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], f"RCT-{payment.date.year}-000001")
+
+        url = reverse("paymentrecord-receipt", kwargs={"pk": payment.id})
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.parent)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"%PDF"))
+
+        post_payment(self.student_fee.id, "5000", "transfer")
+        resp = self.client.get(reverse("paymentrecord-term-receipts"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        with zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content))) as archive:
+            self.assertEqual(
+                archive.namelist(),
+                [f"RCT-{payment.date.year}-000001.pdf", f"RCT-{payment.date.year}-000002.pdf"],
+            )
+
+    def test_reconciliation_reports_drift_and_repairs_it(self):
+        from finance.models import FeeDiscrepancy
+        from finance.reconciliation import reconcile_fees
+        from finance.rollups import rebuild_rollups
+
+        post_payment(self.student_fee.id, "20000", "cash")
+        second = StudentFee.objects.create(
+            student=self.student, fee_type=FeeType.objects.create(name="Bus", amount=Decimal("8000.00"), level=self.level),
+            term=self.term,
+        )
+        post_payment(second.id, "8000", "cash")
+        rebuild_rollups()
+        StudentFee.objects.filter(id=self.student_fee.id).update(amount_paid=Decimal("25000.00"))
+        StudentFee.objects.filter(id=second.id).update(status="partial")
+
+        run = reconcile_fees(chunk_size=1)
+        self.assertEqual((run.status, run.fees_checked, run.discrepancy_count, run.repaired_count), ("completed", 2, 2, 0))
+        drift = FeeDiscrepancy.objects.get(run=run, student_fee=self.student_fee)
+        self.assertEqual((drift.difference, drift.expected_status), (Decimal("5000.00"), "partial"))
+        self.student_fee.refresh_from_db()
+        self.assertEqual(self.student_fee.amount_paid, Decimal("25000.00"))
+
+        run = reconcile_fees(repair=True)
+        self.assertEqual((run.discrepancy_count, run.repaired_count), (2, 2))
+        self.student_fee.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((self.student_fee.amount_paid, second.status), (Decimal("20000.00"), "paid"))
+        self.assertEqual(sum(FeeLedgerRollup.objects.filter(term=self.term).values_list("paid", flat=True)), Decimal("28000.00"))
+        self.assertEqual(reconcile_fees().discrepancy_count, 0)
+
+
+class ConcurrentPaymentTests(APITransactionTestCase):
+    """Real threads and connections, so row locks and unique constraints are exercised."""
+
+    def setUp(self):
+        year = AcademicYear.objects.create(
+            name="2025/2026", start_date="2025-09-01", end_date="2026-07-31", is_current=True
+        )
+        term = Term.objects.create(
+            academic_year=year, name="3rd Term", start_date="2026-04-20", end_date="2026-07-25", is_current=True
+        )
+        level = ClassLevel.objects.create(name="Primary 1", numeric_level=1)
+        student = User.objects.create_user(
+            email="student@test.com", username="student_fin", first_name="Student",
+            last_name="User", role="student", password="pass1234",
+        )
+        StudentProfile.objects.create(user=student, admission_number="ADM2026FIN001")
+        fee_type = FeeType.objects.create(name="Tuition Fee", amount=Decimal("50000.00"), level=level)
+        self.student_fee = StudentFee.objects.create(student=student, fee_type=fee_type, term=term)
+
+    def _hammer(self, calls):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connection
+
+        def run(kwargs):
+            try:
+                return post_payment(self.student_fee.id, payment_method="cash", **kwargs)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            return list(pool.map(run, calls))
+
+    def test_concurrent_payments_do_not_lose_updates(self):
+        self._hammer([{"amount": "250.00"} for _ in range(40)])
+
+        self.student_fee.refresh_from_db()
+        self.assertEqual(self.student_fee.amount_paid, Decimal("10000.00"))
+        self.assertEqual(self.student_fee.status, "partial")
+        self.assertEqual(PaymentRecord.objects.filter(student_fee=self.student_fee).count(), 40)
+        self.assertEqual(FeeLedgerRollup.objects.get().paid, Decimal("10000.00"))
+
+    def test_concurrent_retries_of_one_reference_post_once(self):
+        results = self._hammer([{"amount": "5000.00", "transaction_id": "PSTK-abc"} for _ in range(16)])
+
+        self.assertEqual(sum(1 for _, created in results if created), 1)
+        self.assertEqual(len({payment.id for payment, _ in results}), 1)
+        self.student_fee.refresh_from_db()
+        self.assertEqual(self.student_fee.amount_paid, Decimal("5000.00"))
+
 
 # ────────────────────────────────────────────────────────────
 #   Paystack mock payment flow tests
@@ -340,6 +809,168 @@ class PaystackMockTests(FinanceTestBase):
         self.assertIn("already verified", resp.data.get("message", "").lower())
 
 
+@override_settings(PAYSTACK_SECRET_KEY="sk_test_webhook", PAYSTACK_WEBHOOK_REVERIFY=False)
+class PaystackWebhookTests(FinanceTestBase):
+    """Signed webhook deliveries are stored, then credited by the Celery task."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("paystack-webhook")
+
+    def deliver(self, reference="PSK-ref-001", amount=5000000, signature=None):
+        body = json.dumps({
+            "event": "charge.success",
+            "data": {
+                "status": "success",
+                "reference": reference,
+                "amount": amount,
+                "metadata": {"student_fee_id": str(self.student_fee.id)},
+            },
+        }).encode()
+        with self.captureOnCommitCallbacks() as callbacks:
+            resp = self.client.post(
+                self.url, data=body, content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=signature or sign(body, "sk_test_webhook"),
+            )
+        return resp, callbacks
+
+    def test_rejects_bad_signature(self):
+        resp, callbacks = self.deliver(signature="not-a-signature")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(PaystackEvent.objects.exists())
+        self.assertEqual(callbacks, [])
+
+    def test_event_is_stored_then_credited_by_task(self):
+        resp, callbacks = self.deliver()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 1)
+        event = PaystackEvent.objects.get()
+        self.assertEqual(event.status, "received")
+        self.assertEqual(PaymentRecord.objects.count(), 0)
+
+        process_paystack_event.apply(args=[str(event.id)])
+        event.refresh_from_db()
+        self.student_fee.refresh_from_db()
+        self.assertEqual(event.status, "processed")
+        self.assertEqual(event.payment.transaction_id, "PSK-ref-001")
+        self.assertEqual(self.student_fee.amount_paid, Decimal("50000.00"))
+        self.assertEqual(self.student_fee.status, "paid")
+
+    def test_redelivered_event_credits_once(self):
+        self.deliver()
+        self.deliver()
+        for event in PaystackEvent.objects.all():
+            process_paystack_event.apply(args=[str(event.id)])
+        self.assertEqual(PaystackEvent.objects.filter(status="processed").count(), 2)
+        self.assertEqual(PaymentRecord.objects.count(), 1)
+        self.student_fee.refresh_from_db()
+        self.assertEqual(self.student_fee.amount_paid, Decimal("50000.00"))
+
+
+    def test_task_reverifies_through_gateway_client(self):
+        transport = FakeTransport()
+        transport.add("GET", "/transaction/verify/", (200, {
+            "status": True,
+            "data": {"status": "success", "reference": "PSK-ref-001", "amount": 2000000},
+        }))
+        previous = set_client(PaystackClient(transport=transport))
+        self.addCleanup(set_client, previous)
+
+        self.deliver(amount=5000000)
+        with self.settings(PAYSTACK_WEBHOOK_REVERIFY=True):
+            process_paystack_event.apply(args=[str(PaystackEvent.objects.get().id)])
+        self.assertEqual(transport.calls[0][:2], ("GET", "/transaction/verify/PSK-ref-001"))
+        self.student_fee.refresh_from_db()
+        # The verified amount wins over the amount in the event body.
+        self.assertEqual(self.student_fee.amount_paid, Decimal("20000.00"))
+
+
+class GatewayClientTests(SimpleTestCase):
+    """Retry, timeout and circuit-breaker behaviour of the pooled gateway client."""
+
+    def client_for(self, transport, **kwargs):
+        return PaystackClient(transport=transport, sleep=lambda seconds: None, **kwargs)
+
+    def test_get_is_retried_after_server_error(self):
+        answers = iter([(503, {}), (200, {"status": True, "data": {"ok": 1}})])
+        transport = FakeTransport({("GET", "/transaction/verify/ref"): lambda payload, path: next(answers)})
+        response = self.client_for(transport).request("GET", "/transaction/verify/ref")
+        self.assertEqual(response.data["data"], {"ok": 1})
+        self.assertEqual(len(transport.calls), 2)
+
+    def test_post_is_not_resent_after_read_timeout(self):
+        def timeout(payload, path):
+            raise requests.ReadTimeout()
+        transport = FakeTransport({("POST", "/transaction/initialize"): timeout})
+        with self.assertRaises(GatewayError):
+            self.client_for(transport).request("POST", "/transaction/initialize", json={})
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_circuit_opens_then_recovers(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+        healthy = [False]
+        transport = FakeTransport({("GET", "/bank"): lambda payload, path: (200, {}) if healthy[0] else (502, {})})
+        client = self.client_for(transport, retries=0, breaker=breaker)
+
+        for _ in range(2):
+            with self.assertRaises(GatewayError):
+                client.request("GET", "/bank")
+        with self.assertRaises(CircuitOpen):
+            client.request("GET", "/bank")
+        self.assertEqual(len(transport.calls), 2)
+
+        now[0] = 31
+        healthy[0] = True
+        self.assertEqual(client.request("GET", "/bank").status_code, 200)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_unexpected_error_in_trial_call_does_not_wedge_the_circuit(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 31
+
+        def broken(payload, path):
+            raise KeyError("bug in transport")
+        client = self.client_for(FakeTransport({("GET", "/bank"): broken}), retries=0, breaker=breaker)
+        with self.assertRaises(KeyError):
+            client.request("GET", "/bank")
+        self.assertEqual(breaker.state, "open")
+
+        now[0] = 62
+        self.assertTrue(breaker.allow())
+
+    def test_deadline_passed_before_first_attempt(self):
+        now = [0.0]
+
+        def clock():
+            now[0] += 5
+            return now[0]
+        transport = FakeTransport({("GET", "/bank"): (200, {})})
+        with self.assertRaisesMessage(GatewayError, "deadline passed"):
+            self.client_for(transport, deadline=3, clock=clock).request("GET", "/bank")
+        self.assertEqual(transport.calls, [])
+
+    def test_retries_stop_at_the_call_deadline(self):
+        now = [0.0]
+
+        def slow_timeout(payload, path):
+            now[0] += 5
+            raise requests.ReadTimeout()
+        transport = FakeTransport({("GET", "/bank"): slow_timeout})
+        client = self.client_for(transport, retries=5, deadline=12, clock=lambda: now[0])
+        with self.assertRaises(GatewayError):
+            client.request("GET", "/bank")
+        # Attempts start at 0s, 5s and 10s (with 2s left); none starts after the 12s deadline.
+        self.assertEqual(len(transport.calls), 3)
+
+    def test_async_request(self):
+        transport = FakeTransport({("GET", "/bank"): (200, {"status": True})})
+        response = asyncio.run(self.client_for(transport).arequest("GET", "/bank"))
+        self.assertTrue(response.data["status"])
+
+
 # ────────────────────────────────────────────────────────────
 #   Payroll calculation tests
 # ────────────────────────────────────────────────────────────
@@ -387,6 +1018,13 @@ class PayrollModelTests(FinanceTestBase):
         expected = Decimal("18000") + Decimal("12000")
         self.assertEqual(self.payroll.total_deductions, expected)
 
+    def test_generated_totals_follow_updates(self):
+        self.payroll.tax = Decimal("28000.00")
+        self.payroll.save()
+        self.assertEqual(self.payroll.total_deductions, Decimal("40000.00"))
+        self.assertEqual(self.payroll.net_salary, Decimal("130000.00"))
+        self.assertTrue(Payroll.objects.filter(net_salary=Decimal("130000.00")).exists())
+
 
 # ────────────────────────────────────────────────────────────
 #   Payroll API & status workflow tests
@@ -442,6 +1080,82 @@ class PayrollWorkflowTests(FinanceTestBase):
             PayrollAuditLog.objects.filter(payroll=self.payroll).exists()
         )
 
+    def test_audit_entries_store_diffs_and_rebuild_earlier_state(self):
+        from datetime import timedelta
+
+        self.client.force_authenticate(user=self.admin)
+        for bonus in ("5000", "7500", "9000"):
+            self.client.post(self.action_url("recalculate"), {"bonuses": bonus})
+        self.client.post(self.action_url("approve"))
+
+        logs = list(PayrollAuditLog.objects.filter(payroll=self.payroll).order_by("timestamp"))
+        self.assertEqual([log.changes for log in logs[:3]], [
+            {"bonuses": ["0.00", "5000.00"]},
+            {"bonuses": ["5000.00", "7500.00"]},
+            {"bonuses": ["7500.00", "9000.00"]},
+        ])
+        self.assertEqual(len(json.dumps(logs[2].changes)), len(json.dumps(logs[1].changes)))
+        self.assertEqual(set(logs[3].changes), {"status", "approved_by", "approved_at"})
+        self.assertEqual(logs[3].schema_version, 2)
+
+        resp = self.client.get(self.action_url("state"), {"at": logs[1].timestamp.isoformat()})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data["state"]["bonuses"], resp.data["state"]["status"]), ("7500.00", "draft"))
+        resp = self.client.get(self.action_url("state"), {"at": (logs[0].timestamp - timedelta(seconds=1)).isoformat()})
+        self.assertEqual((resp.data["state"]["bonuses"], resp.data["state"]["approved_by"]), ("0.00", None))
+        self.assertEqual(self.client.get(self.action_url("state"), {"at": "soon"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(self.action_url("audit-logs"))
+        recalculated = [entry for entry in resp.data["results"] if entry["action"] == "payroll_recalculated"]
+        self.assertEqual(recalculated[0]["updated_value"], {"bonuses": "9000.00"})
+
+    def test_audit_trail_filters_and_cursor_pages(self):
+        from datetime import datetime, time, timedelta
+
+        other = Payroll.objects.create(
+            teacher=self.teacher, month=8, year=2026, basic_salary=Decimal("100000.00"), status="draft",
+        )
+        day = timezone.localdate() - timedelta(days=40)
+        moment = timezone.make_aware(datetime.combine(day, time(10)))
+        # The last three share a timestamp, as the entries of one bulk action do.
+        for i in range(5):
+            PayrollAuditLog.objects.create(
+                payroll=self.payroll, user=self.admin, action="payroll_recalculated",
+                timestamp=moment + timedelta(minutes=min(i, 2)),
+            )
+        PayrollAuditLog.objects.create(payroll=other, user=self.teacher, action="payroll_approved")
+        url = reverse("payrollauditlog-list")
+
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        seen, page = [], self.client.get(url, {"user": str(self.admin.id), "page_size": 2})
+        while True:
+            self.assertEqual(page.status_code, status.HTTP_200_OK)
+            seen += [(entry["timestamp"], entry["id"]) for entry in page.data["results"]]
+            if not page.data["next"]:
+                break
+            page = self.client.get(page.data["next"])
+        self.assertEqual(len(set(seen)), 5)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        back = []
+        while page.data["previous"]:
+            page = self.client.get(page.data["previous"])
+            back = [(entry["timestamp"], entry["id"]) for entry in page.data["results"]] + back
+        self.assertEqual(back, seen[:4])
+        self.assertEqual(self.client.get(url, {"cursor": "not-a-cursor"}).status_code, status.HTTP_404_NOT_FOUND)
+
+        resp = self.client.get(url, {"action": "payroll_approved,payroll_paid", "year": 2026, "month": 8})
+        self.assertEqual([entry["payroll"] for entry in resp.data["results"]], [other.id])
+        resp = self.client.get(url, {"payroll": str(self.payroll.id), "until": (moment + timedelta(minutes=2)).isoformat()})
+        self.assertEqual(len(resp.data["results"]), 2)
+        # A date alone covers the whole day.
+        resp = self.client.get(url, {"payroll": str(self.payroll.id), "since": day.isoformat(), "until": day.isoformat()})
+        self.assertEqual(len(resp.data["results"]), 5)
+        self.assertEqual(self.client.get(url, {"since": "last week"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {"user": "someone"}).status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_generate_monthly_payroll(self):
         url = reverse("payroll-generate-monthly")
         self.client.force_authenticate(user=self.admin)
@@ -453,6 +1167,117 @@ class PayrollWorkflowTests(FinanceTestBase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertIn("message", resp.data)
 
+    def test_generate_whole_year_in_one_operation(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse("payroll-generate-monthly")
+        self.client.force_authenticate(user=self.admin)
+        with CaptureQueriesContext(connection) as two_months:
+            resp = self.client.post(url, {"months": [9, 10], "year": 2026}, format="json")
+        self.assertEqual((resp.data["created"], resp.data["skipped"]), (2, 0))
+
+        self.add_payrolls(5)
+        with CaptureQueriesContext(connection) as year:
+            resp = self.client.post(url, {"whole_year": True, "year": 2026}, format="json")
+        # 6 teachers x 12 months, less the rows that already exist.
+        self.assertEqual(resp.data["created"], 72 - 2 - 6)
+        self.assertEqual(resp.data["skipped"], 8)
+        self.assertEqual(len(year.captured_queries), len(two_months.captured_queries))
+        self.assertEqual(Payroll.objects.filter(year=2026).count(), 72)
+        self.assertEqual(PayrollAuditLog.objects.filter(action="payroll_generation").count(), 66)
+
+    def test_generate_monthly_reads_months_as_whole_numbers(self):
+        url = reverse("payroll-generate-monthly")
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.post(url, {"months": "12", "year": 2027}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.post(url, {"months": "10,11", "year": 2027})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(Payroll.objects.filter(year=2027).values_list("month", flat=True)), [10, 11, 12])
+        resp = self.client.post(url, {"months": ["9", "x"], "year": 2027}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_payslip_pdf_is_cached_until_row_changes(self):
+        from finance import payslips
+
+        self.use_temp_media()
+        url = reverse("payroll-payslip-pdf", kwargs={"pk": self.payroll.id})
+        self.client.force_authenticate(user=self.teacher)
+        with patch("finance.payslips.render_payslip", wraps=payslips.render_payslip) as render:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            self.assertTrue(b"".join(first.streaming_content).startswith(b"%PDF"))
+            self.client.get(url)
+            self.assertEqual(render.call_count, 1)
+
+            self.payroll.refresh_from_db()
+            self.payroll.bonuses = Decimal("5000.00")
+            self.payroll.save()
+            self.client.get(url)
+            self.assertEqual(render.call_count, 2)
+
+        other = Payroll.objects.create(teacher=self.admin, month=7, year=2026, basic_salary=Decimal("1"))
+        resp = self.client.get(reverse("payroll-payslip-pdf", kwargs={"pk": other.id}))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_month_payslips_bundle_into_one_zip(self):
+        import io
+        import zipfile
+        from finance.payslips import render_payslips
+        from finance.tasks import render_payslips_task
+
+        self.use_temp_media()
+        self.add_payrolls(3)
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            resp = self.client.post(reverse("payroll-payslip-batch"), {"month": 7, "year": 2026})
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(callbacks), 1)
+
+        with patch("finance.tasks.render_payslips", wraps=render_payslips) as render:
+            result = render_payslips_task.apply(args=[2026, 7]).get()
+        # Four stale payslips, two per chunk task, then one ZIP from the chord callback.
+        self.assertEqual([len(call.args[0]) for call in render.call_args_list], [2, 2])
+        self.assertEqual(result["rendered"], 4)
+        resp = self.client.get(reverse("payroll-payslip-batch"), {"month": 7, "year": 2026})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 4)
+        self.assertEqual(Payroll.objects.filter(month=7, year=2026, payslip_version__isnull=False).count(), 4)
+
+    def test_reports_stream_as_csv_and_xlsx_in_one_query(self):
+        import csv
+        import io
+        import zipfile
+        from accounts.models import TeacherProfile
+
+        TeacherProfile.objects.create(
+            user=self.teacher, staff_id="STF001", bank_name="First Bank",
+            account_number="0123456789", account_name="Teacher User",
+        )
+        self.add_payrolls(3)
+        Payroll.objects.update(status="approved")
+        self.client.force_authenticate(user=self.admin)
+        url = reverse("payroll-reports")
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, {"month": 7, "year": 2026, "type": "bank_schedule", "export": "csv"})
+            rows = list(csv.reader(io.StringIO(b"".join(resp.streaming_content).decode())))
+        self.assertEqual(rows[0], ["Account Number", "Account Name", "Bank", "Amount", "Narration", "Reference"])
+        self.assertEqual(len(rows), 5)
+        self.assertIn(["0123456789", "Teacher User", "First Bank", "75000.00", "Salary July 2026 - STF001",
+                       f"PAY-202607-{str(self.payroll.id)[:8].upper()}"], rows)
+
+        resp = self.client.get(url, {"month": 7, "year": 2026, "type": "salary_register", "export": "xlsx"})
+        workbook = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 5)
+        self.assertIn("STF001", sheet)
+
+        resp = self.client.get(url, {"month": 7, "year": 2026, "type": "monthly_summary", "export": "csv"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_teacher_can_view_own_salary(self):
         url = reverse("payroll-my-salary")
         self.client.force_authenticate(user=self.teacher)
@@ -465,3 +1290,140 @@ class PayrollWorkflowTests(FinanceTestBase):
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertIn("total_monthly_payroll", resp.data)
+
+    def test_close_period_freezes_month_and_serves_reports(self):
+        url = reverse("payroll-close-period")
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.post(url, {"month": 7, "year": 2026})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("not locked or paid", resp.data["error"])
+
+        Payroll.objects.filter(id=self.payroll.id).update(status="paid", department="Teaching")
+        resp = self.client.post(url, {"month": 7, "year": 2026})
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["status_counts"], {"paid": 1})
+        self.assertEqual(resp.data["departments"]["Teaching"]["net"], "75000.00")
+        self.assertEqual(self.client.post(url, {"month": 7, "year": 2026}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse("payroll-reports"), {"month": 7, "year": 2026})
+        self.assertTrue(resp.data["closed"])
+        self.assertEqual(resp.data["total_net_salary"], 75000.0)
+
+        resp = self.client.post(self.action_url("reverse"))
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.patch(reverse("payroll-detail", kwargs={"pk": self.payroll.id}), {"tax": "0"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        Payroll.objects.create(teacher=self.admin, month=8, year=2026, basic_salary=Decimal("90000.00"))
+        resp = self.client.get(reverse("payroll-periods"), {"year": 2026})
+        self.assertEqual([(p["month"], p["closed"]) for p in resp.data["periods"]], [(7, True), (8, False)])
+        self.assertEqual(resp.data["year_to_date"]["total_net"], Decimal("165000.00"))
+
+    def add_payrolls(self, count, tag="a"):
+        payrolls = []
+        for i in range(count):
+            member = User.objects.create_user(
+                email=f"staff{tag}{i}@test.com", username=f"staff_{tag}_{i}", first_name="Staff", last_name=str(i),
+                role="teacher", password="pass",
+            )
+            payrolls.append(Payroll.objects.create(
+                teacher=member, month=7, year=2026, basic_salary=Decimal("80000.00"),
+            ))
+        return payrolls
+
+    def test_calculate_deductions_previews_then_writes_the_month(self):
+        url = reverse("payroll-calculate-deductions")
+        Payroll.objects.create(
+            teacher=self.teacher, month=6, year=2026, basic_salary=Decimal("100000.00"),
+            tax=Decimal("15000.00"), pension=Decimal("10000.00"), status="paid",
+        )
+        staff = self.add_payrolls(2)
+        Payroll.objects.filter(id=staff[1].id).update(status="approved")
+
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.post(url, {"month": 7, "year": 2026}).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.post(url, {"month": 7, "year": 2026, "dry_run": True}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data["staff"], resp.data["changed"]), (2, 2))
+        row = next(r for r in resp.data["rows"] if r["payroll_id"] == str(self.payroll.id))
+        # Pension 8% of 100,000; PAYE on 1,104,000 a year after pension relief: 304,000 at 15%.
+        self.assertEqual((row["pension"], row["tax"], row["previous_tax"]), (Decimal("8000.00"), Decimal("3800.00"), Decimal("15000.00")))
+        self.assertEqual(row["net_variance"], Decimal("13200.00"))
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.tax, Decimal("15000.00"))
+
+        resp = self.client.post(url, {"month": 7, "year": 2026}, format="json")
+        self.assertEqual(resp.data["changed"], 2)
+        self.payroll.refresh_from_db()
+        staff[0].refresh_from_db()
+        staff[1].refresh_from_db()
+        self.assertEqual((self.payroll.tax, self.payroll.pension, self.payroll.net_salary),
+                         (Decimal("3800.00"), Decimal("8000.00"), Decimal("88200.00")))
+        self.assertEqual((staff[0].tax, staff[0].pension), (Decimal("1040.00"), Decimal("6400.00")))
+        self.assertEqual(staff[1].tax, Decimal("0.00"))
+        self.assertEqual(PayrollAuditLog.objects.filter(action="deductions_calculated").count(), 2)
+        self.assertEqual(self.client.post(url, {"month": 7, "year": 2026}, format="json").data["changed"], 0)
+
+    def test_bulk_pay_and_approve_are_set_based(self):
+        from accounts.models import Notification
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.force_authenticate(user=self.admin)
+        small = [str(p.id) for p in self.add_payrolls(2)]
+        with CaptureQueriesContext(connection) as few:
+            resp = self.client.post(reverse("payroll-bulk-approve"), {"ids": small}, format="json")
+        self.assertEqual(resp.data["approved_count"], 2)
+
+        large = [str(p.id) for p in Payroll.objects.exclude(id__in=small)] + [str(p.id) for p in self.add_payrolls(20, "b")]
+        with CaptureQueriesContext(connection) as many:
+            resp = self.client.post(reverse("payroll-bulk-approve"), {"ids": large}, format="json")
+        self.assertEqual(resp.data["approved_count"], 21)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+        resp = self.client.post(reverse("payroll-bulk-pay"), {"ids": small + large}, format="json")
+        self.assertEqual(resp.data["paid_count"], 23)
+        self.assertEqual(Payroll.objects.filter(status="paid", payment_reference__startswith="BULK-").count(), 23)
+        self.assertEqual(PayrollAuditLog.objects.filter(action="salary_payment_processed").count(), 23)
+        self.assertEqual(Notification.objects.filter(title="Salary Paid").count(), 23)
+        self.assertEqual(Payroll.objects.get(id=self.payroll.id).approved_by, self.admin)
+
+    def test_bulk_pay_can_be_queued(self):
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            resp = self.client.post(
+                reverse("payroll-bulk-pay"), {"ids": [str(self.payroll.id)], "async": True}, format="json"
+            )
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(resp.data["task_id"])
+        self.assertEqual(len(callbacks), 1)
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.status, "draft")
+
+    def test_summary_and_list_use_database_totals(self):
+        Payroll.objects.create(
+            teacher=self.admin, month=7, year=2026, basic_salary=Decimal("200000.00"),
+            housing_allowance=Decimal("50000.00"), tax=Decimal("40000.00"), status="paid",
+        )
+        self.client.force_authenticate(user=self.admin)
+
+        resp = self.client.get(reverse("payroll-summary"), {"month": 7, "year": 2026})
+        self.assertEqual(resp.data["total_monthly_payroll"], Decimal("285000.00"))
+        self.assertEqual(resp.data["total_deductions"], Decimal("65000.00"))
+        self.assertEqual((resp.data["staff_paid"], resp.data["total_staff"]), (1, 2))
+
+        resp = self.client.get(reverse("payroll-reports"), {"month": 7, "year": 2026})
+        self.assertEqual(resp.data["total_net_salary"], 285000.0)
+        self.assertEqual(resp.data["total_allowances"], 50000.0)
+
+        resp = self.client.get(reverse("payroll-list"), {"ordering": "-net_salary", "min_gross": "100000"})
+        results = resp.data if isinstance(resp.data, list) else resp.data["results"]
+        self.assertEqual([r["net_salary"] for r in results], ["210000.00", "75000.00"])
+        resp = self.client.get(reverse("payroll-list"), {"max_net": "100000"})
+        results = resp.data if isinstance(resp.data, list) else resp.data["results"]
+        self.assertEqual([r["id"] for r in results], [str(self.payroll.id)])
+        resp = self.client.get(reverse("payroll-list"), {"max_net": "lots"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
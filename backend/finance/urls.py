@@ -1,13 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FeeTypeViewSet, StudentFeeViewSet, PaymentRecordViewSet, PayrollViewSet
+from .views import FeeTypeViewSet, StudentFeeViewSet, PaymentRecordViewSet, PayrollViewSet, PayrollAuditLogViewSet, PaystackWebhookView
 
 router = DefaultRouter()
 router.register(r'fee-types', FeeTypeViewSet)
 router.register(r'student-fees', StudentFeeViewSet)
 router.register(r'payments', PaymentRecordViewSet)
 router.register(r'payroll', PayrollViewSet)
+router.register(r'payroll-audit', PayrollAuditLogViewSet)
 
 urlpatterns = [
+    path('paystack/webhook/', PaystackWebhookView.as_view(), name='paystack-webhook'),
     path('', include(router.urls)),
 ]
@@ -1,15 +1,48 @@
+import base64
+import datetime
+import io
+import json
+import uuid
 from decimal import Decimal
-import requests
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, StreamingHttpResponse
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Sum, Q, Count
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from django.db.models import Sum, Q, Count, F
 from django.utils import timezone
-from .models import FeeType, StudentFee, PaymentRecord, Payroll, PayrollAuditLog
+from .models import (
+    FeeType, StudentFee, PaymentRecord, PaystackEvent, Payroll, PayrollAuditLog, PayrollPeriodSummary,
+    FeeLedgerRollup,
+)
+from .audit import audit_entry, payroll_snapshot, payroll_state
+from .analytics import AnalyticsError, collection_breakdown, daily_collections, parse_dimensions, parse_filters
+from .billing import count_students, generate_fees, queue_fee_generation, should_queue
+from .deductions import calculate_deductions
+from .defaulters import defaulters
+from .gateway import GatewayError
+from .payments import PaymentConflict, PaymentError, post_payment
+from .payroll import (
+    PeriodError, bulk_approve_payrolls, bulk_pay_payrolls, close_period, ensure_period_open, generate_payroll,
+    payroll_totals, period_trend,
+)
+from .paystack import (
+    PaystackError, credit_transaction, initialize_transaction, valid_signature, verify_transaction,
+)
+from .exports import REPORT_COLUMNS, report_rows, stream_csv, stream_xlsx
+from .payslips import month_zip_path, payslip_file
+from .receipts import receipt_file, receipts_zip
+from .statements import forget_student_statements, parent_statement, statement_pdf
+from .tasks import queue_bulk_payroll, queue_payslip_batch, queue_paystack_event
+from .rollups import adjust_rollup, rebuild_rollups
 from .serializers import (
     FeeTypeSerializer, StudentFeeSerializer, PaymentRecordSerializer,
-    PayrollSerializer, PayrollDetailSerializer, PayrollAuditLogSerializer,
+    PayrollSerializer, PayrollDetailSerializer, PayrollAuditLogSerializer, PayrollPeriodSummarySerializer,
 )
 
 
@@ -25,14 +58,45 @@ def can_view_payroll_analytics(user):
     return can_manage_payroll(user) or getattr(user, 'role', None) in PAYROLL_READONLY_ROLES
 
 
-def log_payroll_action(payroll, user, action, previous_value=None, updated_value=None):
-    PayrollAuditLog.objects.create(
-        payroll=payroll,
-        user=user if getattr(user, 'is_authenticated', False) else None,
-        action=action,
-        previous_value=previous_value,
-        updated_value=updated_value,
-    )
+def can_view_defaulters(user):
+    return can_view_payroll_analytics(user)
+
+
+def can_view_receipt(user, payment):
+    student = payment.student_fee.student
+    if user.role == 'student':
+        return student.id == user.id
+    if user.role == 'parent':
+        profile = getattr(student, 'student_profile', None)
+        return bool(profile and profile.parent_id == user.id)
+    return can_view_payroll_analytics(user)
+
+
+def idempotency_key(request):
+    """Client-supplied key that makes a payment request safe to retry."""
+    return request.headers.get('Idempotency-Key') or request.data.get('idempotency_key') or None
+
+
+def month_list(data):
+    """
+    The `months` of a request as ints: a JSON list, repeated form fields, or
+    comma-separated values ("9,10"). A bare number is one month, never its digits.
+    """
+    values = data.getlist('months') if hasattr(data, 'getlist') else data.get('months')
+    if not isinstance(values, list):
+        values = [values]
+    months = []
+    for value in values:
+        if isinstance(value, str):
+            months += [int(part) for part in value.split(',') if part.strip()]
+        else:
+            months.append(int(value))
+    return months
+
+
+def log_payroll_action(payroll, user, action, before=None):
+    """Record what `action` changed; `before` is payroll_snapshot() from before the change."""
+    audit_entry(payroll, user, action, before).save()
 
 
 class FeeTypeViewSet(viewsets.ModelViewSet):
@@ -47,9 +111,28 @@ class FeeTypeViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(level_id=level_id)
         return queryset
 
+    def perform_update(self, serializer):
+        old_amount, old_name = serializer.instance.amount, serializer.instance.name
+        fee_type = serializer.save()
+        if fee_type.amount != old_amount:
+            rebuild_rollups(StudentFee.objects.filter(fee_type=fee_type).values_list('term_id', flat=True).distinct())
+        if fee_type.amount != old_amount or fee_type.name != old_name:
+            forget_student_statements(
+                StudentFee.objects.filter(fee_type=fee_type).values_list('student_id', flat=True).distinct()
+            )
+
+    def perform_destroy(self, instance):
+        billed = list(StudentFee.objects.filter(fee_type=instance).values_list('term_id', 'student_id').distinct())
+        instance.delete()
+        if billed:
+            rebuild_rollups({term_id for term_id, _ in billed})
+            forget_student_statements({student_id for _, student_id in billed})
+
 
 class StudentFeeViewSet(viewsets.ModelViewSet):
-    queryset = StudentFee.objects.select_related('student', 'fee_type', 'term').all()
+    queryset = StudentFee.objects.select_related(
+        'student__student_profile__current_class', 'fee_type', 'term'
+    ).all()
     serializer_class = StudentFeeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -85,35 +168,146 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def perform_create(self, serializer):
+        fee = serializer.save()
+        adjust_rollup(fee, billed=fee.fee_type.amount, paid=fee.amount_paid)
+        forget_student_statements([fee.student_id])
+
+    def perform_update(self, serializer):
+        old_term_id, old_student_id = serializer.instance.term_id, serializer.instance.student_id
+        fee = serializer.save()
+        rebuild_rollups({old_term_id, fee.term_id})
+        forget_student_statements({old_student_id, fee.student_id})
+
+    def perform_destroy(self, instance):
+        term_id, student_id = instance.term_id, instance.student_id
+        instance.delete()
+        rebuild_rollups([term_id])
+        forget_student_statements([student_id])
+
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        queryset = self.get_queryset()
-        total_outstanding = queryset.filter(
-            status__in=['outstanding', 'partial']
-        ).aggregate(
-            total=Sum('fee_type__amount')
-        )['total'] or 0
+        """
+        Billed, paid and outstanding totals with the collection rate, in Decimal.
+        Staff views filtered at most by term read FeeLedgerRollup; narrower
+        views (a parent's children, a status, a search) use one aggregate query.
+        """
+        params = request.query_params
+        narrowed = request.user.role in ('student', 'parent') or any(
+            params.get(key) for key in ('status', 'student', 'search')
+        )
+        if narrowed:
+            totals = self.get_queryset().aggregate(
+                paid=Sum('amount_paid', filter=~Q(status='outstanding')),
+                outstanding=Sum(F('fee_type__amount') - F('amount_paid'), filter=~Q(status='paid')),
+            )
+            paid = totals['paid'] or Decimal('0')
+            outstanding = totals['outstanding'] or Decimal('0')
+        else:
+            rollups = FeeLedgerRollup.objects.all()
+            if params.get('term'):
+                rollups = rollups.filter(term_id=params['term'])
+            totals = rollups.aggregate(billed=Sum('billed'), paid=Sum('paid'))
+            paid = totals['paid'] or Decimal('0')
+            outstanding = (totals['billed'] or Decimal('0')) - paid
+
+        grand_total = paid + outstanding
+        collection_rate = (paid / grand_total * 100) if grand_total > 0 else Decimal('0')
 
-        total_partial_paid = queryset.filter(
-            status='partial'
-        ).aggregate(total=Sum('amount_paid'))['total'] or 0
+        return Response({
+            'total_billed': grand_total.quantize(Decimal('0.01')),
+            'total_outstanding': outstanding.quantize(Decimal('0.01')),
+            'total_paid': paid.quantize(Decimal('0.01')),
+            'collection_rate': collection_rate.quantize(Decimal('0.1')),
+        })
 
-        total_paid = queryset.filter(
-            status='paid'
-        ).aggregate(total=Sum('amount_paid'))['total'] or 0
+    @action(detail=False, methods=['get'])
+    def defaulters(self, request):
+        """
+        GET /api/finance/student-fees/defaulters/?group=pupil|parent&level=&class=&min_owed=
+        Pupils (or parents) who owe money, largest debt first, with the debt
+        split into this term, last term and older. Paginated.
+        """
+        if not can_view_defaulters(request.user):
+            return Response({'error': 'You do not have permission to view fee defaulters.'}, status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        group = params.get('group', 'pupil')
+        if group not in ('pupil', 'parent'):
+            return Response({'error': 'group must be "pupil" or "parent".'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fees = StudentFee.objects.all()
+        if params.get('level'):
+            fees = fees.filter(student__student_profile__current_class__level_id=params['level'])
+        if params.get('class'):
+            fees = fees.filter(student__student_profile__current_class_id=params['class'])
+        rows = defaulters(group, fees)
+        if params.get('min_owed'):
+            try:
+                rows = rows.filter(total_owed__gte=Decimal(params['min_owed']))
+            except Exception:
+                return Response({'error': 'min_owed must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        actual_paid = float(total_paid) + float(total_partial_paid)
-        outstanding_amount = float(total_outstanding) - float(total_partial_paid)
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(page)
 
-        grand_total = actual_paid + outstanding_amount
-        collection_rate = (actual_paid / grand_total * 100) if grand_total > 0 else 0
+    @action(detail=False, methods=['get'])
+    def collections(self, request):
+        """
+        GET /api/finance/student-fees/collections/?group_by=term,level,class,fee_type,method
+            &term=&level=&class=&fee_type=&method=&from=&to=
+        Billed, collected and outstanding totals and collection rates sliced by
+        the group_by dimensions, plus daily collections from `from` to `to`
+        (the last 30 days by default). Read from the fee rollups.
+        """
+        from django.utils.dateparse import parse_date
+        if not can_view_defaulters(request.user):
+            return Response({'error': 'You do not have permission to view fee analytics.'}, status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        try:
+            dimensions = parse_dimensions(params.get('group_by'))
+            filters = parse_filters(params)
+            end = parse_date(params['to']) if params.get('to') else timezone.localdate()
+            start = parse_date(params['from']) if params.get('from') else end - datetime.timedelta(days=29)
+            if start is None or end is None:
+                raise AnalyticsError('from and to must be dates (YYYY-MM-DD).')
+            series = daily_collections(start, end, filters, by_method='method' in dimensions)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
-            'total_outstanding': round(outstanding_amount, 2),
-            'total_paid': round(actual_paid, 2),
-            'collection_rate': round(collection_rate, 1),
+            **collection_breakdown(dimensions, filters),
+            'series': {'from': start, 'to': end, 'days': series},
         })
 
+    @action(detail=False, methods=['get'])
+    def statement(self, request):
+        """
+        GET /api/finance/student-fees/statement/?parent=&export=pdf
+        Billed, paid and balance per child and term with the payments behind
+        them. Parents get their own statement; staff pass ?parent=.
+        """
+        from accounts.models import User
+        if request.user.role == 'parent':
+            parent = request.user
+        elif can_view_payroll_analytics(request.user):
+            parent = User.objects.filter(id=request.query_params.get('parent') or None, role='parent').first()
+            if not parent:
+                return Response({'error': 'Parent not found.'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+
+        export = request.query_params.get('export')
+        if export == 'pdf':
+            return FileResponse(
+                io.BytesIO(statement_pdf(parent)), as_attachment=True, content_type='application/pdf',
+                filename=f'fee-statement-{parent.last_name.lower() or parent.id}.pdf',
+            )
+        if export:
+            return Response({'error': 'export must be "pdf".'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(parent_statement(parent))
+
     @action(detail=True, methods=['post'])
     def record_payment(self, request, pk=None):
         """Record a payment for a specific StudentFee."""
@@ -126,36 +320,26 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'amount is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            amount = float(amount)
-        except (TypeError, ValueError):
-            return Response({'error': 'Invalid amount.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if amount <= 0:
-            return Response({'error': 'Amount must be greater than zero.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        remaining_balance = float(student_fee.fee_type.amount) - float(student_fee.amount_paid)
-        if amount > remaining_balance:
+            payment, created = post_payment(
+                student_fee.id, amount, payment_method,
+                transaction_id=transaction_id,
+                idempotency_key=idempotency_key(request),
+                received_by=request.user,
+                requested_by=request.user,
+            )
+        except PaymentConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except PaymentError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        student_fee = payment.student_fee
+        amount = payment.amount
+        if not created:
             return Response({
-                'error': f'Amount ₦{amount:,.2f} exceeds remaining balance of ₦{remaining_balance:,.2f}.'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create payment record
-        payment = PaymentRecord.objects.create(
-            student_fee=student_fee,
-            amount=amount,
-            payment_method=payment_method,
-            transaction_id=transaction_id or None,
-            received_by=request.user,
-        )
-
-        # Update StudentFee
-        from decimal import Decimal
-        student_fee.amount_paid += Decimal(str(amount))
-        if student_fee.amount_paid >= student_fee.fee_type.amount:
-            student_fee.status = 'paid'
-        elif student_fee.amount_paid > 0:
-            student_fee.status = 'partial'
-        student_fee.save()
+                'message': 'Payment already recorded.',
+                'payment_id': str(payment.id),
+                'student_fee': self.get_serializer(student_fee).data,
+            })
 
         # Send payment notifications
         try:
@@ -211,61 +395,30 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
         except FeeType.DoesNotExist:
             return Response({'error': 'Fee type not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        from accounts.models import User
-        if student_ids:
-            students = User.objects.filter(id__in=student_ids, role='student')
-        else:
-            students = User.objects.filter(
-                role='student',
-                student_profile__current_class__level=fee_type.level
-            )
-
-        created_count = 0
-        notifications = []
-        try:
-            from accounts.models import Notification
-        except ImportError:
-            Notification = None
-
-        for student in students:
-            sf, created = StudentFee.objects.get_or_create(
-                student=student,
-                fee_type=fee_type,
-                term_id=term_id,
-                defaults={'status': 'outstanding', 'amount_paid': 0}
-            )
-            if created:
-                created_count += 1
-                if Notification:
-                    msg = f"A new fee of ₦{fee_type.amount:,.2f} for {fee_type.name} has been assigned for this term."
-                    notifications.append(
-                        Notification(
-                            sender=request.user,
-                            recipient=student,
-                            title=f"New Fee: {fee_type.name}",
-                            message=msg,
-                            category='finance',
-                            audience='selected'
-                        )
-                    )
-                    parent = student.student_profile.parent if hasattr(student, 'student_profile') else None
-                    if parent:
-                        parent_msg = f"A new fee of ₦{fee_type.amount:,.2f} for {fee_type.name} has been assigned to your child, {student.full_name}."
-                        notifications.append(
-                            Notification(
-                                sender=request.user,
-                                recipient=parent,
-                                title=f"Tuition Invoice: {student.first_name}",
-                                message=parent_msg,
-                                category='finance',
-                                audience='selected'
-                            )
-                        )
-        if notifications and Notification:
-            Notification.objects.bulk_create(notifications)
+        from academics.models import Term
+        if not Term.objects.filter(id=term_id).exists():
+            return Response({'error': 'Term not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        options = {
+            'term_id': str(term_id),
+            'fee_type_ids': [str(fee_type.id)],
+            'student_ids': [str(sid) for sid in student_ids] or None,
+            'match_level': not student_ids,
+            'sender_id': str(request.user.id),
+            'notify': 'assignment',
+        }
+        if should_queue(count_students(student_ids, fee_type.level_id)):
+            queue_fee_generation(**options)
+            return Response({
+                'message': 'Fee assignment has been queued and will complete shortly.',
+                'queued': True,
+            }, status=status.HTTP_202_ACCEPTED)
 
+        result = generate_fees(**options)
         return Response({
-            'message': f'Fee assigned to {created_count} student(s). {students.count() - created_count} already had this fee.'
+            'message': f"Fee assigned to {result['created']} student(s). {result['skipped']} already had this fee.",
+            'created': result['created'],
+            'skipped': result['skipped'],
         })
 
     @action(detail=True, methods=['post'])
@@ -304,11 +457,6 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
 
         # Real Paystack initialization
         ref = f"PSTK-{student_fee.id}-{int(timezone.now().timestamp())}"
-        headers = {
-            'Authorization': f'Bearer {paystack_key}',
-            'Content-Type': 'application/json',
-        }
-        
         callback_url = request.data.get('callback_url') or request.build_absolute_uri('/parent/fees')
         if '?' in callback_url:
             callback_url += f"&reference={ref}"
@@ -327,14 +475,11 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
         }
 
         try:
-            r = requests.post('https://api.paystack.co/transaction/initialize', json=payload, headers=headers, timeout=15)
-            r_data = r.json()
-            if r.status_code == 200 and r_data.get('status') is True:
-                return Response(r_data.get('data'))
-            else:
-                return Response({'error': r_data.get('message', 'Failed to initialize Paystack transaction.')}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            return Response({'error': f'Paystack API connection error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response(initialize_transaction(payload))
+        except PaystackError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except GatewayError as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     @action(detail=False, methods=['post'])
     def verify_paystack(self, request):
@@ -346,14 +491,17 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Transaction reference is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
         existing_payment = PaymentRecord.objects.filter(transaction_id=reference).first()
+        if existing_payment and fee_id and str(existing_payment.student_fee_id) != str(fee_id):
+            return Response(
+                {'error': 'This transaction reference was already used for a different fee.'},
+                status=status.HTTP_409_CONFLICT,
+            )
         if existing_payment:
             return Response({
                 'message': 'Payment already verified.',
                 'student_fee': StudentFeeSerializer(existing_payment.student_fee).data
             })
 
-        amount = None
-        student_fee = None
         paystack_key = getattr(settings, 'PAYSTACK_SECRET_KEY', '')
 
         # Mock reference support
@@ -377,79 +525,37 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
             amount = request.data.get('amount')
             if not amount:
                 amount = student_fee.balance
-            else:
-                amount = Decimal(str(amount))
+            data = {
+                'status': 'success',
+                'reference': reference,
+                'amount': Decimal(str(amount)) * 100,
+                'metadata': {'student_fee_id': str(student_fee.id)},
+            }
         else:
             if not paystack_key:
                 return Response({'error': 'Paystack keys are not configured. Cannot verify real transactions.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            headers = {
-                'Authorization': f'Bearer {paystack_key}',
-            }
             try:
-                r = requests.get(f'https://api.paystack.co/transaction/verify/{reference}', headers=headers, timeout=15)
-                r_data = r.json()
-                if r.status_code == 200 and r_data.get('status') is True:
-                    data = r_data.get('data')
-                    if data.get('status') != 'success':
-                        return Response({'error': f"Transaction verification failed: status is {data.get('status')}"}, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    amount = Decimal(data.get('amount')) / 100
-                    fee_id = data.get('metadata', {}).get('student_fee_id') or fee_id
-                    if not fee_id:
-                        return Response({'error': 'Student fee information missing in transaction metadata.'}, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    try:
-                        student_fee = StudentFee.objects.get(id=fee_id)
-                    except StudentFee.DoesNotExist:
-                        return Response({'error': 'Student fee not found.'}, status=status.HTTP_404_NOT_FOUND)
-                else:
-                    return Response({'error': r_data.get('message', 'Failed to verify transaction with Paystack.')}, status=status.HTTP_400_BAD_REQUEST)
-            except Exception as e:
-                return Response({'error': f'Paystack API connection error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        payment = PaymentRecord.objects.create(
-            student_fee=student_fee,
-            amount=amount,
-            payment_method='online',
-            transaction_id=reference,
-            received_by=None,
-        )
-
-        student_fee.amount_paid += Decimal(str(amount))
-        if student_fee.amount_paid >= student_fee.fee_type.amount:
-            student_fee.status = 'paid'
-        elif student_fee.amount_paid > 0:
-            student_fee.status = 'partial'
-        student_fee.save()
+                data = verify_transaction(reference)
+            except PaystackError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except GatewayError as e:
+                return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         try:
-            from accounts.models import Notification
-            student = student_fee.student
-            fee_name = student_fee.fee_type.name
-            parent = student.student_profile.parent if hasattr(student, 'student_profile') else None
-            
-            msg = f"A payment of ₦{amount:,.2f} has been verified for {student.full_name}'s {fee_name} via online gateway. New status: {student_fee.get_status_display()}."
-            if parent:
-                Notification.objects.create(
-                    sender=None,
-                    recipient=parent,
-                    title="Online Payment Verified",
-                    message=msg,
-                    category='finance',
-                    audience='selected'
-                )
-            
-            Notification.objects.create(
-                sender=None,
-                recipient=student,
-                title="Fee Payment Recorded",
-                message=f"Online payment of ₦{amount:,.2f} was successfully recorded for your {fee_name}.",
-                category='finance',
-                audience='selected'
+            payment, created = credit_transaction(
+                data, student_fee_id=fee_id, idempotency_key=idempotency_key(request), requested_by=request.user,
             )
-        except Exception as e:
-            print(f"Error sending online payment notification: {e}")
+        except PaymentConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except (PaystackError, PaymentError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        student_fee = payment.student_fee
+        if not created:
+            return Response({
+                'message': 'Payment already verified.',
+                'student_fee': StudentFeeSerializer(student_fee).data
+            })
 
         return Response({
             'message': 'Payment verified successfully.',
@@ -458,6 +564,35 @@ class StudentFeeViewSet(viewsets.ModelViewSet):
         })
 
 
+class PaystackWebhookView(APIView):
+    """
+    Paystack event webhook. The signature is checked against the raw body, the
+    event is stored as received and a Celery task verifies and credits it, so
+    Paystack gets its 200 straight away and crediting no longer depends on the
+    payer's browser returning to the callback URL.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        body = request.body
+        if not valid_signature(body, request.headers.get('X-Paystack-Signature')):
+            return Response({'error': 'Invalid signature.'}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            return Response({'error': 'Malformed payload.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        event = PaystackEvent.objects.create(
+            event=str(payload.get('event', ''))[:60],
+            reference=str((payload.get('data') or {}).get('reference') or '')[:100],
+            payload=payload,
+        )
+        queue_paystack_event(event.id)
+        return Response({'status': 'received'})
+
 
 class PaymentRecordViewSet(viewsets.ModelViewSet):
     queryset = PaymentRecord.objects.select_related(
@@ -465,6 +600,8 @@ class PaymentRecordViewSet(viewsets.ModelViewSet):
     ).all()
     serializer_class = PaymentRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # The payment ledger is append-only: corrections are new entries, never edits.
+    http_method_names = ['get', 'post', 'head', 'options']
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -478,19 +615,76 @@ class PaymentRecordViewSet(viewsets.ModelViewSet):
 
         return queryset.order_by('-date')
 
-    def perform_create(self, serializer):
-        payment = serializer.save(received_by=self.request.user)
-        # Update StudentFee status and amount_paid
-        fee = payment.student_fee
-        from decimal import Decimal
-        fee.amount_paid += Decimal(str(payment.amount))
-        if fee.amount_paid >= fee.fee_type.amount:
-            fee.status = 'paid'
-        elif fee.amount_paid > 0:
-            fee.status = 'partial'
-        fee.save()
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            payment, created = post_payment(
+                data['student_fee'].id, data['amount'], data['payment_method'],
+                transaction_id=data.get('transaction_id'),
+                idempotency_key=idempotency_key(request),
+                received_by=request.user,
+                requested_by=request.user,
+                allow_overpayment=True,
+            )
+        except PaymentConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except PaymentError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if created:
+            self._notify_payment(payment)
+        return Response(
+            self.get_serializer(payment).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
-        # Send payment notifications
+    @action(detail=True, methods=['get'])
+    def receipt(self, request, pk=None):
+        """Download the payment's receipt PDF (issued now if the receipt task has not run yet)."""
+        payment = self.get_object()
+        if not can_view_receipt(request.user, payment):
+            return Response({'error': 'You do not have permission to view this receipt.'}, status=status.HTTP_403_FORBIDDEN)
+        name = receipt_file(payment)
+        return FileResponse(
+            default_storage.open(name, 'rb'), as_attachment=True, content_type='application/pdf',
+            filename=f'{payment.receipt_number}.pdf',
+        )
+
+    @action(detail=False, methods=['get'])
+    def term_receipts(self, request):
+        """
+        GET ?term=&parent= - one ZIP of every receipt for a parent's children in
+        a term (the current term by default). Parents get their own.
+        """
+        from academics.models import Term
+        user = request.user
+        if user.role == 'parent':
+            parent_id = user.id
+        elif can_view_payroll_analytics(user):
+            parent_id = request.query_params.get('parent')
+            if not parent_id:
+                return Response({'error': 'parent is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+
+        term_id = request.query_params.get('term')
+        term = Term.objects.filter(id=term_id).first() if term_id else Term.objects.filter(is_current=True).first()
+        if not term:
+            return Response({'error': 'Term not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        payments = list(PaymentRecord.objects.filter(
+            student_fee__student__student_profile__parent_id=parent_id, student_fee__term=term
+        ).order_by('date'))
+        if not payments:
+            return Response({'error': 'No payments were recorded for this term.'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            io.BytesIO(receipts_zip(payments)), as_attachment=True, content_type='application/zip',
+            filename=f'receipts-{term.name.replace(" ", "-").lower()}.zip',
+        )
+
+    def _notify_payment(self, payment):
+        fee = payment.student_fee
         try:
             from accounts.models import Notification
             student = fee.student
@@ -522,6 +716,19 @@ class PaymentRecordViewSet(viewsets.ModelViewSet):
             print(f"Error sending payment notification: {e}")
 
 
+PAYROLL_RANGE_FILTERS = {
+    'min_net': 'net_salary__gte',
+    'max_net': 'net_salary__lte',
+    'min_gross': 'gross_salary__gte',
+    'max_gross': 'gross_salary__lte',
+}
+
+PAYROLL_ORDERING_FIELDS = {
+    'net_salary', 'gross_salary', 'basic_salary', 'total_deductions', 'total_allowances',
+    'year', 'month', 'status', 'department', 'payment_date',
+}
+
+
 class PayrollViewSet(viewsets.ModelViewSet):
     queryset = Payroll.objects.select_related('teacher').all()
     serializer_class = PayrollSerializer
@@ -563,24 +770,43 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 Q(teacher__teacher_profile__staff_id__icontains=search)
             )
 
+        for param, lookup in PAYROLL_RANGE_FILTERS.items():
+            value = self.request.query_params.get(param)
+            if value not in (None, ''):
+                try:
+                    queryset = queryset.filter(**{lookup: Decimal(value)})
+                except (ArithmeticError, ValueError):
+                    raise ValidationError({param: 'Enter a number.'})
+
+        ordering = self.request.query_params.get('ordering')
+        if ordering and ordering.lstrip('-') in PAYROLL_ORDERING_FIELDS:
+            return queryset.order_by(ordering, '-year', '-month', 'id')
         return queryset.order_by('-year', '-month')
 
     def perform_create(self, serializer):
         if not can_manage_payroll(self.request.user):
             raise permissions.PermissionDenied('You do not have permission to create payroll records.')
         payroll = serializer.save()
-        log_payroll_action(payroll, self.request.user, 'payroll_created', updated_value=self.get_serializer(payroll).data)
+        log_payroll_action(payroll, self.request.user, 'payroll_created')
 
     def perform_update(self, serializer):
         if not can_manage_payroll(self.request.user):
             raise permissions.PermissionDenied('You do not have permission to update payroll records.')
-        previous = self.get_serializer(self.get_object()).data
+        try:
+            ensure_period_open(serializer.instance)
+        except PeriodError as e:
+            raise ValidationError({'error': str(e)})
+        previous = payroll_snapshot(serializer.instance)
         payroll = serializer.save()
-        log_payroll_action(payroll, self.request.user, 'payroll_updated', previous, self.get_serializer(payroll).data)
+        log_payroll_action(payroll, self.request.user, 'payroll_updated', previous)
 
     def destroy(self, request, *args, **kwargs):
         if not can_manage_payroll(request.user):
             return Response({'error': 'You do not have permission to delete payroll records.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            ensure_period_open(self.get_object())
+        except PeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return super().destroy(request, *args, **kwargs)
 
     # ── Summary ───────────────────────────────────────────────────────────────
@@ -596,35 +822,28 @@ class PayrollViewSet(viewsets.ModelViewSet):
         year = int(request.query_params.get('year', now.year))
         period = queryset.filter(month=month, year=year)
 
-        total_payroll = sum((p.net_salary for p in period), Decimal('0.00'))
-        total_deductions = sum((p.total_deductions for p in period), Decimal('0.00'))
-        total_allowances = sum((p.total_allowances for p in period), Decimal('0.00'))
-        total_bonuses = sum((p.total_bonuses for p in period), Decimal('0.00'))
-        total_basic = sum((p.basic_salary for p in period), Decimal('0.00'))
-        staff_paid = period.filter(status='paid').count()
-        pending = period.exclude(status__in=['paid', 'reversed', 'cancelled']).count()
-        total_staff = period.count()
+        totals = payroll_totals(period)
+        total_staff = totals['total_staff']
+        staff_paid = totals['staff_paid']
+        locked_count = totals['locked']
         completion = round((staff_paid / total_staff * 100), 1) if total_staff else 0
-        due_date = period.exclude(due_date__isnull=True).order_by('due_date').values_list('due_date', flat=True).first()
-        locked_count = period.filter(status='locked').count()
-        approved_count = period.filter(status__in=['approved', 'locked', 'processing', 'paid']).count()
 
         return Response({
             'month': month,
             'year': year,
-            'total_monthly_payroll': total_payroll,
-            'total_basic_salary': total_basic,
+            'total_monthly_payroll': totals['net'],
+            'total_basic_salary': totals['basic'],
             'staff_paid': staff_paid,
             'total_staff': total_staff,
-            'pending_salary_payments': pending,
+            'pending_salary_payments': totals['pending'],
             'payroll_completion': completion,
-            'payroll_due_date': due_date,
-            'total_deductions': total_deductions,
-            'total_bonuses': total_bonuses,
-            'total_allowances': total_allowances,
+            'payroll_due_date': totals['due_date'],
+            'total_deductions': totals['deductions'],
+            'total_bonuses': totals['bonuses'],
+            'total_allowances': totals['allowances'],
             'payroll_processing_status': (
                 'locked' if locked_count and locked_count == total_staff
-                else 'approved' if approved_count
+                else 'approved' if totals['approved']
                 else 'draft'
             ),
         })
@@ -710,10 +929,10 @@ class PayrollViewSet(viewsets.ModelViewSet):
         payroll = self.get_object()
         if payroll.status != 'draft':
             return Response({'error': 'Only draft payroll can be set to preview.'}, status=status.HTTP_400_BAD_REQUEST)
-        previous = {'status': payroll.status}
+        previous = payroll_snapshot(payroll)
         payroll.status = 'preview'
         payroll.save()
-        log_payroll_action(payroll, request.user, 'payroll_previewed', previous, {'status': payroll.status})
+        log_payroll_action(payroll, request.user, 'payroll_previewed', previous)
         return Response(PayrollDetailSerializer(payroll).data)
 
     @action(detail=True, methods=['post'])
@@ -723,12 +942,12 @@ class PayrollViewSet(viewsets.ModelViewSet):
         payroll = self.get_object()
         if payroll.status not in ['draft', 'preview']:
             return Response({'error': 'Only draft or preview payroll can be approved.'}, status=status.HTTP_400_BAD_REQUEST)
-        previous = {'status': payroll.status}
+        previous = payroll_snapshot(payroll)
         payroll.status = 'approved'
         payroll.approved_by = request.user
         payroll.approved_at = timezone.now()
         payroll.save()
-        log_payroll_action(payroll, request.user, 'payroll_approved', previous, {'status': payroll.status})
+        log_payroll_action(payroll, request.user, 'payroll_approved', previous)
         self._notify_staff(payroll, 'Payroll Processed', f'Your payroll for {payroll.month}/{payroll.year} has been processed.')
         return Response(self.get_serializer(payroll).data)
 
@@ -739,11 +958,11 @@ class PayrollViewSet(viewsets.ModelViewSet):
         payroll = self.get_object()
         if payroll.status not in ['approved', 'processing']:
             return Response({'error': 'Approve payroll before locking it.'}, status=status.HTTP_400_BAD_REQUEST)
-        previous = {'status': payroll.status}
+        previous = payroll_snapshot(payroll)
         payroll.status = 'locked'
         payroll.locked_at = timezone.now()
         payroll.save()
-        log_payroll_action(payroll, request.user, 'payroll_locked', previous, {'status': payroll.status})
+        log_payroll_action(payroll, request.user, 'payroll_locked', previous)
         return Response(self.get_serializer(payroll).data)
 
     @action(detail=True, methods=['post'])
@@ -753,7 +972,11 @@ class PayrollViewSet(viewsets.ModelViewSet):
         payroll = self.get_object()
         if payroll.status == 'paid':
             return Response({'error': 'Payroll is already marked as paid.'}, status=status.HTTP_400_BAD_REQUEST)
-        previous = {'status': payroll.status, 'payment_date': str(payroll.payment_date), 'payment_reference': payroll.payment_reference}
+        try:
+            ensure_period_open(payroll)
+        except PeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        previous = payroll_snapshot(payroll)
         payroll.status = 'paid'
         payroll.payment_date = timezone.now().date()
         payroll.payment_reference = (
@@ -763,11 +986,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
         )
         payroll.payment_method = request.data.get('payment_method', payroll.payment_method)
         payroll.save()
-        log_payroll_action(payroll, request.user, 'salary_payment_processed', previous, {
-            'status': payroll.status,
-            'payment_date': str(payroll.payment_date),
-            'payment_reference': payroll.payment_reference,
-        })
+        log_payroll_action(payroll, request.user, 'salary_payment_processed', previous)
         self._notify_staff(
             payroll, 'Salary Paid',
             f'Your salary of ₦{float(payroll.net_salary):,.2f} for {payroll.month}/{payroll.year} has been paid. '
@@ -782,11 +1001,15 @@ class PayrollViewSet(viewsets.ModelViewSet):
         payroll = self.get_object()
         if payroll.status not in ['paid', 'failed']:
             return Response({'error': 'Only paid or failed payroll can be reversed.'}, status=status.HTTP_400_BAD_REQUEST)
-        previous = {'status': payroll.status, 'payment_reference': payroll.payment_reference}
+        try:
+            ensure_period_open(payroll)
+        except PeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        previous = payroll_snapshot(payroll)
         payroll.status = 'reversed'
         payroll.notes = request.data.get('reason', payroll.notes)
         payroll.save()
-        log_payroll_action(payroll, request.user, 'payroll_reversed', previous, {'status': payroll.status, 'reason': payroll.notes})
+        log_payroll_action(payroll, request.user, 'payroll_reversed', previous)
         self._notify_staff(payroll, 'Payroll Adjusted', f'Your payroll for {payroll.month}/{payroll.year} has been adjusted. Please contact HR for details.')
         return Response(self.get_serializer(payroll).data)
 
@@ -799,7 +1022,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
         if payroll.status in ['paid', 'locked']:
             return Response({'error': 'Cannot recalculate a locked or paid payroll.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        previous = PayrollDetailSerializer(payroll).data
+        previous = payroll_snapshot(payroll)
 
         # Apply all salary structure fields from request body if provided
         salary_fields = [
@@ -820,7 +1043,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 setattr(payroll, field, val)
 
         payroll.save()
-        log_payroll_action(payroll, request.user, 'payroll_recalculated', previous, PayrollDetailSerializer(payroll).data)
+        log_payroll_action(payroll, request.user, 'payroll_recalculated', previous)
         return Response(PayrollDetailSerializer(payroll).data)
 
     @action(detail=True, methods=['get'])
@@ -830,15 +1053,88 @@ class PayrollViewSet(viewsets.ModelViewSet):
             return Response({'error': 'You can only view your own payslips.'}, status=status.HTTP_403_FORBIDDEN)
         return Response(PayrollDetailSerializer(payroll).data)
 
+    @action(detail=True, methods=['get'])
+    def payslip_pdf(self, request, pk=None):
+        """Download the payslip as a PDF, rendered once per version of the payroll row."""
+        payroll = self.get_object()
+        if request.user.role == 'teacher' and payroll.teacher_id != request.user.id:
+            return Response({'error': 'You can only view your own payslips.'}, status=status.HTTP_403_FORBIDDEN)
+        name = payslip_file(payroll)
+        return FileResponse(
+            default_storage.open(name, 'rb'), as_attachment=True, content_type='application/pdf',
+            filename=f'payslip-{payroll.year}-{payroll.month:02d}.pdf',
+        )
+
+    @action(detail=False, methods=['get', 'post'])
+    def payslip_batch(self, request):
+        """
+        POST {month, year} queues a ZIP of every payslip for the month (poll
+        bulk_progress with the returned task_id); GET ?month=&year= downloads it.
+        """
+        if not can_manage_payroll(request.user):
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+        params = request.data if request.method == 'POST' else request.query_params
+        try:
+            month, year = int(params.get('month')), int(params.get('year'))
+        except (TypeError, ValueError):
+            return Response({'error': 'month and year are required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            if not Payroll.objects.filter(month=month, year=year).exists():
+                return Response({'error': f'There is no payroll for {month}/{year}.'}, status=status.HTTP_404_NOT_FOUND)
+            task_id = queue_payslip_batch(year, month)
+            return Response({'queued': True, 'task_id': task_id}, status=status.HTTP_202_ACCEPTED)
+
+        name = month_zip_path(year, month)
+        if not default_storage.exists(name):
+            return Response({'error': 'No payslip batch has been generated for this month.'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            default_storage.open(name, 'rb'), as_attachment=True, content_type='application/zip',
+            filename=f'payslips-{year}-{month:02d}.zip',
+        )
+
     @action(detail=True, methods=['get'])
     def audit_logs(self, request, pk=None):
         if not can_manage_payroll(request.user):
             return Response({'error': 'You do not have permission to view payroll audit logs.'}, status=status.HTTP_403_FORBIDDEN)
         payroll = self.get_object()
-        return Response(PayrollAuditLogSerializer(payroll.audit_logs.all(), many=True).data)
+        paginator = PayrollAuditPagination()
+        page = paginator.paginate_queryset(payroll.audit_logs.select_related('user'), request, view=self)
+        return paginator.get_paginated_response(PayrollAuditLogSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def state(self, request, pk=None):
+        """GET ?at=<ISO datetime> - the payroll's fields as they stood at that moment, rebuilt from its audit trail."""
+        from django.utils.dateparse import parse_datetime
+        if not can_manage_payroll(request.user):
+            return Response({'error': 'You do not have permission to view payroll audit logs.'}, status=status.HTTP_403_FORBIDDEN)
+        at = parse_datetime(request.query_params.get('at') or '')
+        if at is None:
+            return Response({'error': 'at must be an ISO 8601 date and time.'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        payroll = self.get_object()
+        state = payroll_state(payroll, at)
+        if state is None:
+            return Response({'error': 'The payroll did not exist at that time.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'at': at, 'state': state})
 
     # ── Bulk Operations ───────────────────────────────────────────────────────
 
+    def _run_bulk(self, operation, ids, **kwargs):
+        """Run a bulk payroll operation inline, or queue it when large or asked to."""
+        run_async = str(self.request.data.get('async', '')).lower() in ('1', 'true', 'yes')
+        if run_async or len(ids) > settings.PAYROLL_BULK_ASYNC_THRESHOLD:
+            task_id = queue_bulk_payroll(operation, ids, self.request.user.id, **kwargs)
+            return None, Response({
+                'message': f'Bulk payroll {operation} queued for {len(ids)} record(s).',
+                'queued': True,
+                'task_id': task_id,
+            }, status=status.HTTP_202_ACCEPTED)
+        if operation == 'pay':
+            return bulk_pay_payrolls(ids, kwargs['payment_method'], self.request.user), None
+        return bulk_approve_payrolls(ids, self.request.user), None
+
     @action(detail=False, methods=['post'])
     def bulk_pay(self, request):
         """Mark multiple payroll records as paid in one call."""
@@ -849,23 +1145,10 @@ class PayrollViewSet(viewsets.ModelViewSet):
         if not ids:
             return Response({'error': 'No payroll IDs provided.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        records = Payroll.objects.filter(id__in=ids).exclude(status__in=['paid', 'reversed', 'cancelled'])
-        paid_count = 0
-        for payroll in records:
-            previous = {'status': payroll.status}
-            payroll.status = 'paid'
-            payroll.payment_date = timezone.now().date()
-            payroll.payment_method = payment_method
-            payroll.payment_reference = f"BULK-{payroll.year}{payroll.month:02d}-{str(payroll.id)[:8].upper()}"
-            payroll.save()
-            log_payroll_action(payroll, request.user, 'salary_payment_processed', previous, {'status': 'paid', 'method': payment_method})
-            self._notify_staff(
-                payroll, 'Salary Paid',
-                f'Your salary of ₦{float(payroll.net_salary):,.2f} for {payroll.month}/{payroll.year} has been paid. '
-                f'Reference: {payroll.payment_reference}.'
-            )
-            paid_count += 1
-
+        result, queued = self._run_bulk('pay', ids, payment_method=payment_method)
+        if queued:
+            return queued
+        paid_count = result['paid_count']
         return Response({'message': f'{paid_count} payroll record(s) marked as paid.', 'paid_count': paid_count})
 
     @action(detail=False, methods=['post'])
@@ -877,20 +1160,32 @@ class PayrollViewSet(viewsets.ModelViewSet):
         if not ids:
             return Response({'error': 'No payroll IDs provided.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        records = Payroll.objects.filter(id__in=ids, status__in=['draft', 'preview'])
-        count = 0
-        for payroll in records:
-            previous = {'status': payroll.status}
-            payroll.status = 'approved'
-            payroll.approved_by = request.user
-            payroll.approved_at = timezone.now()
-            payroll.save()
-            log_payroll_action(payroll, request.user, 'payroll_approved', previous, {'status': 'approved'})
-            self._notify_staff(payroll, 'Payroll Approved', f'Your payroll for {payroll.month}/{payroll.year} has been approved.')
-            count += 1
-
+        result, queued = self._run_bulk('approve', ids)
+        if queued:
+            return queued
+        count = result['approved_count']
         return Response({'message': f'{count} payroll record(s) approved.', 'approved_count': count})
 
+    @action(detail=False, methods=['get'])
+    def bulk_progress(self, request):
+        """Progress of a queued bulk pay/approve: ?task_id= from the 202 response."""
+        if not can_manage_payroll(request.user):
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+        task_id = request.query_params.get('task_id')
+        if not task_id:
+            return Response({'error': 'task_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        from celery.result import AsyncResult
+        result = AsyncResult(task_id)
+        payload = {'task_id': task_id, 'state': result.state}
+        if result.state == 'PROGRESS':
+            payload.update(result.info or {})
+        elif result.successful():
+            payload['result'] = result.result
+        elif result.failed():
+            payload['error'] = str(result.result)
+        return Response(payload)
+
     # ── My Salary (Teacher Self-Service) ──────────────────────────────────────
 
     @action(detail=False, methods=['get'])
@@ -911,56 +1206,86 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def generate_monthly(self, request):
-        """Auto-generate payroll for all active staff for a given month/year."""
+        """
+        Auto-generate payroll for all active staff for a month, a list of
+        months (`months`), or a whole year (`whole_year`).
+        """
         if not can_manage_payroll(request.user):
             return Response({'error': 'You do not have permission to generate payroll.'}, status=status.HTTP_403_FORBIDDEN)
-        month = request.data.get('month', timezone.now().month)
-        year = request.data.get('year', timezone.now().year)
-        due_date = request.data.get('due_date')
-        include_admin = request.data.get('include_admin', False)
-
-        from accounts.models import User
-        role_filter = ['teacher']
-        if include_admin:
-            role_filter.append('admin')
-        staff = User.objects.filter(role__in=role_filter, is_active=True)
-
-        created_count = 0
-        skipped_count = 0
-        for member in staff:
-            salary = Decimal('0.00')
-            if hasattr(member, 'teacher_profile') and member.teacher_profile.monthly_salary:
-                salary = member.teacher_profile.monthly_salary
-
-            _, created = Payroll.objects.get_or_create(
-                teacher=member,
-                month=month,
-                year=year,
-                defaults={
-                    'basic_salary': salary or Decimal('50000.00'),
-                    'bonuses': 0,
-                    'deductions': 0,
-                    'status': 'draft',
-                    'department': request.data.get('department') or (
-                        'Teaching' if member.role == 'teacher' else 'Administration'
-                    ),
-                    'salary_grade': request.data.get('salary_grade') or None,
-                    'due_date': due_date or None,
-                }
-            )
-            if created:
-                created_count += 1
-                payroll_obj = Payroll.objects.get(teacher=member, month=month, year=year)
-                log_payroll_action(payroll_obj, request.user, 'payroll_generation', updated_value={'month': month, 'year': year})
+        try:
+            year = int(request.data.get('year', timezone.now().year))
+            if str(request.data.get('whole_year', '')).lower() in ('1', 'true', 'yes'):
+                months = list(range(1, 13))
+            elif request.data.get('months'):
+                months = sorted(set(month_list(request.data)))
             else:
-                skipped_count += 1
+                months = [int(request.data.get('month', timezone.now().month))]
+        except (TypeError, ValueError):
+            return Response({'error': 'month, months and year must be numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if any(m < 1 or m > 12 for m in months):
+            return Response({'error': 'Months must be between 1 and 12.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = generate_payroll(
+            year, months, request.user,
+            include_admin=str(request.data.get('include_admin', '')).lower() in ('1', 'true', 'yes'),
+            department=request.data.get('department'),
+            salary_grade=request.data.get('salary_grade'),
+            due_date=request.data.get('due_date'),
+        )
+        if len(months) == 1 and result['closed_months']:
+            return Response({'error': f'Payroll for {months[0]}/{year} is closed.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        created_count, skipped_count = result['created'], result['skipped']
         return Response({
             'message': f'Generated payroll for {created_count} staff member(s). {skipped_count} already existed.',
-            'created': created_count,
-            'skipped': skipped_count,
+            **result,
         })
 
+    @action(detail=False, methods=['post'])
+    def calculate_deductions(self, request):
+        """
+        Compute PAYE and pension for every open payroll row of a month and save
+        them. With `dry_run` nothing is saved and the variance against the
+        previous month is returned instead.
+        """
+        if not can_manage_payroll(request.user):
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            month = int(request.data.get('month'))
+            year = int(request.data.get('year'))
+        except (TypeError, ValueError):
+            return Response({'error': 'month and year are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if month < 1 or month > 12:
+            return Response({'error': 'Months must be between 1 and 12.'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        return Response(calculate_deductions(year, month, request.user, dry_run=dry_run))
+
+    # ── Period Close ──────────────────────────────────────────────────────────
+
+    @action(detail=False, methods=['post'])
+    def close_period(self, request):
+        """Freeze a fully locked/paid month into a PayrollPeriodSummary."""
+        if not can_manage_payroll(request.user):
+            return Response({'error': 'You do not have permission to close payroll periods.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            month = int(request.data.get('month'))
+            year = int(request.data.get('year'))
+        except (TypeError, ValueError):
+            return Response({'error': 'month and year are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            summary = close_period(year, month, request.user)
+        except PeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PayrollPeriodSummarySerializer(summary).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def periods(self, request):
+        """Month-by-month totals and year-to-date figures for a year, for trend charts."""
+        if not can_view_payroll_analytics(request.user):
+            return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
+        year = int(request.query_params.get('year', timezone.now().year))
+        return Response(period_trend(year))
+
     # ── Reports ───────────────────────────────────────────────────────────────
 
     @action(detail=False, methods=['get'])
@@ -974,29 +1299,67 @@ class PayrollViewSet(viewsets.ModelViewSet):
         year = int(request.query_params.get('year', now.year))
         report_type = request.query_params.get('type', 'monthly_summary')
 
-        records = Payroll.objects.select_related('teacher').filter(month=month, year=year)
+        export = request.query_params.get('export')
+        if export:
+            if report_type not in REPORT_COLUMNS or export not in ('csv', 'xlsx'):
+                return Response(
+                    {'error': f'Cannot export {report_type} as {export}.'}, status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = report_rows(report_type, month, year)
+            if export == 'csv':
+                response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+            else:
+                response = StreamingHttpResponse(
+                    stream_xlsx(rows, sheet_name=report_type.replace('_', ' ').title()),
+                    content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                )
+            response['Content-Disposition'] = f'attachment; filename="{report_type}-{year}-{month:02d}.{export}"'
+            return response
+
+        records = Payroll.objects.select_related('teacher__teacher_profile').filter(month=month, year=year)
+
+        if report_type == 'bank_schedule':
+            rows = report_rows(report_type, month, year)
+            headers = next(rows)
+            data = [dict(zip(headers, row)) for row in rows]
+            return Response({'report_type': report_type, 'month': month, 'year': year, 'records': data})
 
         if report_type == 'monthly_summary':
-            total_basic = sum(r.basic_salary for r in records)
-            total_allowances = sum(r.total_allowances for r in records)
-            total_bonuses = sum(r.total_bonuses for r in records)
-            total_deductions = sum(r.total_deductions for r in records)
-            total_tax = sum(r.tax for r in records)
-            total_pension = sum(r.pension for r in records)
-            total_net = sum(r.net_salary for r in records)
+            closed = PayrollPeriodSummary.objects.filter(month=month, year=year).first()
+            if closed:
+                return Response({
+                    'report_type': report_type,
+                    'month': month,
+                    'year': year,
+                    'closed': True,
+                    'total_staff': closed.total_staff,
+                    'staff_paid': closed.staff_paid,
+                    'total_basic_salary': float(closed.total_basic),
+                    'total_allowances': float(closed.total_allowances),
+                    'total_bonuses': float(closed.total_bonuses),
+                    'total_deductions': float(closed.total_deductions),
+                    'total_tax': float(closed.total_tax),
+                    'total_pension': float(closed.total_pension),
+                    'total_net_salary': float(closed.total_net),
+                    'departments': closed.departments,
+                    'status_counts': closed.status_counts,
+                })
+
+            totals = payroll_totals(records)
             return Response({
                 'report_type': report_type,
                 'month': month,
                 'year': year,
-                'total_staff': records.count(),
-                'staff_paid': records.filter(status='paid').count(),
-                'total_basic_salary': float(total_basic),
-                'total_allowances': float(total_allowances),
-                'total_bonuses': float(total_bonuses),
-                'total_deductions': float(total_deductions),
-                'total_tax': float(total_tax),
-                'total_pension': float(total_pension),
-                'total_net_salary': float(total_net),
+                'closed': False,
+                'total_staff': totals['total_staff'],
+                'staff_paid': totals['staff_paid'],
+                'total_basic_salary': float(totals['basic']),
+                'total_allowances': float(totals['allowances']),
+                'total_bonuses': float(totals['bonuses']),
+                'total_deductions': float(totals['deductions']),
+                'total_tax': float(totals['tax']),
+                'total_pension': float(totals['pension']),
+                'total_net_salary': float(totals['net']),
             })
 
         elif report_type == 'salary_register':
@@ -1070,3 +1433,146 @@ class PayrollViewSet(viewsets.ModelViewSet):
             )
         except Exception as exc:
             print(f"Error sending payroll notification: {exc}")
+
+
+class PayrollAuditPagination(BasePagination):
+    """
+    Newest-first keyset pagination over (timestamp, id). The cursor carries the
+    whole key of the entry a page continues from, so the many entries a bulk
+    action writes with one timestamp page by key and deep pages cost the same
+    as the first. Responses have CursorPagination's {next, previous, results} shape.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        """(backwards, timestamp, id) from the request's cursor, or None on the first page."""
+        from django.utils.dateparse import parse_datetime
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, moment, entry_id = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            moment, entry_id = parse_datetime(moment), uuid.UUID(entry_id)
+        except (TypeError, ValueError):
+            direction = None
+        if direction not in ('n', 'p') or moment is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'p', moment, entry_id
+
+    def encode_cursor(self, backwards, key):
+        raw = f"{'p' if backwards else 'n'}|{key[0].isoformat()}|{key[1]}"
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        backwards = cursor is not None and cursor[0]
+
+        queryset = queryset.order_by(*(('timestamp', 'id') if backwards else ('-timestamp', '-id')))
+        if cursor is not None:
+            _, moment, entry_id = cursor
+            op = 'gt' if backwards else 'lt'
+            # The redundant bound lets the (timestamp, id) index range-scan from the cursor.
+            queryset = queryset.filter(**{f'timestamp__{op}e': moment}).filter(
+                Q(**{f'timestamp__{op}': moment}) | Q(timestamp=moment, **{f'id__{op}': entry_id})
+            )
+        results = list(queryset[:page_size + 1])
+        page = results[:page_size]
+        more = len(results) > page_size
+        if backwards:
+            page.reverse()
+
+        # "next" continues past the page's oldest entry, "previous" back from its newest.
+        start = (cursor[1], cursor[2]) if cursor is not None else None
+        newest = (page[0].timestamp, page[0].id) if page else start
+        oldest = (page[-1].timestamp, page[-1].id) if page else start
+        has_next = cursor is not None if backwards else more
+        has_previous = more if backwards else cursor is not None
+        self.next_link = self.encode_cursor(False, oldest) if has_next and oldest else None
+        self.previous_link = self.encode_cursor(True, newest) if has_previous and newest else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next_link, 'previous': self.previous_link, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PayrollAuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    The payroll audit trail across every payroll. Filters: action (comma
+    separated), user, payroll, year/month of the payroll's period and
+    since/until on the entry's timestamp.
+    """
+    queryset = PayrollAuditLog.objects.select_related('user').all()
+    serializer_class = PayrollAuditLogSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PayrollAuditPagination
+
+    def get_queryset(self):
+        if not can_manage_payroll(self.request.user):
+            raise PermissionDenied('You do not have permission to view payroll audit logs.')
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        actions = [a for a in (params.get('action') or '').split(',') if a]
+        if actions:
+            queryset = queryset.filter(action__in=actions)
+        for param in ('user', 'payroll'):
+            value = params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{f'{param}_id': uuid.UUID(value)})
+                except ValueError:
+                    raise ValidationError({param: 'Enter a valid id.'})
+        for param in ('year', 'month'):
+            value = params.get(param)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({param: 'Enter a whole number.'})
+                queryset = queryset.filter(**{f'payroll__{param}': int(value)})
+        for param, lookup in (('since', 'timestamp__gte'), ('until', 'timestamp__lt')):
+            value = params.get(param)
+            if value:
+                queryset = queryset.filter(**{lookup: self._moment(param, value)})
+        return queryset
+
+    def _moment(self, param, value):
+        """The instant `value` names; a date alone means its midnight, or the next one for `until`."""
+        from django.utils.dateparse import parse_date, parse_datetime
+        try:
+            # parse_datetime would also read a bare date, as its first midnight.
+            day = parse_date(value)
+            if day is None:
+                moment = parse_datetime(value)
+            else:
+                if param == 'until':
+                    day += datetime.timedelta(days=1)
+                moment = datetime.datetime.combine(day, datetime.time.min)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({param: 'Enter an ISO 8601 date or date and time.'})
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
@@ -5,6 +5,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 from decouple import config, Csv
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third Party Apps
     'rest_framework',
@@ -112,6 +114,13 @@ CSRF_TRUSTED_ORIGINS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resumable lesson material uploads: parts are staged here until assembled.
+CHUNKED_UPLOAD_DIR = config('CHUNKED_UPLOAD_DIR', default=str(BASE_DIR / 'chunked_uploads'))
+CHUNKED_UPLOAD_CHUNK_SIZE = config('CHUNKED_UPLOAD_CHUNK_SIZE', default=4 * 1024 * 1024, cast=int)
+CHUNKED_UPLOAD_MAX_SIZE = config('CHUNKED_UPLOAD_MAX_SIZE', default=1024 * 1024 * 1024, cast=int)
+# Pending uploads older than this are deleted with their parts by the nightly sweep.
+CHUNKED_UPLOAD_EXPIRY_HOURS = config('CHUNKED_UPLOAD_EXPIRY_HOURS', default=48, cast=int)
+
 # Static files
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -160,6 +169,16 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Africa/Lagos'  # Changed from UTC
 # Suppress Celery 6.0 deprecation warning — keep retrying broker connections on startup
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-student-fees': {
+        'task': 'finance.tasks.reconcile_fees_task',
+        'schedule': crontab(hour=2, minute=15),
+    },
+    'discard-abandoned-uploads': {
+        'task': 'academics.tasks.discard_abandoned_uploads_task',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -191,4 +210,51 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@anyiprimarysc
 
 # Paystack API Keys
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
-PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='')
\ No newline at end of file
+PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='')
+# Re-check each webhook event with Paystack's verify API before crediting.
+PAYSTACK_WEBHOOK_REVERIFY = config('PAYSTACK_WEBHOOK_REVERIFY', default=True, cast=bool)
+# Gateway client: timeouts in seconds, retries per call, the total seconds one
+# call may take across its retries (so a request in a web worker is bounded),
+# and the circuit breaker (consecutive failures before failing fast, seconds
+# before a trial call).
+PAYSTACK_CONNECT_TIMEOUT = config('PAYSTACK_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYSTACK_READ_TIMEOUT = config('PAYSTACK_READ_TIMEOUT', default=10.0, cast=float)
+PAYSTACK_MAX_RETRIES = config('PAYSTACK_MAX_RETRIES', default=2, cast=int)
+PAYSTACK_CALL_DEADLINE = config('PAYSTACK_CALL_DEADLINE', default=12.0, cast=float)
+PAYSTACK_CIRCUIT_THRESHOLD = config('PAYSTACK_CIRCUIT_THRESHOLD', default=5, cast=int)
+PAYSTACK_CIRCUIT_RESET = config('PAYSTACK_CIRCUIT_RESET', default=30.0, cast=float)
+
+# Fee generation for more pupils than this is handed to Celery.
+FEE_GENERATION_ASYNC_THRESHOLD = config('FEE_GENERATION_ASYNC_THRESHOLD', default=500, cast=int)
+# Bulk payroll pay/approve for more records than this runs in Celery (or pass "async": true).
+PAYROLL_BULK_ASYNC_THRESHOLD = config('PAYROLL_BULK_ASYNC_THRESHOLD', default=500, cast=int)
+# Payslips per Celery task when a month of payslip PDFs is rendered; the chunks
+# run in parallel across the workers.
+PAYSLIP_RENDER_CHUNK_SIZE = config('PAYSLIP_RENDER_CHUNK_SIZE', default=50, cast=int)
+# Statutory deductions computed by finance.deductions. Pension is a share of the
+# listed pay fields; PAYE bands are [annual width, rate] pairs (None = the rest),
+# applied to annualised pay after the reliefs. Defaults follow the 2026 PAYE bands.
+PAYROLL_DEDUCTIONS = {
+    'pension': {
+        'rate': '0.08',
+        'bases': ['basic_salary', 'housing_allowance', 'transport_allowance'],
+    },
+    'paye': {
+        'bands': [
+            [800000, '0.00'],
+            [2200000, '0.15'],
+            [9000000, '0.18'],
+            [13000000, '0.21'],
+            [25000000, '0.23'],
+            [None, '0.25'],
+        ],
+        'relief_fixed': 0,
+        'relief_rate': '0.00',
+        'pension_relief': True,
+        'exempt_allowances': [],
+    },
+}
+# Seconds the dashboard's top fee defaulters stay cached.
+FEE_DEFAULTERS_CACHE_TTL = config('FEE_DEFAULTERS_CACHE_TTL', default=300, cast=int)
+# Let the nightly fee reconciliation correct amount_paid/status instead of only reporting.
+FEE_RECONCILIATION_REPAIR = config('FEE_RECONCILIATION_REPAIR', default=False, cast=bool)